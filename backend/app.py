@@ -1,244 +1,482 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_from_directory, Response, stream_with_context, g, has_request_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 import os
-from openai import OpenAI
-import requests
-from bs4 import BeautifulSoup
-from langchain.vectorstores import Chroma
-from langchain.embeddings import HuggingFaceEmbeddings
+import json
+import time
+import math
+import logging
 from werkzeug.security import generate_password_hash, check_password_hash
-import jwt
-import datetime
-from models import db, User
+from sqlalchemy import event
+from models import db, User, Conversation
+import auth
+import database
+import migrations
 from course_api import CourseAPI
+from llm import LLMService, LLMUnavailable
+from scraper import Scraper
+from rate_limit import RateLimiter, ConcurrencyGate, RATE_LIMIT_ENABLED
+import jobs
+from jobs import JobQueue, JobFailed, QueueFull, JOBS_ENABLED
+from pipeline import Branch, run_parallel
+from semantic_cache import SemanticCache
+import model_service
+from context_builder import build_context
+import conversation as conversations
+import metrics
+from metrics import span, timed, STAGE_SECONDS, REQUEST_SECONDS, REQUESTS, DB_QUERIES
+
+_boot_started = time.perf_counter()
 
 load_dotenv()
 
+# LOG_LEVEL=DEBUG shows per-request detail; at the default level those calls are skipped
+logging.basicConfig(
+    level=os.getenv('LOG_LEVEL', 'INFO').upper(),
+    format='%(asctime)s %(levelname)s %(name)s: %(message)s'
+)
+logger = logging.getLogger('conuai')
+
 app = Flask(__name__, static_folder='../build', static_url_path='/')
 
 # Configure CORS for API routes only
 CORS(app, resources={r"/api/*": {"origins": "*"}})
 
-# Database configuration
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///quarcc.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
+# Database configuration (DATABASE_URL, pool and SQLite settings: see database.py)
+database.init_app(app)
+
+def count_db_query(*args):
+    """Count statements per request (see the X-DB-Queries header and conuai_db_queries_total)."""
+    if has_request_context():
+        g.db_queries = g.get('db_queries', 0) + 1
 
 # Create tables
 with app.app_context():
     db.create_all()
+    if os.getenv('AUTO_MIGRATE', '1') == '1':
+        migrations.upgrade(db.engine)
+    event.listen(db.engine, 'before_cursor_execute', count_db_query)
+
+# LLM provider chain (LLM_PROVIDERS=openai,local,fake; USE_FAKE_LLM=1 defaults to the offline fake)
+llm = LLMService.from_env()
+
+# Per-branch deadlines (seconds) for the parallel retrieval / course lookup stage
+RETRIEVAL_TIMEOUT = float(os.getenv('RETRIEVAL_TIMEOUT', '5'))
+COURSE_LOOKUP_TIMEOUT = float(os.getenv('COURSE_LOOKUP_TIMEOUT', '3'))
+LIVE_PAGES_TIMEOUT = float(os.getenv('LIVE_PAGES_TIMEOUT', '1'))
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+# Sampling settings; the model name comes from the provider (OPENAI_MODEL, LOCAL_LLM_MODEL)
+COMPLETION_PARAMS = {
+    'temperature': 0.7,
+    'max_tokens': 800,
+    'presence_penalty': 0.6,
+    'frequency_penalty': 0.3
+}
 
-# Initialize vector store from existing database
-embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-try:
-    vectorstore = Chroma(persist_directory="./chroma_db", embedding_function=embeddings)
-    print("Successfully loaded existing vector store")
-except Exception as e:
-    print(f"Error loading vector store: {str(e)}")
-    print("Please run build_db.py first to create the vector store")
-    vectorstore = None
+# The embedding model and vector store are loaded lazily by model_service.
+# PRELOAD_MODELS=1 (set by gunicorn.conf.py) loads the model here, before
+# workers fork, so they share one copy; otherwise it warms up in the background.
+if os.getenv('PRELOAD_MODELS') == '1':
+    model_service.preload()
+elif os.getenv('LAZY_LOAD_MODELS') != '1':
+    model_service.start_background_warm_up()
+
+# Reuse answers for near-identical questions (keyed on the query embedding)
+SEMANTIC_CACHE_ENABLED = os.getenv('SEMANTIC_CACHE_ENABLED', '1') == '1'
+semantic_cache = SemanticCache(
+    threshold=float(os.getenv('SEMANTIC_CACHE_THRESHOLD', '0.95')),
+    maxsize=int(os.getenv('SEMANTIC_CACHE_SIZE', '1000')),
+    ttl=float(os.getenv('SEMANTIC_CACHE_TTL', str(24 * 3600)))
+)
+
+def knowledge_base_version():
+    """Changes whenever build_db.py rebuilds the served index with different content."""
+    return model_service.corpus_version()
 
 # Load environment variables
 load_dotenv()
 
 if not os.getenv('JWT_SECRET_KEY'):
-    print("Warning: JWT_SECRET_KEY not set in environment. Using default key - not secure for production!")
+    logger.warning("JWT_SECRET_KEY not set in environment. Using default key - not secure for production!")
 
 app.config['SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'development-secret-key-change-me')
 
-# Add this at the top with other global variables
-content_cache = {}
+# Token buckets per user and overall (RATE_LIMIT_*), and a bounded queue in front of the LLM (ADMISSION_*).
+# The limiter (and its settings check) only exists while rate limiting is on.
+rate_limiter = RateLimiter() if RATE_LIMIT_ENABLED else None
+admission = ConcurrencyGate()
 
-def scrape_concordia_pages():
-    if content_cache.get('data'):
-        return content_cache
-    
-    base_urls = [
-        "https://www.concordia.ca/students.html",
-        "https://www.concordia.ca/academics.html",
-        "https://www.concordia.ca/students/success.html",
-        "https://www.concordia.ca/students/financial-support.html",
-        "https://www.concordia.ca/admissions.html",
-        "https://theconcordian.com/",
-        "https://csu.qc.ca/",
-        "https://en.wikipedia.org/wiki/Concordia_University"
-    ]
-    
-    all_content = []
-    
-    for url in base_urls:
-        try:
-            response = requests.get(url)
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Remove script and style elements
-            for script in soup(["script", "style"]):
-                script.decompose()
-            
-            # Get text and clean it
-            text = soup.get_text(separator=' ', strip=True)
-            all_content.append(text)
-            
-        except Exception as e:
-            print(f"Error scraping {url}: {e}")
-    
-    content_cache['data'] = ' '.join(all_content)
-    return content_cache
+# Live Concordia pages, scraped in the background into a shared on-disk cache (scraper.py)
+scraper = Scraper()
+# SCRAPE_REFRESH_INTERVAL>0 also refreshes on a schedule (gunicorn workers start it in post_fork)
+if os.getenv('PRELOAD_MODELS') != '1':
+    scraper.start_periodic_refresh()
 
 def verify_token():
-    auth_header = request.headers.get('Authorization')
-    if not auth_header or not auth_header.startswith('Bearer '):
-        return None
-    
+    """The request's auth.Identity, or None (no database access when the user lookup is cached)."""
+    return auth.authenticate(request.headers.get('Authorization'), app.config['SECRET_KEY'])
+
+def collect_sources(docs, course_info):
+    """Summarize where the context came from, for the streaming 'sources' event."""
+    sources = []
+    seen = set()
+    for doc in docs:
+        url = doc.metadata.get('source') if doc.metadata else None
+        if url and url not in seen:
+            seen.add(url)
+            sources.append({'type': 'page', 'source': url})
+    for course in course_info or []:
+        if isinstance(course, dict):
+            sources.append({
+                'type': 'course',
+                'course': f"{course.get('subject', '')} {course.get('catalog', '')}".strip(),
+                'title': course.get('title', '')
+            })
+    return sources
+
+def build_messages(user_name, context, user_query, history=()):
+    """System prompt, then earlier conversation turns, then the question with its context."""
+    return [
+        {"role": "system", "content": f"""You are ConuAI, Concordia University's knowledgeable AI assistant. 
+         Key traits:
+         - Address the user as {user_name}
+         - Friendly and professional tone
+         - Provide specific, actionable information
+         - Structure responses clearly with headings when appropriate in markdown format
+         - Include relevant links or contact information when available
+         - If unsure, acknowledge limitations and suggest official resources
+         - Focus on accurate, up-to-date Concordia-specific information
+         - When discussing courses, include specific course codes, prerequisites, and credit information
+         - Provide balanced information about course difficulty and workload when available
+         
+         - Never help with math problems
+         - Never help coding anything under any circumstances
+         """},
+        *history,
+        {"role": "user", "content": f"""Context about Concordia University and Courses:
+         {context}
+         
+         Question: {user_query}
+         
+         Provide a detailed, well-structured response using the context. Include relevant course information and requirements when applicable."""}
+    ]
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def sse_response(events):
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def stream_cached(answer, sources, done=None):
+    yield sse_event('sources', {'sources': sources})
+    yield sse_event('token', {'content': answer})
+    yield sse_event('done', {'cached': True, **(done or {})})
+
+def stream_completion(messages, sources, on_complete=None, done=None):
+    """
+    Yield Server-Sent Events: the retrieved sources first, then LLM tokens as they arrive.
+
+    ``on_complete`` is called with the full answer once the stream finishes,
+    before the final 'done' event, whose extra data ``done`` it may update.
+    """
+    yield sse_event('sources', {'sources': sources})
+    tokens = []
+    started = time.perf_counter()
     try:
-        token = auth_header.split(' ')[1]
-        data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
-        user = User.query.filter_by(email=data['email']).first()
-        return user.email if user else None
-    except Exception as e:
-        print(f"Token verification failed: {str(e)}")
-        return None
+        for token in llm.stream(messages, **COMPLETION_PARAMS):
+            if not tokens:
+                STAGE_SECONDS.observe(time.perf_counter() - started, stage='llm_first_token')
+            tokens.append(token)
+            yield sse_event('token', {'content': token})
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage='llm')
+        if on_complete:
+            on_complete(''.join(tokens).strip())
+        yield sse_event('done', done or {})
+    except LLMUnavailable as e:
+        logger.error("No LLM provider could answer: %s", e)
+        yield sse_event('error', {'error': 'ConuAI is temporarily unavailable, please try again shortly.'})
+    except Exception:
+        logger.exception("Error while streaming completion")
+        yield sse_event('error', {'error': 'Something went wrong'})
+
+# Longest Retry-After ever sent, whatever a limiter estimates
+MAX_RETRY_AFTER = 3600
+
+def too_many_requests(retry_after, message):
+    retry_after = min(retry_after, MAX_RETRY_AFTER) if math.isfinite(retry_after) else MAX_RETRY_AFTER
+    response = jsonify({'response': message, 'retry_after': math.ceil(retry_after)})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+def wants_stream(data):
+    if data.get('stream'):
+        return True
+    return 'text/event-stream' in request.headers.get('Accept', '')
 
 # API Routes
 @app.route('/api/query', methods=['POST'])
 def query():
     try:
-        print("Received query request")
-        print("Headers:", request.headers)
-        
-        user_email = verify_token()
-        print(f"Verified user email: {user_email}")
+        with span('auth'):
+            identity = verify_token()
         
-        if not user_email:
-            print("Token verification failed")
+        if not identity:
             return jsonify({
                 'response': "I apologize, but you need to sign in to use ConuAI."
             }), 401
         
-        user = User.query.filter_by(email=user_email).first()
-        print(f"Found user: {user.email if user else 'None'}")
-        user_name = user.firstName
+        user_email = identity.email
+        user_name = identity.firstName
+        
+        if rate_limiter is not None:
+            allowed, retry_after = rate_limiter.check(identity.id or user_email)
+            if not allowed:
+                return too_many_requests(retry_after, "You're asking questions faster than ConuAI can answer. "
+                                                      "Please wait a moment and try again.")
         
         data = request.json
-        print(f"Request data: {data}")
         user_query = data.get('query')
         
         if not user_query:
-            print("No query provided in request")
             return jsonify({'error': 'No query provided'}), 400
         
-        print(f"Processing query: {user_query}")
+        # "async": true answers through the job queue (poll /api/jobs/<id> or pass a webhook_url)
+        run_async = JOBS_ENABLED and bool(data.get('async'))
+        webhook_url = data.get('webhook_url') if run_async else None
+        if webhook_url is not None:
+            if not jobs.webhooks_enabled():
+                return jsonify({'error': 'Webhooks are not enabled on this server'}), 400
+            if not isinstance(webhook_url, str) or not jobs.webhook_allowed(webhook_url):
+                return jsonify({'error': 'webhook_url must be an http(s) URL on an allowed public host'}), 400
+        
+        # Optional list of page URLs to restrict retrieval to
+        source_filter = data.get('sources') or None
+        if source_filter is not None and (not isinstance(source_filter, list)
+                                          or not all(isinstance(s, str) for s in source_filter)):
+            return jsonify({'error': 'sources must be a list of URLs'}), 400
+        
+        conversation_id = data.get('conversation_id')
+        if conversation_id is not None and (not isinstance(conversation_id, int) or isinstance(conversation_id, bool)):
+            return jsonify({'error': 'conversation_id must be an integer'}), 400
+        
+        logger.debug("Processing query from %s: %s", user_email, user_query)
+        
+        # Follow-ups pass back the conversation_id from the previous response
+        with span('history'):
+            conversation = conversations.get_or_create(identity.id, conversation_id, user_query)
+            if conversation is None:
+                return jsonify({'error': 'Conversation not found'}), 404
+            history = conversations.history_messages(conversation)
+        # A new conversation has no id until its first turn is recorded (see remember)
+        done = {'conversation_id': conversation.id}
+        # A follow-up ("what about its prerequisites?") depends on the history, so only
+        # the first question of a conversation can share answers through the cache.
+        # Answers retrieved from a subset of pages aren't shared either.
+        use_answer_cache = SEMANTIC_CACHE_ENABLED and not history and not source_filter
         
         # Get relevant documents from vector store
-        if vectorstore is None:
+        retriever = model_service.get_retriever()
+        if retriever is None:
             return jsonify({
                 'response': "I apologize, but the knowledge base is not currently available. Please contact the administrator."
             }), 503
             
-        docs = vectorstore.similarity_search(user_query, k=3)
-        context = "\n\n".join(doc.page_content for doc in docs)
-        # print(f"Found {len(docs)} relevant documents")
+        # Embed once: the vector is shared by the answer cache and retrieval
+        with span('embedding'):
+            query_embedding = model_service.embed_query(user_query)
+        cache_scope = CourseAPI.parse_course_code(user_query)
         
-        # Search for relevant course information
-        try:
-            print("\n========== Query Endpoint Debug ==========")
-            print(f"Processing query: '{user_query}'")
-            
-            # Search for courses
-            print("\nCalling CourseAPI.search()...")
-            course_info = CourseAPI.search(user_query, limit=5)
-            
-            print(f"\nReceived {len(course_info) if course_info else 0} courses from search")
-            if course_info:  # course_info is already a list of courses
-                print("\nFormatting course information for context...")
-                formatted_courses = []
-                for i, course in enumerate(course_info, 1):
-                    if isinstance(course, dict):
-                        # Add difficulty and experience metrics
-                        avg_difficulty = course.get('avgDifficulty', 0)
-                        avg_experience = course.get('avgExperience', 0)
-                        difficulty_dist = course.get('difficultyDistribution', {})
-                        experience_dist = course.get('experienceDistribution', {})
-                        
-                        course_text = (
-                            f"Course {i}:\n"
-                            f"  Course: {course.get('subject', '')} {course.get('catalog', '')}\n"
-                            f"  Title: {course.get('title', '')}\n"
-                            f"  Description: {course.get('description', '')}\n"
-                            f"  Prerequisites: {course.get('prerequisites', 'None')}\n"
-                            f"  Credits: {course.get('credits', 'N/A')}\n"
-                            f"  Department: {course.get('department', 'N/A')}\n"
-                            f"  Terms Offered: {', '.join(course.get('terms', []))}\n"
-                            f"  Average Difficulty: {avg_difficulty}/5\n"
-                            f"  Average Experience: {avg_experience}/5\n"
-                            f"  Difficulty Distribution: {difficulty_dist}\n"
-                            f"  Experience Distribution: {experience_dist}"
-                        )
-                        formatted_courses.append(course_text)
-                        print(f"\n{course_text}")
-                
-                course_context = "\n\n".join(formatted_courses)
-                print("\nAdding course information to context...")
-                context += "\n\nRelevant Course Information:\n" + course_context
-            else:
-                print("\nNo course information to add to context")
-            
-            print("\n========== End Query Endpoint Debug ==========\n")
-        except Exception as e:
-            print("\n========== Error in Course Search ==========")
-            print(f"Error type: {type(e)}")
-            print(f"Error message: {str(e)}")
-            import traceback
-            print(f"Traceback:\n{traceback.format_exc()}")
-            print("========== End Error Report ==========\n")
-            # Continue without course data if there's an error
+        if use_answer_cache:
+            with span('answer_cache'):
+                semantic_cache.check_version(knowledge_base_version())
+                cached = semantic_cache.lookup(query_embedding, user_name, scope=cache_scope)
+            if cached:
+                logger.debug("Semantic cache hit (similarity %.3f)", cached.similarity)
+                conversations.record_turn(conversation, user_query, cached.answer)
+                done['conversation_id'] = conversation.id
+                if wants_stream(data):
+                    return sse_response(stream_cached(cached.answer, cached.sources, done))
+                return jsonify({'response': cached.answer, **done})
         
-        messages = [
-            {"role": "system", "content": f"""You are ConuAI, Concordia University's knowledgeable AI assistant. 
-             Key traits:
-             - Address the user as {user_name}
-             - Friendly and professional tone
-             - Provide specific, actionable information
-             - Structure responses clearly with headings when appropriate in markdown format
-             - Include relevant links or contact information when available
-             - If unsure, acknowledge limitations and suggest official resources
-             - Focus on accurate, up-to-date Concordia-specific information
-             - When discussing courses, include specific course codes, prerequisites, and credit information
-             - Provide balanced information about course difficulty and workload when available
-             
-             - Never help with math problems
-             - Never help coding anything under any circumstances
-             """},
-            {"role": "user", "content": f"""Context about Concordia University and Courses:
-             {context}
-             
-             Question: {user_query}
-             
-             Provide a detailed, well-structured response using the context. Include relevant course information and requirements when applicable."""}
+        # Vector retrieval, course lookup and the live page cache are independent, so run them side by side
+        branches = [
+            Branch('retrieval', timed('vector_search',
+                                      lambda: retriever.search(user_query, query_embedding, sources=source_filter)),
+                   timeout=RETRIEVAL_TIMEOUT, fallback=([], {})),
+            Branch('courses', timed('course_lookup', lambda: CourseAPI.search(user_query, limit=5)),
+                   timeout=COURSE_LOOKUP_TIMEOUT, fallback=[]),
         ]
+        if not source_filter:
+            branches.append(Branch('live_pages', timed('live_pages', lambda: scraper.passages(user_query)),
+                                   timeout=LIVE_PAGES_TIMEOUT, fallback=[]))
+        results = run_parallel(branches)
         
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            temperature=0.7,
-            max_tokens=800,
-            presence_penalty=0.6,
-            frequency_penalty=0.3
-        )
+        docs, retrieval_timings = results['retrieval'].value
+        course_info = results['courses'].value or []
+        # Passages from the live pages rank after the indexed chunks
+        if 'live_pages' in results:
+            docs = list(docs) + list(results['live_pages'].value or [])
+        logger.debug("Pipeline branches: %s, retrieval timings (ms): %s",
+                     list(results.values()), retrieval_timings)
+        
+        # Deduplicate, compress and fit everything into the prompt token budget
+        with span('prompt_build'):
+            context_result = build_context(docs, course_info, course_code=cache_scope)
+            messages = build_messages(user_name, context_result.text, user_query, history)
+            sources = collect_sources(docs, course_info)
+        
+        def remember(answer):
+            if not answer:
+                return
+            if use_answer_cache:
+                semantic_cache.store(query_embedding, answer, user_name,
+                                     sources=sources, scope=cache_scope)
+            conversations.record_turn(conversation, user_query, answer)
+            done['conversation_id'] = conversation.id
+            conversations.summarize_in_background(app, conversation.id, llm)
+        
+        if run_async:
+            # The job workers bound LLM concurrency themselves, so no admission slot is taken here
+            try:
+                job = job_queue.submit(str(identity.id), {
+                    'messages': messages,
+                    'query': user_query,
+                    'user_id': identity.id,
+                    'user_name': user_name,
+                    # None for a new conversation; the job creates it with the first turn
+                    'conversation_id': conversation.id,
+                    'sources': sources,
+                    'use_answer_cache': use_answer_cache,
+                    'query_embedding': [float(x) for x in query_embedding] if use_answer_cache else None,
+                    'cache_scope': cache_scope
+                }, webhook_url=webhook_url)
+            except QueueFull:
+                return too_many_requests(admission.retry_after(), "ConuAI is very busy right now. "
+                                                                  "Please try again in a few seconds.")
+            return jsonify({'job_id': job['id'], 'status': job['status'],
+                            'status_url': f"/api/jobs/{job['id']}", **done}), 202
+        
+        # Admission control: wait briefly for an LLM slot, or shed the request
+        with span('admission'):
+            admitted = admission.acquire()
+        if not admitted:
+            return too_many_requests(admission.retry_after(), "ConuAI is very busy right now. "
+                                                              "Please try again in a few seconds.")
+        admitted_at = time.perf_counter()
         
-        return jsonify({'response': response.choices[0].message.content.strip()})
+        def release_admission():
+            admission.release(time.perf_counter() - admitted_at)
+        
+        if wants_stream(data):
+            response = sse_response(stream_completion(messages, sources, on_complete=remember, done=done))
+            # Held until the stream ends or the client goes away
+            response.call_on_close(release_admission)
+            return response
+        
+        try:
+            with span('llm'):
+                answer = llm.complete(messages, **COMPLETION_PARAMS)
+        except LLMUnavailable as e:
+            logger.error("No LLM provider could answer: %s", e)
+            return jsonify({
+                'response': "I apologize, but ConuAI is temporarily unavailable. Please try again shortly."
+            }), 503
+        finally:
+            release_admission()
+        
+        remember(answer)
+        return jsonify({'response': answer, **done})
     
-    except Exception as e:
-        print(f"Detailed error in query endpoint: {str(e)}")
-        print(f"Error type: {type(e)}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+    except Exception:
+        logger.exception("Error in query endpoint")
         return jsonify({'error': 'Something went wrong'}), 500
 
+def run_query_job(payload):
+    """The LLM stage of an async /api/query, run by a job worker."""
+    with app.app_context():
+        try:
+            answer = llm.complete(payload['messages'], **COMPLETION_PARAMS)
+        except LLMUnavailable as e:
+            logger.error("No LLM provider could answer: %s", e)
+            raise JobFailed("ConuAI is temporarily unavailable. Please try again shortly.")
+        if answer:
+            if payload['use_answer_cache']:
+                semantic_cache.store(payload['query_embedding'], answer, payload['user_name'],
+                                     sources=payload['sources'], scope=payload['cache_scope'])
+            conversation = conversations.get_or_create(payload['user_id'], payload['conversation_id'],
+                                                       payload['query'])
+            if conversation is not None:
+                conversations.record_turn(conversation, payload['query'], answer)
+                conversations.summarize_in_background(app, conversation.id, llm)
+                return {'response': answer, 'sources': payload['sources'], 'conversation_id': conversation.id}
+        return {'response': answer, 'sources': payload['sources'], 'conversation_id': payload['conversation_id']}
+
+# SQLite-backed queue shared by the workers on this host (JOB_QUEUE_BACKEND), opened on first use; a
+# process starts its JOB_WORKERS threads with the first async request it queues
+job_queue = JobQueue(run_query_job, workers=jobs.JOB_WORKERS if JOBS_ENABLED else 0)
+
+# Longest a poll may wait for a job to finish (?wait=seconds)
+JOB_MAX_WAIT = float(os.getenv('JOB_MAX_WAIT', '30'))
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    identity = verify_token()
+    if not identity:
+        return jsonify({'error': 'Invalid token'}), 401
+    
+    # With jobs off there are none to find, and the store is never opened
+    job = job_queue.get(job_id) if JOBS_ENABLED else None
+    if job is None or job['user_id'] != str(identity.id):
+        return jsonify({'error': 'Job not found'}), 404
+    
+    try:
+        wait = float(request.args.get('wait', 0))
+    except ValueError:
+        wait = math.nan
+    # nan would slip through min/max and never time out
+    if not math.isfinite(wait) or wait < 0:
+        return jsonify({'error': 'wait must be a number of seconds'}), 400
+    wait = min(wait, JOB_MAX_WAIT)
+    if wait and job['status'] not in jobs.FINISHED:
+        job = job_queue.wait(job_id, wait) or job
+    return jsonify(jobs.public_view(job))
+
+@app.route('/api/conversations', methods=['GET'])
+def list_conversations():
+    identity = verify_token()
+    if not identity:
+        return jsonify({'error': 'Invalid token'}), 401
+    
+    recent = (Conversation.query.filter_by(user_id=identity.id)
+              .order_by(Conversation.updated_at.desc()).limit(50).all())
+    return jsonify({'conversations': [c.to_dict() for c in recent]})
+
+@app.route('/api/conversations/<int:conversation_id>', methods=['GET', 'DELETE'])
+def conversation_detail(conversation_id):
+    identity = verify_token()
+    if not identity:
+        return jsonify({'error': 'Invalid token'}), 401
+    
+    conversation = Conversation.query.filter_by(id=conversation_id, user_id=identity.id).first()
+    if not conversation:
+        return jsonify({'error': 'Conversation not found'}), 404
+    
+    if request.method == 'DELETE':
+        db.session.delete(conversation)
+        db.session.commit()
+        return jsonify({'message': 'Conversation deleted'})
+    
+    return jsonify({
+        **conversation.to_dict(),
+        'summary': conversation.summary,
+        'messages': [m.to_dict() for m in conversation.messages]
+    })
+
 @app.route('/api/auth/signup', methods=['POST'])
 def signup():
     try:
@@ -249,7 +487,7 @@ def signup():
         if not all(k in data for k in ['email', 'password', 'firstName', 'lastName', 'role']):
             return jsonify({'error': 'Missing required fields'}), 400
         
-        if User.query.filter_by(email=data['email']).first():
+        if User.find_by_email(data['email']):
             return jsonify({'error': 'Email already registered'}), 409
         
         new_user = User(
@@ -263,10 +501,11 @@ def signup():
         
         db.session.add(new_user)
         db.session.commit()
+        auth.forget(new_user.email)
         return jsonify({'message': 'User registered successfully'}), 201
     except Exception as e:
         db.session.rollback()
-        print(f"Error creating user: {str(e)}")
+        logger.error("Error creating user: %s", e)
         return jsonify({'error': 'Failed to create user'}), 500
 
 @app.route('/api/auth/login', methods=['POST'])
@@ -279,56 +518,89 @@ def login():
         if not all(k in data for k in ['email', 'password']):
             return jsonify({'error': 'Missing email or password'}), 400
         
-        user = User.query.filter_by(email=data['email']).first()
+        user = User.find_by_email(data['email'])
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
         if not check_password_hash(user.password, data['password']):
             return jsonify({'error': 'Invalid password'}), 401
         
-        token = jwt.encode({
-            'email': user.email,
-            'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24)
-        }, app.config['SECRET_KEY'])
-        
-        if isinstance(token, bytes):
-            token = token.decode('utf-8')
+        token = auth.issue_token(user, app.config['SECRET_KEY'])
         
         return jsonify({
             'token': token,
-            'user': {
-                'email': user.email,
-                'firstName': user.firstName,
-                'lastName': user.lastName,
-                'role': user.role
-            }
+            'user': auth.Identity.from_user(user).to_dict()
         }), 200
     except Exception as e:
-        print(f"Login error: {str(e)}")
+        logger.error("Login error: %s", e)
         return jsonify({'error': 'Authentication failed'}), 500
 
 @app.route('/api/auth/verify', methods=['GET'])
 def verify_auth():
     try:
-        user_email = verify_token()
-        if not user_email:
+        identity = verify_token()
+        if not identity:
             return jsonify({'error': 'Invalid token'}), 401
             
-        user = User.query.filter_by(email=user_email).first()
-        if not user:
-            return jsonify({'error': 'User not found'}), 401
-            
-        return jsonify({
-            'user': {
-                'email': user.email,
-                'firstName': user.firstName,
-                'lastName': user.lastName,
-                'role': user.role
-            }
-        })
+        return jsonify({'user': identity.to_dict()})
     except Exception as e:
         return jsonify({'error': str(e)}), 401
 
+@app.before_request
+def start_timer():
+    request.started_at = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    if request.path.startswith('/api/') and hasattr(request, 'started_at'):
+        endpoint = request.url_rule.rule if request.url_rule else 'unknown'
+        REQUEST_SECONDS.observe(time.perf_counter() - request.started_at, endpoint=endpoint)
+        REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+        DB_QUERIES.inc(g.get('db_queries', 0), endpoint=endpoint)
+    if app.testing or app.debug:
+        response.headers['X-DB-Queries'] = str(g.get('db_queries', 0))
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    status = model_service.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+@app.route('/api/stats', methods=['GET'])
+def stats():
+    return jsonify({
+        'course_cache': CourseAPI.client.stats(),
+        'course_catalog': CourseAPI.catalog.stats() if CourseAPI.catalog else None,
+        'semantic_cache': semantic_cache.stats(),
+        'embedding_batcher': model_service.batcher_stats(),
+        'retrieval': model_service.retrieval_stats(),
+        'query_cache': model_service.query_cache_stats(),
+        'auth_user_cache': auth.stats(),
+        'database': database.stats(),
+        'llm': llm.stats(),
+        'scraper': scraper.stats(),
+        'rate_limit': rate_limiter.stats() if rate_limiter else None,
+        'admission': admission.stats(),
+        'jobs': job_queue.stats()
+    })
+
+metrics.register_gauges('course_cache', CourseAPI.client.stats)
+metrics.register_gauges('course_catalog', lambda: CourseAPI.catalog.stats() if CourseAPI.catalog else None)
+metrics.register_gauges('semantic_cache', semantic_cache.stats)
+metrics.register_gauges('embedding_batcher', model_service.batcher_stats)
+metrics.register_gauges('retrieval', model_service.retrieval_stats)
+metrics.register_gauges('query_cache', model_service.query_cache_stats)
+metrics.register_gauges('auth_user_cache', auth.stats)
+metrics.register_gauges('llm', llm.stats)
+metrics.register_gauges('scraper', scraper.stats)
+metrics.register_gauges('rate_limit', lambda: rate_limiter.stats() if rate_limiter else None)
+metrics.register_gauges('admission', admission.stats)
+metrics.register_gauges('jobs', job_queue.stats)
+
 # Serve React App - these routes must be last
 @app.route('/')
 def serve():
@@ -344,5 +616,8 @@ def serve_path(path):
         return send_from_directory(app.static_folder, path)
     return send_from_directory(app.static_folder, 'index.html')
 
+logger.info("App initialized in %.2fs (pid %d, RSS %s)",
+            time.perf_counter() - _boot_started, os.getpid(), model_service.memory_label())
+
 if __name__ == '__main__':
     app.run(debug=False, port=5000, host='0.0.0.0')
\ No newline at end of file
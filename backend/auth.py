@@ -0,0 +1,107 @@
+import os
+import datetime
+import logging
+import jwt
+from cache import TTLCache, MISSING
+from models import User
+
+logger = logging.getLogger(__name__)
+
+TOKEN_LIFETIME = datetime.timedelta(hours=24)
+# How long a user lookup is trusted; deleting a user takes effect within this window
+USER_CACHE_TTL = float(os.getenv('AUTH_USER_CACHE_TTL', '60'))
+USER_CACHE_SIZE = int(os.getenv('AUTH_USER_CACHE_SIZE', '4096'))
+# AUTH_CHECK_USER=0 trusts the token alone (fully stateless, no revocation)
+CHECK_USER = os.getenv('AUTH_CHECK_USER', '1') == '1'
+
+PROFILE_CLAIMS = ('id', 'firstName', 'lastName', 'role')
+
+class Identity:
+    """The authenticated user, as carried in the token."""
+
+    def __init__(self, email, firstName, lastName, role, id=None):
+        self.id = id
+        self.email = email
+        self.firstName = firstName
+        self.lastName = lastName
+        self.role = role
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.email, user.firstName, user.lastName, user.role, id=user.id)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'email': self.email,
+            'firstName': self.firstName,
+            'lastName': self.lastName,
+            'role': self.role
+        }
+
+_users = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+def issue_token(user, secret):
+    """Signed JWT carrying everything authenticated endpoints need about the user."""
+    claims = Identity.from_user(user).to_dict()
+    claims['exp'] = datetime.datetime.utcnow() + TOKEN_LIFETIME
+    token = jwt.encode(claims, secret)
+    if isinstance(token, bytes):
+        token = token.decode('utf-8')
+    return token
+
+def lookup_user(email):
+    """
+    Current Identity for ``email`` from the database, cached for USER_CACHE_TTL.
+
+    Unknown emails are cached too (as None), so a revoked token can't be
+    used to hammer the database.
+    """
+    identity = _users.get(email)
+    if identity is MISSING:
+        user = User.find_by_email(email)
+        identity = Identity.from_user(user) if user else None
+        _users.set(email, identity)
+    return identity
+
+def forget(email):
+    """Drop a cached lookup, e.g. after the user is created, changed or deleted."""
+    _users.delete(email)
+
+def authenticate(auth_header, secret):
+    """
+    Resolve a ``Bearer`` Authorization header to an Identity.
+
+    The profile comes from the token claims, so the common case needs no
+    database access; the only lookup is the cached existence check.  Tokens
+    issued before the claims were added fall back to the cached user row.
+
+    Returns:
+        Identity: The user, or None if the token is missing, invalid or revoked
+    """
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return None
+
+    try:
+        claims = jwt.decode(auth_header.split(' ')[1], secret, algorithms=["HS256"])
+    except jwt.PyJWTError as e:
+        logger.info("Token verification failed: %s", e)
+        return None
+
+    email = claims.get('email')
+    if not email:
+        return None
+    has_profile = all(claim in claims for claim in PROFILE_CLAIMS)
+
+    if CHECK_USER or not has_profile:
+        current = lookup_user(email)
+        if current is None:
+            logger.info("Token for unknown user %s rejected", email)
+            return None
+        if not has_profile:
+            return current
+
+    return Identity(email, **{claim: claims[claim] for claim in PROFILE_CLAIMS})
+
+def stats():
+    return _users.stats()
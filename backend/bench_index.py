@@ -0,0 +1,121 @@
+"""
+Recall vs latency report for FAISS index settings.
+
+Every configuration is built over the same vectors and compared against the
+exact (flat) index on the same queries:
+
+    python bench_index.py                          # current vector_store/
+    python bench_index.py --queries questions.txt  # real questions, one per line
+    python bench_index.py --synthetic 300000       # random vectors at target scale
+"""
+import argparse
+import json
+import time
+import faiss
+import numpy as np
+from index_factory import make_index, tune
+
+# (label, make_index kwargs, tuning knob, values to try)
+CONFIGS = [
+    ('flat float16', {'index_type': 'flat', 'storage': 'float16'}, None, [None]),
+    ('ivf', {'index_type': 'ivf'}, 'nprobe', [1, 4, 16, 64]),
+    ('ivf float16', {'index_type': 'ivf', 'storage': 'float16'}, 'nprobe', [4, 16, 64]),
+    ('ivfpq', {'index_type': 'ivfpq'}, 'nprobe', [4, 16, 64]),
+    ('hnsw', {'index_type': 'hnsw'}, 'ef_search', [16, 32, 64, 128]),
+    ('hnsw float16', {'index_type': 'hnsw', 'storage': 'float16'}, 'ef_search', [32, 64, 128]),
+]
+
+def load_corpus(folder_path):
+    index = faiss.read_index(f"{folder_path}/index.faiss")
+    try:
+        return index.reconstruct_n(0, index.ntotal)
+    except RuntimeError:
+        # Not an exact index; re-embed the stored texts
+        from embeddings import VectorStore
+        store = VectorStore()
+        store.load(folder_path)
+        return store.model.encode(store.texts).astype('float32')
+
+def make_queries(vectors, args):
+    if args.queries:
+        import model_service
+        with open(args.queries, 'r') as f:
+            questions = [line.strip() for line in f if line.strip()]
+        return model_service.get_sentence_transformer().encode(questions).astype('float32')
+    # Perturbed corpus vectors stand in for real questions
+    rng = np.random.default_rng(args.seed)
+    picks = vectors[rng.choice(len(vectors), min(args.num_queries, len(vectors)), replace=False)]
+    noise = rng.standard_normal(picks.shape).astype('float32') * picks.std() * 0.3
+    return picks + noise
+
+def measure(index, queries, k, truth):
+    latencies = []
+    found = 0
+    for i, query in enumerate(queries):
+        started = time.perf_counter()
+        _, ids = index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - started)
+        found += len(set(ids[0]) & set(truth[i]))
+    latencies = np.array(latencies) * 1000
+    return {
+        'recall': found / (len(queries) * k),
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'mean_ms': float(latencies.mean())
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare FAISS index settings against the flat index")
+    parser.add_argument('--store', default='vector_store', help="VectorStore folder to read vectors from")
+    parser.add_argument('--synthetic', type=int, help="Use N random vectors instead of the store")
+    parser.add_argument('--dimension', type=int, default=384)
+    parser.add_argument('--queries', help="File with one question per line")
+    parser.add_argument('--num-queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--output', help="Write the report as JSON")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        rng = np.random.default_rng(args.seed)
+        vectors = rng.standard_normal((args.synthetic, args.dimension)).astype('float32')
+    else:
+        vectors = load_corpus(args.store)
+    queries = make_queries(vectors, args)
+    k = min(args.k, len(vectors))
+    print(f"Corpus: {len(vectors)} vectors, {len(queries)} queries, k={k}")
+
+    flat, _ = make_index(vectors, 'flat')
+    _, truth = flat.search(queries, k)
+    report = [dict(label='flat', description='Flat', build_s=0.0,
+                   size_mb=len(faiss.serialize_index(flat)) / 2**20,
+                   knob=None, value=None, **measure(flat, queries, k, truth))]
+
+    for label, params, knob, values in CONFIGS:
+        started = time.perf_counter()
+        try:
+            index, description = make_index(vectors, **params)
+        except (RuntimeError, ValueError) as e:
+            print(f"Skipping {label}: {e}")
+            continue
+        build_s = time.perf_counter() - started
+        size_mb = len(faiss.serialize_index(index)) / 2**20
+        for value in values:
+            if knob:
+                tune(index, **{knob: value})
+            report.append(dict(label=label, description=description, build_s=build_s,
+                               size_mb=size_mb, knob=knob, value=value,
+                               **measure(index, queries, k, truth)))
+
+    print(f"\n{'config':<16}{'setting':<16}{'recall@k':>10}{'p50 ms':>10}{'p95 ms':>10}{'build s':>10}{'size MB':>10}")
+    for row in report:
+        setting = f"{row['knob']}={row['value']}" if row['knob'] else '-'
+        print(f"{row['label']:<16}{setting:<16}{row['recall']:>10.3f}{row['p50_ms']:>10.3f}"
+              f"{row['p95_ms']:>10.3f}{row['build_s']:>10.1f}{row['size_mb']:>10.1f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'vectors': len(vectors), 'queries': len(queries), 'k': k, 'results': report}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
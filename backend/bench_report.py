@@ -0,0 +1,89 @@
+"""Shared result handling for bench_retrieval.py and load_test.py: percentiles, saving, regression checks."""
+import os
+import json
+import time
+import subprocess
+import numpy as np
+
+RESULTS_DIR = os.getenv('BENCH_RESULTS_DIR', os.path.join(os.path.dirname(__file__), 'bench_results'))
+
+def latency_summary(seconds):
+    """p50/p95/p99/mean in milliseconds for a list of durations in seconds."""
+    if not len(seconds):
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None, 'mean_ms': None}
+    ms = np.asarray(seconds) * 1000
+    return {
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'mean_ms': float(ms.mean())
+    }
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def save_results(kind, results, path=None):
+    """Write ``results`` with run metadata to ``path`` (default bench_results/<kind>-<time>.json)."""
+    if path is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        path = os.path.join(RESULTS_DIR, f"{kind}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    payload = {
+        'kind': kind,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git_revision': _git_revision(),
+        'results': results
+    }
+    with open(path, 'w') as f:
+        json.dump(payload, f, indent=2)
+    return path
+
+def load_results(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+# metric -> (direction, tolerance): 'higher' metrics may drop by the absolute
+# tolerance, 'lower' (latency) metrics may grow by the relative tolerance
+DEFAULT_THRESHOLDS = {
+    'recall_at_k': ('higher', 0.02),
+    'mrr': ('higher', 0.02),
+    'success_rate': ('higher', 0.01),
+    'throughput_qps': ('lower_is_worse', 0.15),
+    'p50_ms': ('lower', 0.20),
+    'p95_ms': ('lower', 0.25),
+    'p99_ms': ('lower', 0.30),
+}
+
+def compare(current, baseline, thresholds=DEFAULT_THRESHOLDS):
+    """
+    Compare two result dicts of the form ``{target: {metric: value}}``.
+
+    Returns:
+        list: (target, metric, baseline, current, regressed) rows
+    """
+    rows = []
+    for target, metrics in current.items():
+        base = baseline.get(target)
+        if not isinstance(metrics, dict) or not isinstance(base, dict):
+            continue
+        for metric, (direction, tolerance) in thresholds.items():
+            new, old = metrics.get(metric), base.get(metric)
+            if new is None or old is None:
+                continue
+            if direction == 'higher':
+                regressed = new < old - tolerance
+            elif direction == 'lower_is_worse':
+                regressed = new < old * (1 - tolerance)
+            else:
+                regressed = new > old * (1 + tolerance)
+            rows.append((target, metric, old, new, regressed))
+    return rows
+
+def print_comparison(rows):
+    print(f"\n{'target':<14}{'metric':<16}{'baseline':>12}{'current':>12}  ")
+    for target, metric, old, new, regressed in rows:
+        print(f"{target:<14}{metric:<16}{old:>12.3f}{new:>12.3f}  {'REGRESSED' if regressed else ''}")
+    return any(row[4] for row in rows)
@@ -0,0 +1,106 @@
+"""
+Retrieval quality and speed over a labelled query set.
+
+Runs every query through the RetrievalEngine that /api/query uses, once
+per index backend (chroma_db/ and vector_store/, built with
+``python build_db.py --backend all``), and reports recall@k, MRR,
+p50/p95/p99 latency (embedding included) and throughput.  Use it to pick
+RETRIEVAL_BACKEND for a deployment.  Results are saved under bench_results/
+so a later run can be checked against them:
+
+    python bench_retrieval.py                                   # both backends
+    python bench_retrieval.py --targets chroma --k 5
+    python bench_retrieval.py --compare bench_results/retrieval-20240101-120000.json
+
+Queries are JSON lines: {"query": "...", "relevant": ["source url", ...]}.
+A hit is any returned chunk whose source is in ``relevant``.
+"""
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from bench_report import latency_summary, save_results, load_results, compare, print_comparison
+
+def load_queries(path):
+    with open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def engine_target(backend):
+    import model_service
+    # Uncached, so repeated rounds measure retrieval rather than the result cache
+    engine = model_service.open_engine(backend, use_cache=False)
+    embeddings = model_service.get_embeddings()
+
+    def search(query, k):
+        docs, _ = engine.search(query, embeddings.embed_query(query), k)
+        return [doc.metadata.get('source') for doc in docs]
+    return search
+
+def evaluate(search, queries, k):
+    """Per-query quality and latency, one query at a time."""
+    latencies, recalls, reciprocal_ranks = [], [], []
+    for item in queries:
+        relevant = set(item['relevant'])
+        started = time.perf_counter()
+        sources = search(item['query'], k)
+        latencies.append(time.perf_counter() - started)
+        recalls.append(len(relevant & set(sources)) / len(relevant))
+        rank = next((i for i, source in enumerate(sources, 1) if source in relevant), None)
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+    return {
+        'recall_at_k': sum(recalls) / len(queries),
+        'hit_rate': sum(1 for r in reciprocal_ranks if r) / len(queries),
+        'mrr': sum(reciprocal_ranks) / len(queries),
+        **latency_summary(latencies)
+    }
+
+def throughput(search, queries, k, concurrency, rounds):
+    work = [item['query'] for item in queries] * rounds
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(lambda query: search(query, k), work))
+    return len(work) / (time.perf_counter() - started)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark retrieval quality and latency")
+    parser.add_argument('--queries', default='bench_queries.jsonl', help="Labelled queries (JSON lines)")
+    parser.add_argument('--targets', default='chroma,faiss', help="Comma list of backends: chroma, faiss")
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--concurrency', type=int, default=4, help="Threads for the throughput run")
+    parser.add_argument('--rounds', type=int, default=5, help="Passes over the queries for the throughput run")
+    parser.add_argument('--output', help="Results file (default bench_results/retrieval-<time>.json)")
+    parser.add_argument('--compare', help="Earlier results file to check for regressions")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    results = {'_config': {'queries': len(queries), 'k': args.k,
+                           'concurrency': args.concurrency, 'rounds': args.rounds}}
+
+    for name in (n.strip() for n in args.targets.split(',') if n.strip()):
+        try:
+            search = engine_target(name)
+            search(queries[0]['query'], args.k)  # warm up (model load, first mmap faults)
+        except Exception as e:
+            print(f"Skipping {name}: {e!r}")
+            continue
+        results[name] = evaluate(search, queries, args.k)
+        results[name]['throughput_qps'] = throughput(search, queries, args.k, args.concurrency, args.rounds)
+
+    print(f"\n{len(queries)} queries, k={args.k}")
+    print(f"{'target':<14}{'recall@k':>10}{'hit rate':>10}{'MRR':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'qps':>10}")
+    for name, row in results.items():
+        if name.startswith('_'):
+            continue
+        print(f"{name:<14}{row['recall_at_k']:>10.3f}{row['hit_rate']:>10.3f}{row['mrr']:>8.3f}"
+              f"{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}{row['p99_ms']:>10.2f}{row['throughput_qps']:>10.1f}")
+
+    path = save_results('retrieval', results, args.output)
+    print(f"\nSaved {path}")
+
+    if args.compare:
+        if print_comparison(compare(results, load_results(args.compare)['results'])):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import re
+import os
+import logging
+from collections import Counter
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FILE_NAME = 'bm25.npz'
+
+STOP_WORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'can', 'do', 'for', 'from', 'how',
+    'i', 'in', 'is', 'it', 'me', 'my', 'of', 'on', 'or', 'that', 'the', 'this', 'to',
+    'what', 'when', 'where', 'which', 'who', 'with', 'you', 'your'
+}
+
+# "COMP 352", "comp352" -> also emit the joined code as one token
+COURSE_CODE = re.compile(r'\b([a-z]{2,5})\s?(\d{3})\b')
+
+def tokenize(text):
+    text = (text or '').lower()
+    tokens = [t for t in re.findall(r'[a-z0-9]+', text) if t not in STOP_WORDS]
+    tokens.extend(f"{subject}{number}" for subject, number in COURSE_CODE.findall(text))
+    return tokens
+
+class BM25Index:
+    """
+    Compact in-memory BM25 index.
+
+    Postings are stored in CSR form (one offsets array plus flat document
+    and term-frequency arrays), so the whole index is a handful of numpy
+    arrays that load quickly and score a query with a few vectorized adds.
+    Documents are identified by the string ids of the vector store they sit
+    next to.
+    """
+
+    def __init__(self, terms, indptr, postings, frequencies, doc_lengths, doc_ids, k1=1.2, b=0.75):
+        self.vocab = {term: i for i, term in enumerate(terms)}
+        self.terms = terms
+        self.indptr = indptr
+        self.postings = postings
+        self.frequencies = frequencies
+        self.doc_lengths = doc_lengths
+        self.doc_ids = doc_ids
+        self.k1 = k1
+        self.b = b
+
+        count = len(doc_lengths)
+        document_frequency = np.diff(indptr).astype('float32')
+        self.idf = np.log(1 + (count - document_frequency + 0.5) / (document_frequency + 0.5)).astype('float32')
+        average = doc_lengths.mean() if count else 1.0
+        self.length_norm = (k1 * (1 - b + b * doc_lengths / max(average, 1e-9))).astype('float32')
+
+    @classmethod
+    def build(cls, doc_ids, texts, **kwargs):
+        postings = {}
+        doc_lengths = np.zeros(len(texts), dtype='float32')
+        for doc, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_lengths[doc] = sum(counts.values())
+            for term, tf in counts.items():
+                postings.setdefault(term, []).append((doc, tf))
+
+        terms = sorted(postings)
+        indptr = np.zeros(len(terms) + 1, dtype='int64')
+        np.cumsum([len(postings[t]) for t in terms], out=indptr[1:])
+        docs = np.empty(indptr[-1], dtype='uint32')
+        frequencies = np.empty(indptr[-1], dtype='float32')
+        for i, term in enumerate(terms):
+            entries = postings[term]
+            docs[indptr[i]:indptr[i + 1]] = [doc for doc, _ in entries]
+            frequencies[indptr[i]:indptr[i + 1]] = [tf for _, tf in entries]
+        return cls(terms, indptr, docs, frequencies, doc_lengths, [str(i) for i in doc_ids], **kwargs)
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(tmp_path, terms=np.array(self.terms), indptr=self.indptr, postings=self.postings,
+                 frequencies=self.frequencies, doc_lengths=self.doc_lengths,
+                 doc_ids=np.array(self.doc_ids), params=np.array([self.k1, self.b]))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            k1, b = data['params']
+            return cls(data['terms'].tolist(), data['indptr'], data['postings'], data['frequencies'],
+                       data['doc_lengths'], data['doc_ids'].tolist(), k1=float(k1), b=float(b))
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def search(self, query, k=10):
+        """
+        Returns:
+            list: (doc_id, score) pairs, best first
+        """
+        scores = None
+        for term in set(tokenize(query)):
+            tid = self.vocab.get(term)
+            if tid is None:
+                continue
+            if scores is None:
+                scores = np.zeros(len(self.doc_lengths), dtype='float32')
+            start, end = self.indptr[tid], self.indptr[tid + 1]
+            docs = self.postings[start:end]
+            tf = self.frequencies[start:end]
+            scores[docs] += self.idf[tid] * tf * (self.k1 + 1) / (tf + self.length_norm[docs])
+
+        if scores is None:
+            return []
+        hits = np.flatnonzero(scores)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.argsort(-scores[hits], kind='stable')]
+        return [(self.doc_ids[i], float(scores[i])) for i in hits]
+
+def load_index(folder_path):
+    """Load the BM25 index saved next to a vector store, or None if there isn't one."""
+    path = os.path.join(folder_path, FILE_NAME)
+    if not os.path.exists(path):
+        return None
+    try:
+        return BM25Index.load(path)
+    except Exception as e:
+        logger.warning("Could not load BM25 index %s: %s", path, e)
+        return None
@@ -1,13 +1,22 @@
-from document_loader import create_db
-
-def main():
-    print("Creating vector database...")
-    try:
-        create_db()
-        print("Database created successfully!")
-    except Exception as e:
-        print(f"Error creating database: {str(e)}")
-        exit(1)
-
-if __name__ == "__main__":
-    main()
\ No newline at end of file
+import argparse
+from document_loader import create_db
+from retrieval import BACKENDS
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the knowledge base")
+    parser.add_argument('--backend', choices=BACKENDS + ('all',),
+                        help="Index to build (default: RETRIEVAL_BACKEND)")
+    args = parser.parse_args()
+
+    backends = BACKENDS if args.backend == 'all' else [args.backend]
+    for backend in backends:
+        print(f"Creating vector database ({backend or 'default backend'})...")
+        try:
+            create_db(backend=backend)
+            print("Database created successfully!")
+        except Exception as e:
+            print(f"Error creating database: {str(e)}")
+            exit(1)
+
+if __name__ == "__main__":
+    main()
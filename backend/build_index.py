@@ -1,33 +1,8 @@
-from embeddings import VectorStore
+from document_loader import create_faiss_db
 
-urls = [
-    # Academic
-    "https://www.concordia.ca/academics.html",
-    "https://www.concordia.ca/students/registration.html",
-    "https://www.concordia.ca/students/your-sis.html",
-    
-    # Student Life
-    "https://www.concordia.ca/campus-life.html",
-    "https://www.concordia.ca/campus-life/clubs.html",
-    "https://www.concordia.ca/students/success.html",
-    
-    # Services
-    "https://www.concordia.ca/students/services.html",
-    "https://www.concordia.ca/students/financial-support.html",
-    "https://www.concordia.ca/students/health.html",
-    
-    # Research
-    "https://www.concordia.ca/research.html",
-    "https://www.concordia.ca/research/students.html",
-    
-    # Add more URLs as needed...
-]
-
-def build_index():
-    store = VectorStore()
-    store.add_concordia_pages(urls)
-    store.create_index()
-    store.save()
+# Kept for existing scripts; `python build_db.py --backend faiss` does the same
+def build_index(folder_path='vector_store'):
+    return create_faiss_db(persist_directory=folder_path)
 
 if __name__ == "__main__":
-    build_index() 
\ No newline at end of file
+    build_index()
@@ -0,0 +1,130 @@
+import os
+import json
+import mmap
+import struct
+import numpy as np
+
+# File layout (little endian):
+#   header   magic, version, chunk count, source count, then the byte offsets
+#            and lengths of the sections below
+#   offsets  uint64[count + 1]   start of each chunk in the blob (+ end marker)
+#   sources  uint32[count]       index into the source table for each chunk
+#   table    UTF-8 JSON list of unique source URLs
+#   blob     UTF-8 chunk texts, back to back
+MAGIC = b'QCHUNKS\x00'
+VERSION = 1
+HEADER = struct.Struct('<8sIIIQQQQQ')
+FILE_NAME = 'chunks.bin'
+
+def _pad(size, alignment=8):
+    return (alignment - size % alignment) % alignment
+
+def write_chunk_store(path, texts, sources):
+    """Write chunk texts and their sources in the compact format, atomically."""
+    if len(texts) != len(sources):
+        raise ValueError("texts and sources must have the same length")
+
+    table = []
+    table_index = {}
+    source_ids = np.empty(len(sources), dtype='<u4')
+    for i, source in enumerate(sources):
+        if source not in table_index:
+            table_index[source] = len(table)
+            table.append(source)
+        source_ids[i] = table_index[source]
+
+    encoded = [text.encode('utf-8') for text in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype='<u8')
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    table_bytes = json.dumps(table).encode('utf-8')
+
+    offsets_at = HEADER.size
+    sources_at = offsets_at + offsets.nbytes
+    table_at = sources_at + source_ids.nbytes
+    blob_at = table_at + len(table_bytes)
+    blob_at += _pad(blob_at)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(texts), len(table),
+                            offsets_at, sources_at, table_at, len(table_bytes), blob_at))
+        f.write(offsets.tobytes())
+        f.write(source_ids.tobytes())
+        f.write(table_bytes)
+        f.write(b'\x00' * _pad(table_at + len(table_bytes)))
+        for b in encoded:
+            f.write(b)
+    os.replace(tmp_path, path)
+
+class _Column:
+    """Read-only sequence view so callers can keep treating texts/sources as lists."""
+
+    def __init__(self, store, getter):
+        self._store = store
+        self._getter = getter
+
+    def __len__(self):
+        return len(self._store)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self._getter(j) for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self._getter(int(i))
+
+    def __iter__(self):
+        return (self._getter(i) for i in range(len(self)))
+
+class ChunkStore:
+    """
+    Memory-mapped reader for the file written by write_chunk_store.
+
+    Opening the store maps the file and reads only the header and the source
+    table; a chunk's text is decoded when it is asked for.  The pages are
+    shared through the OS page cache, so every worker process serving the same
+    file uses one copy.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, count, _, offsets_at, sources_at,
+         table_at, table_len, blob_at) = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a chunk store (version {VERSION})")
+
+        self._count = count
+        self._offsets = np.frombuffer(self._mmap, dtype='<u8', count=count + 1, offset=offsets_at)
+        self._source_ids = np.frombuffer(self._mmap, dtype='<u4', count=count, offset=sources_at)
+        self.source_table = json.loads(self._mmap[table_at:table_at + table_len].decode('utf-8'))
+        self._blob_at = blob_at
+        self.texts = _Column(self, self.text)
+        self.sources = _Column(self, self.source)
+
+    def __len__(self):
+        return self._count
+
+    def text(self, i):
+        start = self._blob_at + int(self._offsets[i])
+        end = self._blob_at + int(self._offsets[i + 1])
+        return self._mmap[start:end].decode('utf-8')
+
+    def source(self, i):
+        return self.source_table[self._source_ids[i]]
+
+    def close(self):
+        # numpy views must go before the map can be closed
+        self._offsets = self._source_ids = None
+        self._mmap.close()
+        self._file.close()
+
+def migrate_json(json_path, path):
+    """Convert a legacy vector_store/data.json into the chunk store format."""
+    with open(json_path, 'r') as f:
+        data = json.load(f)
+    write_chunk_store(path, data['texts'], data['sources'])
+    return len(data['texts'])
@@ -0,0 +1,159 @@
+import os
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', '1500'))
+# Word-shingle Jaccard similarity above which a chunk counts as a duplicate
+DUPLICATE_THRESHOLD = float(os.getenv('CONTEXT_DUPLICATE_THRESHOLD', '0.8'))
+DESCRIPTION_CHARS = 400
+SHINGLE_SIZE = 5
+# Shortest text overlap between two chunks worth trimming
+MIN_OVERLAP_CHARS = 40
+
+try:
+    import tiktoken
+    _encoding = tiktoken.encoding_for_model("gpt-3.5-turbo")
+except Exception:  # tiktoken is optional
+    _encoding = None
+
+def count_tokens(text):
+    """Prompt tokens for gpt-3.5-turbo; a word/punctuation estimate without tiktoken."""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return int(len(re.findall(r"\w+|[^\w\s]", text)) * 1.3)
+
+def verbose_course_context(course_info):
+    """The original, uncompressed course block; used as the baseline for savings."""
+    formatted_courses = []
+    for i, course in enumerate(course_info, 1):
+        if isinstance(course, dict):
+            formatted_courses.append(
+                f"Course {i}:\n"
+                f"  Course: {course.get('subject', '')} {course.get('catalog', '')}\n"
+                f"  Title: {course.get('title', '')}\n"
+                f"  Description: {course.get('description', '')}\n"
+                f"  Prerequisites: {course.get('prerequisites', 'None')}\n"
+                f"  Credits: {course.get('credits', 'N/A')}\n"
+                f"  Department: {course.get('department', 'N/A')}\n"
+                f"  Terms Offered: {', '.join(course.get('terms', []))}\n"
+                f"  Average Difficulty: {course.get('avgDifficulty', 0)}/5\n"
+                f"  Average Experience: {course.get('avgExperience', 0)}/5\n"
+                f"  Difficulty Distribution: {course.get('difficultyDistribution', {})}\n"
+                f"  Experience Distribution: {course.get('experienceDistribution', {})}"
+            )
+    return "\n\n".join(formatted_courses)
+
+def compact_course(course):
+    """One dense line per course; rating distributions are reduced to their averages."""
+    code = f"{course.get('subject', '')} {course.get('catalog', '')}".strip()
+    parts = [f"{code}: {course.get('title', '')}".strip()]
+    if course.get('credits'):
+        parts.append(f"{course['credits']} credits")
+    if course.get('prerequisites'):
+        parts.append(f"Prereqs: {course['prerequisites']}")
+    if course.get('terms'):
+        parts.append(f"Terms: {', '.join(course['terms'])}")
+    if course.get('avgDifficulty') or course.get('avgExperience'):
+        parts.append(f"Difficulty {course.get('avgDifficulty', 0)}/5, "
+                     f"experience {course.get('avgExperience', 0)}/5")
+    description = ' '.join((course.get('description') or '').split())
+    if len(description) > DESCRIPTION_CHARS:
+        description = description[:DESCRIPTION_CHARS].rsplit(' ', 1)[0] + '...'
+    if description:
+        parts.append(description)
+    return ' | '.join(parts)
+
+def _shingles(text):
+    words = re.findall(r'\w+', text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {' '.join(words)}
+    return {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+def _jaccard(a, b):
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+def _trim_overlap(kept, text):
+    """Drop the prefix of ``text`` that repeats the end of an already kept chunk."""
+    head = text[:MIN_OVERLAP_CHARS]
+    if len(head) < MIN_OVERLAP_CHARS:
+        return text
+    for other in kept:
+        start = other.find(head)
+        if start >= 0 and text.startswith(other[start:]):
+            return text[len(other) - start:].lstrip()
+    return text
+
+class ContextResult:
+    def __init__(self, text, stats):
+        self.text = text
+        self.stats = stats
+
+def build_context(docs, course_info, budget=CONTEXT_TOKEN_BUDGET, course_code=None):
+    """
+    Assemble the LLM context from retrieved chunks and course records.
+
+    Chunks are taken in retrieval order (best first). Near-duplicates are
+    dropped and text overlapping an earlier chunk is trimmed. Courses are
+    compressed to one line each, and the exact course asked about ranks
+    first. Items are added by relevance until ``budget`` tokens are used.
+
+    Returns:
+        ContextResult: the context text plus token accounting for logging
+    """
+    candidates = []  # (score, section, text)
+    kept_texts, kept_shingles = [], []
+    duplicates = 0
+    for rank, doc in enumerate(docs):
+        text = _trim_overlap(kept_texts, doc.page_content.strip())
+        shingles = _shingles(text)
+        if not text or any(_jaccard(shingles, other) >= DUPLICATE_THRESHOLD for other in kept_shingles):
+            duplicates += 1
+            continue
+        kept_texts.append(doc.page_content)
+        kept_shingles.append(shingles)
+        candidates.append((1.0 / (rank + 1), 'pages', text))
+
+    seen_codes = set()
+    for rank, course in enumerate(c for c in course_info or [] if isinstance(c, dict)):
+        code = f"{course.get('subject', '')}{course.get('catalog', '')}".upper()
+        if code in seen_codes:
+            duplicates += 1
+            continue
+        seen_codes.add(code)
+        exact = course_code and code == course_code
+        score = 2.0 if exact else 0.9 / (rank + 1)
+        candidates.append((score, 'courses', compact_course(course)))
+
+    selected = {'pages': [], 'courses': []}
+    used = 0
+    skipped = 0
+    for score, section, text in sorted(candidates, key=lambda c: -c[0]):
+        tokens = count_tokens(text)
+        if used + tokens > budget:
+            skipped += 1
+            continue
+        selected[section].append(text)
+        used += tokens
+
+    context = "\n\n".join(selected['pages'])
+    if selected['courses']:
+        context += "\n\nRelevant Course Information:\n" + "\n".join(selected['courses'])
+
+    baseline = "\n\n".join(doc.page_content for doc in docs)
+    if course_info:
+        baseline += "\n\nRelevant Course Information:\n" + verbose_course_context(course_info)
+    stats = {
+        'budget': budget,
+        'tokens_before': count_tokens(baseline),
+        'tokens_after': count_tokens(context),
+        'duplicates_dropped': duplicates,
+        'over_budget_skipped': skipped
+    }
+    stats['tokens_saved'] = stats['tokens_before'] - stats['tokens_after']
+    logger.info("Context: %d -> %d prompt tokens (saved %d)",
+                stats['tokens_before'], stats['tokens_after'], stats['tokens_saved'])
+    return ContextResult(context, stats)
@@ -0,0 +1,129 @@
+import os
+import threading
+import logging
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from models import db, Conversation, Message
+from context_builder import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# Turns (question + answer) always sent verbatim
+RECENT_TURNS = int(os.getenv('CONVERSATION_RECENT_TURNS', '3'))
+# Once the unsummarized history exceeds this, everything but the recent turns is folded into the summary
+SUMMARY_TRIGGER_TOKENS = int(os.getenv('CONVERSATION_SUMMARY_TRIGGER_TOKENS', '1200'))
+SUMMARY_MAX_TOKENS = int(os.getenv('CONVERSATION_SUMMARY_MAX_TOKENS', '250'))
+TITLE_CHARS = 80
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a Concordia University student and ConuAI.
+Update the summary with the new messages. Keep facts the assistant will need for follow-up questions:
+the student's program and goals, courses and codes discussed, decisions, and open questions.
+Drop greetings and repetition. Write at most {words} words of plain text."""
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='summarizer')
+_pending = set()
+_pending_lock = threading.Lock()
+
+def get_or_create(user_id, conversation_id, first_query):
+    """
+    The user's conversation ``conversation_id``, or a new one when it is None.
+    A new conversation isn't saved until record_turn stores its first turn,
+    so a request that fails before answering leaves no empty row behind.
+
+    Returns:
+        Conversation: or None if the id doesn't exist or belongs to someone else
+    """
+    if conversation_id:
+        return Conversation.query.filter_by(id=conversation_id, user_id=user_id).first()
+    return Conversation(user_id=user_id, title=first_query.strip()[:TITLE_CHARS])
+
+def _unsummarized(conversation):
+    return conversation.messages.filter(Message.id > (conversation.summarized_through or 0)).all()
+
+def history_messages(conversation):
+    """
+    Chat messages carrying the conversation so far: the rolling summary as a
+    system message, then the turns not yet folded into it.  The folding in
+    ``maybe_summarize`` keeps this below roughly summary + SUMMARY_TRIGGER_TOKENS.
+    """
+    messages = []
+    if conversation.id is None:
+        return messages
+    if conversation.summary:
+        messages.append({"role": "system",
+                         "content": f"Summary of the conversation so far:\n{conversation.summary}"})
+    messages.extend({"role": m.role, "content": m.content} for m in _unsummarized(conversation))
+    return messages
+
+def record_turn(conversation, question, answer):
+    conversation.updated_at = datetime.utcnow()
+    if conversation.id is None:
+        # First answered turn of a new conversation: save it now to get its id
+        db.session.add(conversation)
+        db.session.flush()
+    db.session.add(Message(conversation_id=conversation.id, role='user',
+                           content=question, tokens=count_tokens(question)))
+    db.session.add(Message(conversation_id=conversation.id, role='assistant',
+                           content=answer, tokens=count_tokens(answer)))
+    db.session.commit()
+
+def _fallback_summary(previous, messages):
+    # Used when the LLM call fails: keep the questions, which carry most of the topic
+    questions = [m.content.strip().replace('\n', ' ')[:200] for m in messages if m.role == 'user']
+    lines = [previous] if previous else []
+    lines.extend(f"- Student asked: {q}" for q in questions)
+    return '\n'.join(lines)
+
+def summarize(llm, previous, messages):
+    """New rolling summary from the previous one plus ``messages``."""
+    transcript = '\n'.join(f"{m.role}: {m.content}" for m in messages)
+    prompt = f"Current summary:\n{previous or '(none)'}\n\nNew messages:\n{transcript}"
+    try:
+        return llm.complete([
+            {"role": "system", "content": SUMMARY_PROMPT.format(words=SUMMARY_MAX_TOKENS)},
+            {"role": "user", "content": prompt}
+        ], temperature=0.2, max_tokens=SUMMARY_MAX_TOKENS * 2)
+    except Exception as e:
+        logger.warning("Conversation summary failed, keeping questions only: %s", e)
+        return _fallback_summary(previous, messages)
+
+def maybe_summarize(conversation, llm):
+    """
+    Fold older turns into the rolling summary once the unsummarized history
+    is over SUMMARY_TRIGGER_TOKENS.  The last RECENT_TURNS turns stay verbatim.
+
+    Returns:
+        bool: Whether the summary was updated
+    """
+    messages = _unsummarized(conversation)
+    if sum(m.tokens or 0 for m in messages) <= SUMMARY_TRIGGER_TOKENS:
+        return False
+    older = messages[:-RECENT_TURNS * 2] if RECENT_TURNS else messages
+    if not older:
+        return False
+    conversation.summary = summarize(llm, conversation.summary, older)
+    conversation.summarized_through = older[-1].id
+    db.session.commit()
+    logger.info("Conversation %d: folded %d messages into the summary", conversation.id, len(older))
+    return True
+
+def summarize_in_background(app, conversation_id, llm):
+    """Run maybe_summarize off the request path; at most one run per conversation at a time."""
+    with _pending_lock:
+        if conversation_id in _pending:
+            return
+        _pending.add(conversation_id)
+
+    def run():
+        try:
+            with app.app_context():
+                conversation = db.session.get(Conversation, conversation_id)
+                if conversation:
+                    maybe_summarize(conversation, llm)
+        except Exception:
+            logger.exception("Background summary failed for conversation %d", conversation_id)
+        finally:
+            with _pending_lock:
+                _pending.discard(conversation_id)
+
+    _executor.submit(run)
@@ -1,13 +1,137 @@
+import os
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import logging
 import json
 import re
+from cache import TTLCache, MISSING
+from course_catalog import load_catalog
 
 logger = logging.getLogger(__name__)
 
+class CourseClient:
+    """
+    Pooled, cached HTTP client for the Concordia course service.
+
+    Keeps one ``requests.Session`` (and so one pool of keep-alive
+    connections) for the life of the process and caches successful responses
+    in an LRU cache with a TTL.  Course data changes once per term, so most
+    lookups are answered without leaving the process.
+
+    Unknown course codes can be negatively cached with their own, shorter TTL
+    so repeated questions about a typo don't hit the network every time.
+    Only a real "not found" answer is cached that way; timeouts, connection
+    errors and 5xx/429 responses raise and are never cached, so a short
+    outage doesn't turn into "course not found" for the whole TTL.
+    """
+
+    def __init__(self, base_url, timeout=5.0, pool_size=10, cache_size=512,
+                 cache_ttl=6 * 3600, negative_ttl=3600):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.negative_ttl = negative_ttl
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self.requests_sent = 0
+
+        self.session = requests.Session()
+        self.session.headers.update({'Accept': 'application/json'})
+        retry = Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504],
+                      allowed_methods=['GET'])
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _get_json(self, path, params=None):
+        """
+        Returns:
+            tuple: (HTTP status code, decoded body; {} for a 404 without JSON)
+
+        Raises:
+            requests.RequestException: Transport errors and 5xx/429 responses
+        """
+        self.requests_sent += 1
+        response = self.session.get(f"{self.base_url}{path}", params=params, timeout=self.timeout)
+        logger.debug("Course API %s -> %s", path, response.status_code)
+        if response.status_code >= 500 or response.status_code == 429:
+            response.raise_for_status()
+        try:
+            return response.status_code, response.json()
+        except ValueError:
+            if response.status_code == 404:
+                return 404, {}
+            raise
+
+    @staticmethod
+    def _not_found(status_code, result):
+        """True for an answer that really says "no such course" (the only kind cached negatively)."""
+        if status_code == 404 or result.get('status') == 'NOT_FOUND':
+            return True
+        return status_code == 200 and result.get('status') == 'OK' and not result.get('payload')
+
+    def get_course(self, course_id):
+        """
+        Fetch one course by code (e.g. 'COMP352').
+
+        Returns:
+            dict: Course payload, or None if the code is unknown
+        """
+        key = ('course', course_id)
+        cached = self.cache.get(key)
+        if cached is not MISSING:
+            return cached
+
+        status_code, result = self._get_json(f"/api/v1/courses/{course_id}")
+        if result.get('status') == 'OK' and result.get('payload'):
+            self.cache.set(key, result['payload'])
+            return result['payload']
+
+        if self.negative_ttl and self._not_found(status_code, result):
+            self.cache.set(key, None, ttl=self.negative_ttl)
+        return None
+
+    def search_courses(self, query, limit=5):
+        """
+        Full text course search.
+
+        Returns:
+            list: Matching course payloads (possibly empty)
+        """
+        key = ('search', query.strip().lower(), limit)
+        cached = self.cache.get(key)
+        if cached is not MISSING:
+            return cached
+
+        status_code, result = self._get_json("/api/v1/search/course", params={"query": query, "limit": limit})
+        courses = []
+        if result.get('status') == 'OK' and isinstance(result.get('payload'), list):
+            courses = result['payload'][:limit]
+        if courses:
+            self.cache.set(key, courses)
+        elif self.negative_ttl and self._not_found(status_code, result):
+            self.cache.set(key, courses, ttl=self.negative_ttl)
+        return courses
+
+    def stats(self):
+        stats = self.cache.stats()
+        stats['requests_sent'] = self.requests_sent
+        return stats
+
 class CourseAPI:
-    BASE_URL = "https://concordia-courses-production.up.railway.app"
-    
+    BASE_URL = os.getenv('COURSE_API_URL', "https://concordia-courses-production.up.railway.app")
+
+    client = CourseClient(
+        BASE_URL,
+        timeout=float(os.getenv('COURSE_API_TIMEOUT', '5')),
+        cache_size=int(os.getenv('COURSE_CACHE_SIZE', '512')),
+        cache_ttl=float(os.getenv('COURSE_CACHE_TTL', str(6 * 3600))),
+        negative_ttl=float(os.getenv('COURSE_NEGATIVE_TTL', '3600'))
+    )
+
+    # Local snapshot written by sync_courses.py; when present it answers every
+    # lookup and the network is only used to refresh it.
+    catalog = load_catalog()
+
     @staticmethod
     def parse_course_code(query):
         """Parse course code from query (e.g., 'COMP 352' -> 'COMP352')"""
@@ -17,92 +141,65 @@ class CourseAPI:
         if match:
             return f"{match.group(1)}{match.group(2)}"
         return None
-    
+
+    @staticmethod
+    def search_catalog(query, course_id, limit=5):
+        """Answer a search from the local catalog snapshot."""
+        catalog = CourseAPI.catalog
+        catalog.refresh_if_changed()
+        if course_id:
+            course = catalog.lookup(course_id)
+            if course:
+                logger.debug("Found exact match for %s in local catalog", course_id)
+                return [course]
+        courses = catalog.search(query, limit=limit)
+        logger.debug("Found %d courses in local catalog", len(courses))
+        return courses
+
     @staticmethod
     def search(query, limit=5):
         """
         Search courses using the course search endpoint.
-        
+
         Args:
             query (str): The search query
-            limit (int): Maximum number of results to return (default: 3)
-            
+            limit (int): Maximum number of results to return (default: 5)
+
         Returns:
-            dict: Response object with status and payload, or None if error
+            list: Matching courses, or an empty list if error
         """
         try:
-            print("\n========== Course Search Debug ==========")
-            print(f"Query: '{query}'")
-            print(f"Limit: {limit}")
-            
+            logger.debug("Course search: %r (limit %d)", query, limit)
+
             # Parse course code if present
             course_id = CourseAPI.parse_course_code(query)
+
+            if CourseAPI.catalog is not None:
+                return CourseAPI.search_catalog(query, course_id, limit)
+
             if course_id:
-                print(f"Detected course code: {course_id}")
-                
+                logger.debug("Detected course code: %s", course_id)
+
                 # Use the direct course endpoint
-                url = f"{CourseAPI.BASE_URL}/api/v1/courses/{course_id}"
-                headers = {
-                    'Accept': 'application/json'
-                }
-                
-                print(f"\nRequest URL: {url}")
-                
-                response = requests.get(url, headers=headers)
-                print(f"\nResponse Status: {response.status_code}")
-                
-                try:
-                    result = response.json()
-                    print(f"\nRaw Response Body:")
-                    print(json.dumps(result, indent=2))
-                    
-                    if result.get('status') == 'OK' and result.get('payload'):
-                        print(f"\nFound exact match for {course_id}")
-                        return [result['payload']]  # Return as list for consistency
-                    
-                    print(f"\nNo exact match found for {course_id}")
-                    
-                except json.JSONDecodeError:
-                    print(f"\nInvalid JSON Response. Raw Text:")
-                    print(response.text)
-                    return []
-            
+                course = CourseAPI.client.get_course(course_id)
+                if course:
+                    logger.debug("Found exact match for %s", course_id)
+                    return [course]  # Return as list for consistency
+
+                logger.debug("No exact match found for %s", course_id)
+
             # Fall back to general search if no course code or exact match not found
-            url = f"{CourseAPI.BASE_URL}/api/v1/search/course"
-            params = {
-                "query": query,
-                "limit": limit
-            }
-            headers = {
-                'Accept': 'application/json'
-            }
-            
-            print(f"\nFalling back to search endpoint")
-            print(f"URL: {url}")
-            print(f"Parameters: {json.dumps(params, indent=2)}")
-            
-            response = requests.get(url, params=params, headers=headers)
-            print(f"\nResponse Status: {response.status_code}")
-            
-            try:
-                result = response.json()
-                if result.get('status') == 'OK' and isinstance(result.get('payload'), list):
-                    courses = result['payload']
-                    print(f"\nFound {len(courses)} courses in search")
-                    return courses[:limit]
-            except:
-                return []
-            
-            return []
-                
+            logger.debug("Falling back to search endpoint")
+            courses = CourseAPI.client.search_courses(query, limit=limit)
+            logger.debug("Found %d courses in search", len(courses))
+            return courses
+
         except requests.RequestException as e:
-            print(f"\nRequest Error: {str(e)}")
+            logger.warning("Course API request error: %s", e)
+            return []
+        except json.JSONDecodeError:
+            logger.warning("Invalid JSON response from course API")
             return []
-        except Exception as e:
-            print(f"\nUnexpected Error: {str(e)}")
-            print(f"Error Type: {type(e)}")
-            import traceback
-            print(f"Traceback:\n{traceback.format_exc()}")
+        except Exception:
+            logger.exception("Unexpected error in course search")
             return []
-        finally:
-            print("\n========== End Course Search Debug ==========\n")
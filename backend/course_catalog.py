@@ -0,0 +1,155 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+# Next to this file by default, wherever the app is started from
+DEFAULT_CATALOG_PATH = os.getenv('COURSE_CATALOG_PATH', os.path.join(os.path.dirname(__file__), 'course_catalog.db'))
+
+STOP_WORDS = {
+    'a', 'an', 'and', 'are', 'about', 'can', 'course', 'courses', 'do', 'does', 'for',
+    'how', 'i', 'in', 'is', 'it', 'me', 'my', 'of', 'on', 'or', 'tell', 'the', 'to',
+    'what', 'which', 'with', 'you'
+}
+
+TITLE_WEIGHT = 3
+DESCRIPTION_WEIGHT = 1
+
+def tokenize(text):
+    return [t for t in re.findall(r'[a-z0-9]+', (text or '').lower())
+            if len(t) > 1 and t not in STOP_WORDS]
+
+def course_code(course):
+    """Key used by the index; matches CourseAPI.parse_course_code ('COMP352')."""
+    return f"{course.get('subject', '')}{course.get('catalog', '')}".replace(' ', '').upper()
+
+def write_snapshot(courses, path=DEFAULT_CATALOG_PATH):
+    """
+    Write a full catalog snapshot to a SQLite file.
+
+    The new snapshot is written next to the old one and swapped in with an
+    atomic rename, so running processes never see a half-written catalog.
+    """
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute("CREATE TABLE courses (code TEXT PRIMARY KEY, payload TEXT NOT NULL)")
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+        rows = {}
+        for course in courses:
+            code = course_code(course)
+            if code:
+                rows[code] = json.dumps(course, separators=(',', ':'))
+        conn.executemany("INSERT INTO courses (code, payload) VALUES (?, ?)", rows.items())
+        conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [
+            ('synced_at', str(time.time())),
+            ('course_count', str(len(rows)))
+        ])
+        conn.commit()
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, path)
+    return len(rows)
+
+class CourseCatalog:
+    """
+    In-memory view of a local course catalog snapshot.
+
+    Holds every course keyed by its code plus an inverted token index over
+    titles and descriptions, so lookups never leave the process.  The
+    snapshot file is re-read when it changes on disk (after a sync).
+    """
+
+    def __init__(self, path=DEFAULT_CATALOG_PATH, check_interval=60):
+        self.path = path
+        self.check_interval = check_interval
+        self.by_code = {}
+        self.tokens = {}
+        self.synced_at = None
+        self._mtime = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return bool(self.by_code)
+
+    def load(self):
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        try:
+            rows = conn.execute("SELECT code, payload FROM courses").fetchall()
+            meta = dict(conn.execute("SELECT key, value FROM meta").fetchall())
+        finally:
+            conn.close()
+
+        by_code = {}
+        tokens = defaultdict(dict)
+        for code, payload in rows:
+            course = json.loads(payload)
+            by_code[code] = course
+            for token in tokenize(course.get('title')):
+                tokens[token][code] = tokens[token].get(code, 0) + TITLE_WEIGHT
+            for token in tokenize(course.get('description')):
+                tokens[token][code] = tokens[token].get(code, 0) + DESCRIPTION_WEIGHT
+
+        # Swap in fully built structures so concurrent readers never see a partial index
+        self.by_code = by_code
+        self.tokens = dict(tokens)
+        self.synced_at = float(meta['synced_at']) if meta.get('synced_at') else None
+        self._mtime = os.path.getmtime(self.path)
+        logger.info("Loaded %d courses from %s", len(by_code), self.path)
+        return self
+
+    def refresh_if_changed(self):
+        """Reload the snapshot if the file was replaced since the last load."""
+        now = time.monotonic()
+        if now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self.load()
+
+    def lookup(self, code):
+        return self.by_code.get(code)
+
+    def search(self, query, limit=5):
+        """Rank courses by weighted title/description token matches."""
+        scores = defaultdict(int)
+        for token in set(tokenize(query)):
+            for code, weight in self.tokens.get(token, {}).items():
+                scores[code] += weight
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return [self.by_code[code] for code, _ in ranked[:limit]]
+
+    def stats(self):
+        return {
+            'courses': len(self.by_code),
+            'tokens': len(self.tokens),
+            'synced_at': self.synced_at
+        }
+
+def load_catalog(path=DEFAULT_CATALOG_PATH):
+    """Return a loaded CourseCatalog, or None if no snapshot has been synced yet."""
+    if not os.path.exists(path):
+        return None
+    try:
+        return CourseCatalog(path).load()
+    except Exception as e:
+        logger.warning("Could not load course catalog %s: %s", path, e)
+        return None
@@ -1,42 +1,103 @@
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.document_loaders import WebBaseLoader
 from langchain.vectorstores import Chroma
-from langchain.embeddings import HuggingFaceEmbeddings
 import os
 from dotenv import load_dotenv
+import model_service
+from ingest import sync_chroma, write_corpus_version, MANIFEST_NAME
+from bm25 import BM25Index, FILE_NAME as BM25_FILE
 
 load_dotenv()
 
-def create_db():
-    # URLs to scrape
-    urls = [
-        "https://www.concordia.ca/academics.html",
-        "https://www.concordia.ca/students/success.html",
-        "https://www.concordia.ca/students/financial-support.html",
-        "https://www.concordia.ca/admissions.html",
-        "https://www.concordia.ca/campus-life/clubs.html",
-    ]
-
-    # Load documents
-    loader = WebBaseLoader(urls)
-    documents = loader.load()
-
-    # Split documents
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200
+# URLs to scrape, for every index backend
+URLS = [
+    # Academic
+    "https://www.concordia.ca/academics.html",
+    "https://www.concordia.ca/admissions.html",
+    "https://www.concordia.ca/students/registration.html",
+    "https://www.concordia.ca/students/your-sis.html",
+
+    # Student Life
+    "https://www.concordia.ca/campus-life.html",
+    "https://www.concordia.ca/campus-life/clubs.html",
+    "https://www.concordia.ca/students/success.html",
+
+    # Services
+    "https://www.concordia.ca/students/services.html",
+    "https://www.concordia.ca/students/financial-support.html",
+    "https://www.concordia.ca/students/health.html",
+
+    # Research
+    "https://www.concordia.ca/research.html",
+    "https://www.concordia.ca/research/students.html",
+]
+
+def create_db(urls=URLS, persist_directory=None, backend=None):
+    """
+    Build or refresh the knowledge base for one index backend.
+
+    Args:
+        backend (str): 'chroma' or 'faiss' (default: RETRIEVAL_BACKEND)
+        persist_directory (str): Index folder (default: CHROMA_DIR / FAISS_DIR)
+    """
+    backend = backend or model_service.RETRIEVAL_BACKEND
+    persist_directory = persist_directory or model_service.index_dir(backend)
+    if backend == 'faiss':
+        return create_faiss_db(urls, persist_directory)
+    return create_chroma_db(urls, persist_directory)
+
+def create_chroma_db(urls=URLS, persist_directory="./chroma_db"):
+    """
+    Build or refresh the Chroma knowledge base.
+
+    Runs incrementally: unchanged pages are skipped via conditional GET and
+    only new or changed chunks are embedded (see ingest.sync_chroma).
+    Chunking (ingest.chunk_text) is the same for every backend.
+    """
+    # Open (or create) the vector store
+    embeddings = model_service.get_embeddings()
+    vectordb = Chroma(
+        persist_directory=persist_directory,
+        embedding_function=embeddings
     )
-    splits = text_splitter.split_documents(documents)
-
-    # Create vector store
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-    vectordb = Chroma.from_documents(
-        documents=splits,
-        embedding=embeddings,
-        persist_directory="./chroma_db"
+
+    stats = sync_chroma(
+        vectordb,
+        urls,
+        embeddings,
+        manifest_path=os.path.join(persist_directory, MANIFEST_NAME)
     )
-    
+    print(f"Knowledge base sync: {stats}")
+
+    # Rebuild the lexical index over the same chunks, keyed by Chroma id
+    chunks = vectordb._collection.get(include=['documents'])
+    BM25Index.build(chunks['ids'], chunks['documents']).save(os.path.join(persist_directory, BM25_FILE))
+    print(f"BM25 index built over {len(chunks['ids'])} chunks")
+
+    version = write_corpus_version(persist_directory, sorted(chunks['ids']),
+                                   backend='chroma', model=model_service.MODEL_NAME)
+    print(f"Corpus version {version}")
+
     return vectordb
 
+def create_faiss_db(urls=URLS, persist_directory="./vector_store"):
+    """
+    Build the FAISS knowledge base (index, chunk store and BM25 index).
+
+    Vectors of chunks that didn't change since the last build are reused
+    (see VectorStore.add_concordia_pages).
+    """
+    from embeddings import VectorStore
+    store = VectorStore()
+
+    previous = None
+    if os.path.exists(os.path.join(persist_directory, 'index.faiss')):
+        previous = VectorStore(model=store.model)
+        previous.load(persist_directory)
+
+    store.add_concordia_pages(urls, previous=previous)
+    store.create_index()
+    store.save(persist_directory)
+    print(f"FAISS knowledge base built over {len(store.texts)} chunks")
+    return store
+
 if __name__ == "__main__":
-    create_db() 
\ No newline at end of file
+    create_db()
@@ -0,0 +1,138 @@
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+class EmbeddingBatcher:
+    """
+    Micro-batches concurrent embedding requests into one encoder call.
+
+    Callers block in ``embed`` while a background thread gathers queued texts
+    for up to ``max_wait_ms`` (or until ``max_batch`` texts are waiting),
+    encodes them in a single forward pass and hands each caller its row.
+    Under load this replaces many batch-of-one passes with a few larger ones.
+
+    Args:
+        encode_fn (callable): Maps a list of texts to a 2D array of embeddings
+        max_batch (int): Largest batch sent to the encoder
+        max_wait_ms (float): How long the first text in a batch may wait for company
+        timeout (float): Longest a caller waits for its embeddings before giving up
+    """
+
+    def __init__(self, encode_fn, max_batch=32, max_wait_ms=5.0, timeout=30.0):
+        self.encode_fn = encode_fn
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+        self.max_queue_depth = 0
+        self.encode_seconds = 0.0
+        self.wait_seconds = 0.0
+
+    def _ensure_worker(self):
+        # Threads don't survive fork, so each worker process starts its own (and a dead one is replaced)
+        if self._pid != os.getpid() or not self._thread.is_alive():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue()
+                elif self._thread.is_alive():
+                    return
+                else:
+                    logger.error("Embedding batcher thread died, restarting it")
+                self._thread = threading.Thread(target=self._run, name='embedding-batcher', daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+
+    def embed(self, text):
+        return self.embed_many([text])[0]
+
+    def embed_many(self, texts):
+        """
+        Raises:
+            concurrent.futures.TimeoutError: No embeddings within ``timeout`` seconds
+            Exception: Whatever the encoder raised for the batch
+        """
+        self._ensure_worker()
+        futures = []
+        for text in texts:
+            future = Future()
+            self._queue.put((text, future, time.perf_counter()))
+            futures.append(future)
+        depth = self._queue.qsize()
+        if depth > self.max_queue_depth:
+            self.max_queue_depth = depth
+        deadline = time.monotonic() + self.timeout
+        return [future.result(timeout=max(0.0, deadline - time.monotonic())) for future in futures]
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    @staticmethod
+    def _fail(batch, error):
+        """Fail every caller in ``batch`` still waiting, so none is left blocked."""
+        for _, future, _ in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                self._encode(batch)
+            except Exception as e:
+                logger.warning("Embedding batch of %d failed: %s", len(batch), e)
+                self._fail(batch, e)
+            except BaseException:
+                self._fail(batch, RuntimeError("Embedding batcher stopped"))
+                raise
+
+    def _encode(self, batch):
+        started = time.perf_counter()
+        vectors = self.encode_fn([text for text, _, _ in batch])
+        finished = time.perf_counter()
+        if len(vectors) != len(batch):
+            raise ValueError(f"Encoder returned {len(vectors)} embeddings for {len(batch)} texts")
+
+        for (_, future, queued_at), vector in zip(batch, vectors):
+            self.wait_seconds += started - queued_at
+            future.set_result(vector.tolist() if hasattr(vector, 'tolist') else list(vector))
+
+        self.batches += 1
+        self.items += len(batch)
+        self.encode_seconds += finished - started
+        if len(batch) > self.largest_batch:
+            self.largest_batch = len(batch)
+
+    def stats(self):
+        return {
+            'max_batch': self.max_batch,
+            'max_wait_ms': self.max_wait_ms,
+            'queue_depth': self._queue.qsize(),
+            'max_queue_depth': self.max_queue_depth,
+            'batches': self.batches,
+            'items': self.items,
+            'largest_batch': self.largest_batch,
+            'avg_batch_size': self.items / self.batches if self.batches else 0.0,
+            'avg_queue_wait_ms': 1000 * self.wait_seconds / self.items if self.items else 0.0,
+            'avg_encode_ms': 1000 * self.encode_seconds / self.batches if self.batches else 0.0
+        }
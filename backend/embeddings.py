@@ -1,51 +1,141 @@
-from sentence_transformers import SentenceTransformer
 import faiss
 import numpy as np
 import os
-import json
-from bs4 import BeautifulSoup
-import requests
+import logging
+import model_service
+from ingest import iter_pages, chunk_id, write_corpus_version, read_corpus_version, EMBED_BATCH_SIZE, INGEST_PROCESSES
+from query_cache import QueryCache, QUERY_CACHE_ENABLED
+from index_factory import make_index, tune_from_env
+from bm25 import BM25Index, load_index as load_bm25, FILE_NAME as BM25_FILE
+from retrieval import RetrievalEngine, FaissBackend, RETRIEVAL_CANDIDATES
+from chunk_store import ChunkStore, write_chunk_store, migrate_json, FILE_NAME as CHUNKS_FILE
+
+logger = logging.getLogger(__name__)
 
 class VectorStore:
-    def __init__(self):
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+    def __init__(self, model=None):
+        # Share the process-wide MiniLM instance instead of loading a second copy
+        self.model = model if model is not None else model_service.get_sentence_transformer()
         self.index = None
         self.texts = []
         self.sources = []
+        self.chunks = None
+        self.bm25 = None
+        # Vectors computed while adding pages, row for row with texts
+        self.vectors = []
+        self.embedded = 0
+        self.reused = 0
+        self.description = None
+        self.version = None
+        self.engine = None
+        self.query_cache = QueryCache() if QUERY_CACHE_ENABLED else None
         
-    def add_concordia_pages(self, urls):
-        for url in urls:
-            try:
-                response = requests.get(url)
-                soup = BeautifulSoup(response.text, 'html.parser')
-                
-                # Remove script and style elements
-                for script in soup(["script", "style"]):
-                    script.decompose()
-                
-                # Get text and clean it
-                text = soup.get_text(separator=' ', strip=True)
-                
-                # Split into chunks of roughly 1000 characters
-                chunks = [text[i:i+1000] for i in range(0, len(text), 1000)]
-                
-                for chunk in chunks:
-                    self.texts.append(chunk)
-                    self.sources.append(url)
-                    
-            except Exception as e:
-                print(f"Error scraping {url}: {e}")
+    def add_concordia_pages(self, urls, previous=None, processes=INGEST_PROCESSES):
+        """
+        Fetch, extract and chunk pages (ingest.iter_pages) and embed the
+        chunks in batches as they arrive, while later pages are still being
+        fetched and parsed.
+
+        Args:
+            previous (VectorStore): Previously built store; vectors of chunks
+                whose content hash is unchanged are copied from it instead of
+                being re-embedded (only possible if it stored exact vectors).
+                Pages that fail to fetch keep their chunks from it.
+        """
+        reusable = self._reusable_rows(previous)
+        kept = {}
+        if previous is not None:
+            for text, source in zip(previous.texts, previous.sources):
+                kept.setdefault(source, []).append(text)
+        pending = []
+
+        def flush():
+            vectors = self.model.encode([self.texts[i] for i in pending], batch_size=EMBED_BATCH_SIZE)
+            for i, vector in zip(pending, vectors):
+                self.vectors[i] = vector
+            self.embedded += len(pending)
+            pending.clear()
+
+        for result, chunks in iter_pages(urls, processes=processes):
+            if result.status in ('error', 'unchanged'):
+                # Keep whatever the previous build had for this page
+                chunks = kept.get(result.url, [])
+                if result.status == 'error':
+                    logger.warning("Error fetching %s: %s (keeping %d previous chunks)",
+                                   result.url, result.error, len(chunks))
+            elif result.status != 'changed':
+                logger.info("%s is gone, dropping its chunks", result.url)
+                continue
+            for chunk in chunks:
+                row = reusable.get(chunk_id(result.url, chunk))
+                self.texts.append(chunk)
+                self.sources.append(result.url)
+                if row is not None:
+                    self.vectors.append(previous.index.reconstruct(row))
+                    self.reused += 1
+                else:
+                    self.vectors.append(None)
+                    pending.append(len(self.texts) - 1)
+                    if len(pending) >= EMBED_BATCH_SIZE:
+                        flush()
+        if pending:
+            flush()
+
+    def _reusable_rows(self, previous):
+        if (previous is None or previous.index is None
+                or not isinstance(faiss.downcast_index(previous.index), faiss.IndexFlat)):
+            return {}
+        return {
+            chunk_id(source, text): i
+            for i, (text, source) in enumerate(zip(previous.texts, previous.sources))
+        }
     
-    def create_index(self):
-        # Create embeddings
-        embeddings = self.model.encode(self.texts)
-        
-        # Initialize FAISS index
-        dimension = embeddings.shape[1]
-        self.index = faiss.IndexFlatL2(dimension)
+    def create_index(self, previous=None, index_type=None, storage=None, **index_params):
+        """
+        Build the FAISS index over all chunks, embedding any that
+        add_concordia_pages didn't already.
+
+        Args:
+            previous (VectorStore): Previously built store to copy unchanged vectors from
+            index_type (str): 'flat', 'ivf', 'ivfpq' or 'hnsw' (default: FAISS_INDEX_TYPE or 'flat')
+            storage (str): 'float32', 'float16' or 'pq' (default: FAISS_INDEX_STORAGE or 'float32')
+            index_params: Passed to index_factory.make_index (nlist, pq_m, hnsw_m, ...)
+        """
+        index_type = index_type or os.getenv('FAISS_INDEX_TYPE', 'flat')
+        storage = storage or os.getenv('FAISS_INDEX_STORAGE', 'float32')
+
+        reusable = self._reusable_rows(previous)
+
+        # Create embeddings, only for new or changed chunks
+        dimension = self.model.get_sentence_embedding_dimension()
+        embeddings = np.zeros((len(self.texts), dimension), dtype='float32')
+        if self.vectors:
+            embeddings[:len(self.vectors)] = np.asarray(self.vectors, dtype='float32')
+        missing = []
+        for i in range(len(self.vectors), len(self.texts)):
+            row = reusable.get(chunk_id(self.sources[i], self.texts[i]))
+            if row is not None:
+                embeddings[i] = previous.index.reconstruct(row)
+                self.reused += 1
+            else:
+                missing.append(i)
+        if missing:
+            embeddings[missing] = self.model.encode(
+                [self.texts[i] for i in missing], batch_size=EMBED_BATCH_SIZE
+            )
+            self.embedded += len(missing)
+        print(f"Embedded {self.embedded} new chunks, reused {self.reused}")
+        self.embedded = self.reused = 0
         
-        # Add vectors to the index
-        self.index.add(np.array(embeddings).astype('float32'))
+        # Build the FAISS index (brute force by default, or IVF / HNSW)
+        self.index, self.description = make_index(embeddings, index_type, storage, **index_params)
+        tune_from_env(self.index)
+        # Not stamped until saved, so results cached for an earlier index must go
+        self.engine = None
+        self.version = None
+        if self.query_cache is not None:
+            self.query_cache.results.clear()
+        print(f"Built FAISS index {self.description} over {self.index.ntotal} vectors")
         
     def save(self, folder_path='vector_store'):
         os.makedirs(folder_path, exist_ok=True)
@@ -53,36 +143,51 @@ class VectorStore:
         # Save the index
         faiss.write_index(self.index, f"{folder_path}/index.faiss")
         
-        # Save texts and sources
-        with open(f"{folder_path}/data.json", 'w') as f:
-            json.dump({
-                'texts': self.texts,
-                'sources': self.sources
-            }, f)
+        # Save texts and sources in the memory-mappable chunk store
+        texts = list(self.texts)
+        write_chunk_store(f"{folder_path}/{CHUNKS_FILE}", texts, list(self.sources))
+        
+        # Lexical index over the same chunks, keyed by row number
+        BM25Index.build(range(len(texts)), texts).save(f"{folder_path}/{BM25_FILE}")
+        
+        # Rows are the chunk ids served from this index, so the version follows their order
+        self.version = write_corpus_version(
+            folder_path, [chunk_id(source, text) for text, source in zip(texts, self.sources)],
+            backend='faiss', model=model_service.MODEL_NAME,
+            index=self.description or type(faiss.downcast_index(self.index)).__name__
+        )
     
     def load(self, folder_path='vector_store'):
         # Load the index
         self.index = faiss.read_index(f"{folder_path}/index.faiss")
+        tune_from_env(self.index)
+        
+        # Stores saved before the chunk store existed only have data.json
+        chunks_path = f"{folder_path}/{CHUNKS_FILE}"
+        if not os.path.exists(chunks_path) and os.path.exists(f"{folder_path}/data.json"):
+            count = migrate_json(f"{folder_path}/data.json", chunks_path)
+            print(f"Migrated {count} chunks from data.json to {chunks_path}")
         
-        # Load texts and sources
-        with open(f"{folder_path}/data.json", 'r') as f:
-            data = json.load(f)
-            self.texts = data['texts']
-            self.sources = data['sources']
+        # Texts and sources are decoded from the mapped file on access
+        self.chunks = ChunkStore(chunks_path)
+        self.texts = self.chunks.texts
+        self.sources = self.chunks.sources
+        self.bm25 = load_bm25(folder_path)
+        self.version = read_corpus_version(folder_path)
+        self.engine = None
     
-    def search(self, query, k=5):
-        # Create query embedding
-        query_vector = self.model.encode([query])
+    def search(self, query, k=5, candidates=RETRIEVAL_CANDIDATES, sources=None):
+        # Same ranking as the served engine (vector search, fused with BM25 when built alongside)
+        if self.engine is None or self.engine.candidates != max(k, candidates):
+            self.engine = RetrievalEngine(FaissBackend(self), self.bm25, candidates=max(k, candidates),
+                                          cache=self.query_cache, version=lambda: self.version)
         
-        # Search the index
-        distances, indices = self.index.search(np.array(query_vector).astype('float32'), k)
+        # Create query embedding (once per normalized query with the cache)
+        if self.query_cache is not None:
+            query_vector = self.query_cache.embed(query, self.model.encode)
+        else:
+            query_vector = self.model.encode(query)
+        docs, _ = self.engine.search(query, query_vector, k, sources=sources)
         
         # Return relevant texts and their sources
-        results = []
-        for idx in indices[0]:
-            results.append({
-                'text': self.texts[idx],
-                'source': self.sources[idx]
-            })
-        
-        return results 
\ No newline at end of file
+        return [{'text': doc.page_content, 'source': doc.metadata['source']} for doc in docs]
@@ -0,0 +1,55 @@
+import re
+import time
+from types import SimpleNamespace
+
+
+class FakeOpenAI:
+    """
+    Offline stand-in for the OpenAI client.
+
+    Exposes the same ``client.chat.completions.create(...)`` call used by
+    app.py and returns a canned, deterministic answer.  With ``stream=True``
+    it yields chunk objects shaped like the real streaming API, one word at a
+    time, so the streaming endpoint can be exercised without network access.
+    """
+
+    def __init__(self, reply=None, token_delay=0.01):
+        self.reply = reply
+        self.token_delay = token_delay
+        self.chat = SimpleNamespace(
+            completions=SimpleNamespace(create=self._create)
+        )
+
+    def _answer(self, messages):
+        if self.reply is not None:
+            return self.reply
+        question = messages[-1]['content'] if messages else ''
+        match = re.search(r'Question:\s*(.*)', question)
+        if match:
+            question = match.group(1).strip()
+        return f"**ConuAI (offline mode)**\n\nYou asked: {question}"
+
+    def _create(self, model=None, messages=None, stream=False, **kwargs):
+        text = self._answer(messages or [])
+        if not stream:
+            message = SimpleNamespace(role='assistant', content=text)
+            return SimpleNamespace(
+                model=model,
+                choices=[SimpleNamespace(index=0, message=message, finish_reason='stop')]
+            )
+        return self._stream(model, text)
+
+    def _stream(self, model, text):
+        for token in re.findall(r'\s*\S+', text):
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            delta = SimpleNamespace(role=None, content=token)
+            yield SimpleNamespace(
+                model=model,
+                choices=[SimpleNamespace(index=0, delta=delta, finish_reason=None)]
+            )
+        delta = SimpleNamespace(role=None, content=None)
+        yield SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(index=0, delta=delta, finish_reason='stop')]
+        )
@@ -0,0 +1,25 @@
+# gunicorn -c gunicorn.conf.py app:app
+import os
+import multiprocessing
+
+bind = os.getenv('BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_CONCURRENCY', max(2, multiprocessing.cpu_count())))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+timeout = 120
+
+# Import the app (and load the MiniLM weights) once in the master, then fork.
+# Workers share the model pages copy-on-write instead of each loading a copy.
+preload_app = True
+os.environ.setdefault('PRELOAD_MODELS', '1')
+
+def post_fork(server, worker):
+    # Chroma's SQLite handles can't cross a fork, so each worker opens its
+    # own store in the background; /api/ready reports 503 until it's done.
+    import model_service
+    model_service.start_background_warm_up()
+
+    # Pooled DB connections opened in the master must not be shared across workers
+    import database
+    from app import app, scraper
+    database.dispose_after_fork(app)
+    scraper.start_periodic_refresh()
@@ -0,0 +1,149 @@
+import os
+import math
+import logging
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Index types understood by make_index / VectorStore.create_index.
+# 'ivfpq' is shorthand for 'ivf' with product-quantized storage.
+INDEX_TYPES = ('flat', 'ivf', 'ivfpq', 'hnsw')
+# How vectors are stored inside the index
+STORAGE_TYPES = ('float32', 'float16', 'pq')
+# FAISS k-means wants about this many training points per centroid
+MIN_POINTS_PER_CENTROID = 39
+# Fewest bits per PQ code worth building (16 centroids per sub-quantizer)
+MIN_PQ_BITS = 4
+
+def default_nlist(count):
+    """Rule of thumb from the FAISS wiki: about 4*sqrt(n) inverted lists."""
+    return max(1, min(65536, int(4 * math.sqrt(max(count, 1)))))
+
+def default_nprobe(nlist):
+    """Lists searched per query: an eighth of them (nprobe=1 misses most neighbours)."""
+    return max(1, math.ceil(nlist / 8))
+
+def factory_string(index_type, dimension, count, storage='float32', nlist=None,
+                   pq_m=None, pq_bits=8, hnsw_m=32, train_count=None):
+    """
+    Translate an index description into a faiss.index_factory string.
+
+    Args:
+        index_type (str): 'flat' (brute force), 'ivf', 'ivfpq' or 'hnsw'
+        storage (str): 'float32', 'float16' or 'pq' (product quantized)
+        nlist (int): IVF inverted lists (default: about 4*sqrt(count))
+        pq_m (int): PQ sub-quantizers; must divide the dimension (default: dim/8)
+        pq_bits (int): Bits per PQ code
+        hnsw_m (int): HNSW graph degree
+        train_count (int): Vectors the index is trained on (default: count)
+
+    ``nlist`` and ``pq_bits`` are lowered to what ``train_count`` vectors can
+    train (k-means needs at least one point per centroid, and about 39 for
+    IVF lists).
+
+    Raises:
+        ValueError: Unknown type or storage, or too few vectors for PQ storage
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"Unknown storage '{storage}', expected one of {STORAGE_TYPES}")
+    if index_type == 'ivfpq':
+        index_type, storage = 'ivf', 'pq'
+
+    pq_m = pq_m or max(1, dimension // 8)
+    if dimension % pq_m:
+        raise ValueError(f"pq_m={pq_m} must divide the embedding dimension {dimension}")
+    train_count = train_count or count
+    if storage == 'pq':
+        if train_count < 2 ** MIN_PQ_BITS:
+            raise ValueError(f"PQ storage needs at least {2 ** MIN_PQ_BITS} vectors to train, got {train_count}; "
+                             "use float32 or float16 storage")
+        trainable_bits = int(math.log2(train_count))
+        if pq_bits > trainable_bits:
+            logger.warning("Only %d training vectors: using %d-bit PQ codes instead of %d",
+                           train_count, trainable_bits, pq_bits)
+            pq_bits = trainable_bits
+    encoding = {
+        'float32': 'Flat',
+        'float16': 'SQfp16',
+        'pq': f'PQ{pq_m}x{pq_bits}'
+    }[storage]
+    trainable_lists = max(1, train_count // MIN_POINTS_PER_CENTROID)
+    if index_type == 'ivf' and nlist and nlist > trainable_lists:
+        logger.warning("Only %d training vectors: using %d IVF lists instead of %d",
+                       train_count, trainable_lists, nlist)
+    nlist = min(nlist or default_nlist(count), trainable_lists)
+
+    if index_type == 'flat':
+        return encoding
+    if index_type == 'hnsw':
+        if storage == 'float32':
+            return f'HNSW{hnsw_m},Flat'
+        if storage == 'float16':
+            return f'HNSW{hnsw_m},SQfp16'
+        return f'HNSW{hnsw_m}_PQ{pq_m}' + (f'x{pq_bits}' if pq_bits != 8 else '')
+    return f'IVF{nlist},{encoding}'
+
+def make_index(vectors, index_type='flat', storage='float32', train_size=100000,
+               ef_construction=200, seed=1234, **kwargs):
+    """
+    Build and fill a FAISS index for ``vectors``.
+
+    Indexes that need training (IVF, PQ) are trained on a random sample of
+    at most ``train_size`` vectors, which keeps build time bounded on large
+    corpora.  IVF indexes are saved with ``default_nprobe``; FAISS_NPROBE
+    overrides it at load time.  Extra keyword arguments go to factory_string.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype='float32')
+    count, dimension = vectors.shape
+    description = factory_string(index_type, dimension, count, storage=storage,
+                                 train_count=min(count, train_size), **kwargs)
+    index = faiss.index_factory(dimension, description, faiss.METRIC_L2)
+
+    hnsw = _hnsw_of(index)
+    if hnsw is not None:
+        hnsw.efConstruction = ef_construction
+
+    if not index.is_trained:
+        if count > train_size:
+            rng = np.random.default_rng(seed)
+            sample = vectors[rng.choice(count, train_size, replace=False)]
+        else:
+            sample = vectors
+        logger.info("Training %s on %d vectors", description, len(sample))
+        index.train(sample)
+
+    index.add(vectors)
+    ivf = _ivf_of(index)
+    if ivf is not None:
+        ivf.nprobe = default_nprobe(ivf.nlist)
+    return index, description
+
+def _ivf_of(index):
+    try:
+        return faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return None
+
+def _hnsw_of(index):
+    return getattr(faiss.downcast_index(index), 'hnsw', None)
+
+def tune(index, nprobe=None, ef_search=None):
+    """Set query-time knobs; parameters the index doesn't have are ignored."""
+    params = faiss.ParameterSpace()
+    if nprobe is not None:
+        try:
+            params.set_index_parameter(index, 'nprobe', int(nprobe))
+        except RuntimeError:
+            pass
+    if ef_search is not None:
+        try:
+            params.set_index_parameter(index, 'efSearch', int(ef_search))
+        except RuntimeError:
+            pass
+    return index
+
+def tune_from_env(index):
+    return tune(index, nprobe=os.getenv('FAISS_NPROBE'), ef_search=os.getenv('FAISS_EF_SEARCH'))
@@ -0,0 +1,423 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from bs4 import BeautifulSoup
+
+try:
+    import lxml  # noqa: F401
+    _DEFAULT_PARSER = 'lxml'
+except ImportError:
+    _DEFAULT_PARSER = 'html.parser'
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'ingest_manifest.json'
+# Written next to every built index; caches key on its version
+CORPUS_VERSION_NAME = 'corpus_version.json'
+EMBED_BATCH_SIZE = 64
+
+# BeautifulSoup parser: 'lxml' (C, several times faster) when installed, else 'html.parser'
+INGEST_HTML_PARSER = os.getenv('INGEST_HTML_PARSER', _DEFAULT_PARSER)
+# Drop navigation, headers, footers and sidebars before extracting text
+INGEST_STRIP_BOILERPLATE = os.getenv('INGEST_STRIP_BOILERPLATE', '1') == '1'
+# Processes for HTML extraction and chunking (1 keeps it in this process)
+INGEST_PROCESSES = int(os.getenv('INGEST_PROCESSES', str(min(4, os.cpu_count() or 1))))
+CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', '1000'))
+CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', '200'))
+
+NOISE_TAGS = ['script', 'style', 'noscript', 'template', 'svg', 'iframe']
+BOILERPLATE_TAGS = ['nav', 'aside', 'form']
+BOILERPLATE_ROLES = ['navigation', 'banner', 'contentinfo', 'search', 'complementary']
+
+_local = threading.local()
+
+class FetchResult:
+    """
+    Outcome of fetching one page.
+
+    status is one of:
+        'changed'   - new content in ``html``
+        'unchanged' - server answered 304 Not Modified
+        'gone'      - 404/410, the page's chunks should be removed
+        'error'     - network or server error, keep whatever we had
+    """
+
+    def __init__(self, url, status, html=None, etag=None, last_modified=None, error=None):
+        self.url = url
+        self.status = status
+        self.html = html
+        self.etag = etag
+        self.last_modified = last_modified
+        self.error = error
+
+def _session():
+    if not hasattr(_local, 'session'):
+        _local.session = requests.Session()
+    return _local.session
+
+def _fetch(url, previous, timeout):
+    headers = {}
+    if previous.get('etag'):
+        headers['If-None-Match'] = previous['etag']
+    if previous.get('last_modified'):
+        headers['If-Modified-Since'] = previous['last_modified']
+    try:
+        response = _session().get(url, headers=headers, timeout=timeout)
+    except requests.RequestException as e:
+        return FetchResult(url, 'error', error=str(e))
+
+    if response.status_code == 304:
+        return FetchResult(url, 'unchanged', etag=previous.get('etag'),
+                           last_modified=previous.get('last_modified'))
+    if response.status_code in (404, 410):
+        return FetchResult(url, 'gone')
+    if response.status_code >= 400:
+        return FetchResult(url, 'error', error=f"HTTP {response.status_code}")
+    return FetchResult(url, 'changed', html=response.text,
+                       etag=response.headers.get('ETag'),
+                       last_modified=response.headers.get('Last-Modified'))
+
+def fetch_pages(urls, manifest=None, max_workers=8, timeout=15):
+    """
+    Fetch pages concurrently with conditional GETs.
+
+    Args:
+        urls (list): Pages to fetch
+        manifest (dict): Previous run's manifest (url -> etag/last_modified)
+
+    Returns:
+        dict: url -> FetchResult
+    """
+    manifest = manifest or {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(lambda url: _fetch(url, manifest.get(url, {}), timeout), urls)
+        return {result.url: result for result in results}
+
+def iter_fetch(urls, manifest=None, max_workers=8, timeout=15):
+    """
+    Like fetch_pages, but yields FetchResults in ``urls`` order while at most
+    ``2 * max_workers`` pages are held, however long the list.
+    """
+    manifest = manifest or {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        window = deque()
+        for url in urls:
+            window.append(executor.submit(_fetch, url, manifest.get(url, {}), timeout))
+            if len(window) >= 2 * max_workers:
+                yield window.popleft().result()
+        while window:
+            yield window.popleft().result()
+
+def extract_text(html, parser=None, strip_boilerplate=None, separator=' '):
+    """
+    Visible text of a page.
+
+    Args:
+        parser (str): BeautifulSoup parser (default: INGEST_HTML_PARSER)
+        strip_boilerplate (bool): Drop nav/header/footer/sidebar elements and
+            prefer <main> when the page has one (default: INGEST_STRIP_BOILERPLATE)
+        separator (str): Joins text from separate elements
+    """
+    soup = BeautifulSoup(html, parser or INGEST_HTML_PARSER)
+    if strip_boilerplate is None:
+        strip_boilerplate = INGEST_STRIP_BOILERPLATE
+
+    # Remove script and style elements
+    for tag in soup(NOISE_TAGS):
+        tag.decompose()
+
+    root = soup
+    if strip_boilerplate:
+        for tag in soup(BOILERPLATE_TAGS) + soup.find_all(attrs={'role': BOILERPLATE_ROLES}):
+            tag.decompose()
+        # Site-wide header/footer, but not an article's own
+        for tag in soup(['header', 'footer']):
+            if tag.find_parent(['main', 'article']) is None:
+                tag.decompose()
+        root = soup.find('main') or soup.find(attrs={'role': 'main'}) or soup
+
+    return root.get_text(separator=separator, strip=True)
+
+# Sentence ends, or line breaks between block elements
+_SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+|\s*\n\s*')
+
+def split_sentences(text):
+    return [sentence for sentence in (s.strip() for s in _SENTENCE_BREAK.split(text)) if sentence]
+
+def _split_long(sentence, chunk_size):
+    """Split a sentence longer than a chunk at word boundaries (or mid-word if it must)."""
+    pieces, current = [], ''
+    for word in sentence.split():
+        while len(word) > chunk_size:
+            if current:
+                pieces.append(current)
+                current = ''
+            pieces.append(word[:chunk_size])
+            word = word[chunk_size:]
+        if current and len(current) + 1 + len(word) > chunk_size:
+            pieces.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        pieces.append(current)
+    return pieces
+
+def _joined_length(sentences):
+    return sum(len(s) for s in sentences) + max(0, len(sentences) - 1)
+
+def chunk_text(text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """
+    Pack whole sentences into chunks of at most ``chunk_size`` characters.
+
+    Each chunk starts with the trailing sentences of the previous one, up to
+    ``overlap`` characters, so a passage cut at a boundary still appears
+    whole in one of them.
+    """
+    pieces = []
+    for sentence in split_sentences(text):
+        pieces.extend([sentence] if len(sentence) <= chunk_size else _split_long(sentence, chunk_size))
+
+    chunks, current = [], []
+    for piece in pieces:
+        if current and _joined_length(current + [piece]) > chunk_size:
+            chunks.append(' '.join(current))
+            carry = []
+            for sentence in reversed(current):
+                if _joined_length([sentence] + carry) > overlap:
+                    break
+                carry.insert(0, sentence)
+            # The overlap must leave room for the new sentence
+            while carry and _joined_length(carry + [piece]) > chunk_size:
+                carry.pop(0)
+            current = carry
+        current.append(piece)
+    if current:
+        chunks.append(' '.join(current))
+    return chunks
+
+def process_page(html, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """HTML -> chunks; runs in the ingest worker processes, so only the chunks travel back."""
+    return chunk_text(extract_text(html, separator='\n'), chunk_size, overlap)
+
+def _process_pool(processes):
+    """
+    A pool with the platform's default start method (the workers are module
+    level, so spawn on Windows/macOS works too), or None to run in-process.
+    multiprocessing.Pool starts every worker right away, before the caller
+    starts its fetch threads.  Only the command-line tools pass processes > 1:
+    spawned children re-import __main__, and app.py sets up the whole app at import.
+    """
+    if processes <= 1:
+        return None
+    try:
+        return multiprocessing.Pool(processes)
+    except (OSError, ValueError, NotImplementedError) as e:
+        logger.warning("No process pool (%s); extracting in-process", e)
+        return None
+
+def extract_all(html_by_url, processes=INGEST_PROCESSES):
+    """HTML -> text for every page, in worker processes (BeautifulSoup is CPU bound)."""
+    pool = _process_pool(min(processes, len(html_by_url))) if len(html_by_url) > 1 else None
+    if pool is None:
+        return {url: extract_text(html) for url, html in html_by_url.items()}
+    with pool:
+        return dict(zip(html_by_url, pool.map(extract_text, html_by_url.values())))
+
+def iter_pages(urls, manifest=None, processes=INGEST_PROCESSES, max_workers=8, timeout=15,
+               chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """
+    Fetch, extract and chunk pages as a stream.
+
+    Fetches run in a thread pool and extraction + chunking in a process
+    pool, overlapping with whatever the caller does with the chunks (e.g.
+    embedding them).  Only a bounded window of pages is in flight and each
+    page's HTML is dropped once it is chunked, so memory stays flat however
+    many URLs there are.
+
+    Yields:
+        tuple: (FetchResult, list of chunks, or None unless status is 'changed'), in ``urls`` order
+    """
+    pool = _process_pool(processes)
+    window = 2 * max(processes, 1)
+    in_flight = deque()
+
+    def finish():
+        result, job = in_flight.popleft()
+        chunks = None
+        if result.status == 'changed':
+            chunks = job.get() if job is not None else process_page(result.html, chunk_size, overlap)
+            result.html = None
+        return result, chunks
+
+    try:
+        for result in iter_fetch(urls, manifest, max_workers=max_workers, timeout=timeout):
+            job = None
+            if result.status == 'changed' and pool is not None:
+                job = pool.apply_async(process_page, (result.html, chunk_size, overlap))
+                result.html = None
+            in_flight.append((result, job))
+            while in_flight and (len(in_flight) > window or in_flight[0][1] is None
+                                 or in_flight[0][1].ready()):
+                yield finish()
+        while in_flight:
+            yield finish()
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+def chunk_id(source, text):
+    """Content hash of a chunk; identical chunks keep their id across runs."""
+    return hashlib.sha256(f"{source}\n{text}".encode('utf-8')).hexdigest()[:32]
+
+def load_manifest(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_manifest(path, manifest):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, path)
+
+def write_corpus_version(folder_path, chunk_ids, **details):
+    """
+    Stamp a freshly built index with a corpus version.
+
+    The version hashes the chunk ids in index order plus ``details`` (model,
+    index type, ...), so a rebuild that changes nothing keeps its version and
+    caches stay warm, while any change to content or ranking gets a new one.
+
+    Returns:
+        str: The version
+    """
+    digest = hashlib.sha256()
+    for doc_id in chunk_ids:
+        digest.update(f"{doc_id}\n".encode('utf-8'))
+    for key in sorted(details):
+        digest.update(f"{key}={details[key]}\n".encode('utf-8'))
+    version = digest.hexdigest()[:16]
+    save_manifest(os.path.join(folder_path, CORPUS_VERSION_NAME), {
+        'version': version,
+        'chunks': len(chunk_ids),
+        'built_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        **details
+    })
+    return version
+
+def read_corpus_version(folder_path):
+    stamp = load_manifest(os.path.join(folder_path, CORPUS_VERSION_NAME))
+    return stamp.get('version') if stamp else None
+
+def embed_stream(items, embed_fn, batch_size=EMBED_BATCH_SIZE):
+    """
+    Embed ``(id, text, metadata)`` items in batches as they arrive.
+
+    Yields:
+        tuple: (ids, texts, metadatas, vectors) per batch of at most ``batch_size``
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            ids, texts, metadatas = zip(*batch)
+            yield list(ids), list(texts), list(metadatas), embed_fn(list(texts))
+            batch = []
+    if batch:
+        ids, texts, metadatas = zip(*batch)
+        yield list(ids), list(texts), list(metadatas), embed_fn(list(texts))
+
+def sync_chroma(vectordb, urls, embeddings, manifest_path, batch_size=EMBED_BATCH_SIZE, max_workers=8,
+                processes=INGEST_PROCESSES, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    """
+    Bring a Chroma store in line with the given pages, touching only what changed.
+
+    Pages answering 304 are skipped, changed pages are re-chunked and only
+    chunks whose content hash is new get embedded, and chunks belonging to
+    pages that disappeared (dropped from ``urls`` or now 404/410) are deleted.
+    Pages stream through iter_pages, and new chunks are embedded and
+    written batch by batch as they come out.
+
+    Returns:
+        dict: Counters describing what the run did
+    """
+    started = time.perf_counter()
+    collection = vectordb._collection
+    manifest = load_manifest(manifest_path)
+    legacy = manifest is None
+    manifest = manifest or {}
+    stats = {'fetched': 0, 'unchanged': 0, 'errors': 0, 'added': 0, 'kept': 0, 'removed': 0}
+
+    # Pages that are no longer configured
+    for url in list(manifest):
+        if url not in urls:
+            removed = manifest.pop(url).get('chunk_ids', [])
+            if removed:
+                collection.delete(ids=removed)
+            stats['removed'] += len(removed)
+
+    def new_chunks():
+        pages = iter_pages(urls, dict(manifest), processes=processes, max_workers=max_workers,
+                           chunk_size=chunk_size, overlap=overlap)
+        for result, chunks in pages:
+            url = result.url
+            previous = manifest.get(url, {})
+            old_ids = set(previous.get('chunk_ids', []))
+
+            if result.status == 'unchanged':
+                stats['unchanged'] += 1
+                continue
+            if result.status == 'error':
+                logger.warning("Error fetching %s: %s", url, result.error)
+                stats['errors'] += 1
+                continue
+            if result.status == 'gone':
+                if old_ids:
+                    collection.delete(ids=list(old_ids))
+                stats['removed'] += len(old_ids)
+                manifest.pop(url, None)
+                continue
+
+            stats['fetched'] += 1
+            if legacy:
+                # Chunks from a full build have random ids; clear them by source once
+                collection.delete(where={'source': url})
+
+            ids, seen = [], set()
+            for text in chunks:
+                cid = chunk_id(url, text)
+                if cid in seen:
+                    continue
+                seen.add(cid)
+                ids.append(cid)
+                if cid in old_ids and not legacy:
+                    stats['kept'] += 1
+                    continue
+                yield cid, text, {'source': url}
+
+            stale = old_ids - seen
+            if stale:
+                collection.delete(ids=list(stale))
+            stats['removed'] += len(stale)
+            manifest[url] = {'etag': result.etag, 'last_modified': result.last_modified, 'chunk_ids': ids}
+
+    for ids, texts, metadatas, vectors in embed_stream(new_chunks(), embeddings.embed_documents, batch_size):
+        collection.upsert(ids=ids, embeddings=vectors, documents=texts, metadatas=metadatas)
+        stats['added'] += len(ids)
+
+    if hasattr(vectordb, 'persist'):
+        vectordb.persist()
+    save_manifest(manifest_path, manifest)
+    stats['seconds'] = round(time.perf_counter() - started, 2)
+    return stats
@@ -0,0 +1,482 @@
+"""
+Local job queue for slow /api/query work (the LLM stage), so web workers
+hand off a request and return right away.
+
+Jobs live in a SQLite file shared by every worker process on the host (or
+in memory for a single process).  A process starts a small pool of worker
+threads the first time it queues a job, so LLM throughput is set by
+JOB_WORKERS instead of by how many web requests can block at once, and
+servers that never see an async request run no workers at all.  Clients poll
+``GET /api/jobs/<id>`` (optionally long-polling) or pass a webhook URL that
+receives the result.  Webhooks are off unless JOB_WEBHOOK_SECRET and
+JOB_WEBHOOK_ALLOWED_HOSTS are both set, and never go to non-public addresses.
+"""
+import os
+import json
+import hmac
+import math
+import time
+import uuid
+import random
+import socket
+import sqlite3
+import ipaddress
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+import requests
+
+logger = logging.getLogger(__name__)
+
+JOBS_ENABLED = os.getenv('JOBS_ENABLED', '1') == '1'
+# 'memory' (one process only) or a SQLite file shared by all workers on the host
+JOB_QUEUE_BACKEND = os.getenv('JOB_QUEUE_BACKEND', os.path.join(os.path.dirname(__file__), 'instance', 'jobs.db'))
+# Worker threads per process draining the queue
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))
+# Queued jobs beyond this are refused (429)
+JOB_MAX_QUEUED = int(os.getenv('JOB_MAX_QUEUED', '500'))
+# A running job whose worker went silent this long is handed to another worker
+JOB_LEASE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', '300'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '2'))
+# Finished jobs are kept this long for polling
+JOB_RETENTION_SECONDS = float(os.getenv('JOB_RETENTION_SECONDS', str(24 * 3600)))
+# Long-polls re-read a job this often (it may finish in another process)
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '0.5'))
+# Idle workers otherwise sleep until a job is queued here, checking this often for jobs
+# queued or abandoned by other processes
+JOB_IDLE_CHECK_SECONDS = float(os.getenv('JOB_IDLE_CHECK_SECONDS', '30'))
+
+# Signs every webhook body; webhooks are refused while it is unset
+JOB_WEBHOOK_SECRET = os.getenv('JOB_WEBHOOK_SECRET', '')
+# Comma-separated hosts webhooks may be sent to; empty refuses all webhooks
+JOB_WEBHOOK_ALLOWED_HOSTS = [h.strip().lower() for h in os.getenv('JOB_WEBHOOK_ALLOWED_HOSTS', '').split(',') if h.strip()]
+JOB_WEBHOOK_TIMEOUT = float(os.getenv('JOB_WEBHOOK_TIMEOUT', '5'))
+JOB_WEBHOOK_ATTEMPTS = int(os.getenv('JOB_WEBHOOK_ATTEMPTS', '3'))
+# Threads per process delivering webhooks, so a slow receiver never holds up a job worker
+JOB_WEBHOOK_WORKERS = int(os.getenv('JOB_WEBHOOK_WORKERS', '2'))
+
+FINISHED = ('done', 'failed')
+
+class QueueFull(Exception):
+    pass
+
+class JobFailed(Exception):
+    """Raised by a handler to fail the job with a message meant for the client."""
+
+def _new_job(user_id, payload, webhook_url):
+    return {
+        'id': uuid.uuid4().hex,
+        'user_id': user_id,
+        'status': 'queued',
+        'payload': payload,
+        'result': None,
+        'error': None,
+        'webhook_url': webhook_url,
+        'attempts': 0,
+        'created_at': time.time(),
+        'started_at': None,
+        'finished_at': None,
+        'lease_expires': None
+    }
+
+def public_view(job):
+    """What the polling endpoint returns (no payload, no webhook URL)."""
+    return {
+        'job_id': job['id'],
+        'status': job['status'],
+        'result': job['result'],
+        'error': job['error'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at']
+    }
+
+class MemoryJobStore:
+    """Jobs in this process; enough for ``python app.py`` or a single worker."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def enqueue(self, user_id, payload, webhook_url=None, max_queued=JOB_MAX_QUEUED):
+        with self._lock:
+            if sum(1 for job in self._jobs.values() if job['status'] == 'queued') >= max_queued:
+                raise QueueFull()
+            job = _new_job(user_id, payload, webhook_url)
+            self._jobs[job['id']] = job
+            return dict(job)
+
+    def claim(self, lease_seconds=JOB_LEASE_SECONDS, max_attempts=JOB_MAX_ATTEMPTS):
+        """The oldest runnable job, now marked running, or None."""
+        now = time.time()
+        with self._lock:
+            candidates = [job for job in self._jobs.values()
+                          if job['status'] == 'queued'
+                          or (job['status'] == 'running' and job['lease_expires'] < now)]
+            for job in sorted(candidates, key=lambda j: j['created_at']):
+                if job['attempts'] >= max_attempts:
+                    job.update(status='failed', error='Worker stopped responding', finished_at=now)
+                    continue
+                job.update(status='running', attempts=job['attempts'] + 1, started_at=now,
+                           lease_expires=now + lease_seconds)
+                return dict(job)
+        return None
+
+    def finish(self, job_id, result=None, error=None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(status='failed' if error else 'done', result=result, error=error,
+                           finished_at=time.time(), lease_expires=None)
+                return dict(job)
+        return None
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def purge(self, older_than):
+        with self._lock:
+            for job_id in [j['id'] for j in self._jobs.values()
+                           if j['status'] in FINISHED and j['finished_at'] < older_than]:
+                del self._jobs[job_id]
+
+    def counts(self):
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job['status']] = counts.get(job['status'], 0) + 1
+            return counts
+
+class SQLiteJobStore:
+    """
+    Jobs in a SQLite file, so any worker process can pick up a job and
+    answer polls for it.  Claiming is one short write transaction.
+    """
+    COLUMNS = ('id', 'user_id', 'status', 'payload', 'result', 'error', 'webhook_url', 'attempts',
+               'created_at', 'started_at', 'finished_at', 'lease_expires')
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        connection = self._connection()
+        connection.execute("CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, user_id TEXT, status TEXT, "
+                           "payload TEXT, result TEXT, error TEXT, webhook_url TEXT, attempts INTEGER, "
+                           "created_at REAL, started_at REAL, finished_at REAL, lease_expires REAL)")
+        connection.execute("CREATE INDEX IF NOT EXISTS ix_jobs_status_created ON jobs (status, created_at)")
+
+    def _connection(self):
+        if getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def _row(self, row):
+        if row is None:
+            return None
+        job = dict(zip(self.COLUMNS, row))
+        job['payload'] = json.loads(job['payload']) if job['payload'] else None
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def _transaction(self, fn):
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            value = fn(connection)
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return value
+
+    def enqueue(self, user_id, payload, webhook_url=None, max_queued=JOB_MAX_QUEUED):
+        job = _new_job(user_id, payload, webhook_url)
+
+        def insert(connection):
+            queued = connection.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if queued >= max_queued:
+                raise QueueFull()
+            row = dict(job, payload=json.dumps(payload), result=None)
+            connection.execute(f"INSERT INTO jobs ({', '.join(self.COLUMNS)}) "
+                               f"VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                               [row[column] for column in self.COLUMNS])
+        self._transaction(insert)
+        return job
+
+    def claim(self, lease_seconds=JOB_LEASE_SECONDS, max_attempts=JOB_MAX_ATTEMPTS):
+        # Only take the write lock when there is something to claim
+        runnable = self._connection().execute(
+            "SELECT 1 FROM jobs WHERE status = 'queued' OR (status = 'running' AND lease_expires < ?) LIMIT 1",
+            (time.time(),)
+        ).fetchone()
+        if runnable is None:
+            return None
+
+        def take(connection):
+            now = time.time()
+            while True:
+                row = connection.execute(
+                    f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE status = 'queued' "
+                    "OR (status = 'running' AND lease_expires < ?) ORDER BY created_at LIMIT 1", (now,)
+                ).fetchone()
+                job = self._row(row)
+                if job is None:
+                    return None
+                if job['attempts'] >= max_attempts:
+                    connection.execute("UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                                       ('Worker stopped responding', now, job['id']))
+                    continue
+                job.update(status='running', attempts=job['attempts'] + 1, started_at=now,
+                           lease_expires=now + lease_seconds)
+                connection.execute("UPDATE jobs SET status = 'running', attempts = ?, started_at = ?, "
+                                   "lease_expires = ? WHERE id = ?",
+                                   (job['attempts'], now, job['lease_expires'], job['id']))
+                return job
+        return self._transaction(take)
+
+    def finish(self, job_id, result=None, error=None):
+        self._connection().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_expires = NULL WHERE id = ?",
+            ('failed' if error else 'done', json.dumps(result) if result is not None else None, error,
+             time.time(), job_id)
+        )
+        return self.get(job_id)
+
+    def get(self, job_id):
+        row = self._connection().execute(f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?",
+                                         (job_id,)).fetchone()
+        return self._row(row)
+
+    def purge(self, older_than):
+        self._connection().execute("DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                                   (older_than,))
+
+    def counts(self):
+        return dict(self._connection().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+def make_store(spec=JOB_QUEUE_BACKEND):
+    if spec == 'memory':
+        return MemoryJobStore()
+    path = spec[len('sqlite:///'):] if spec.startswith('sqlite:///') else spec
+    return SQLiteJobStore(path)
+
+def webhooks_enabled():
+    return bool(JOB_WEBHOOK_SECRET and JOB_WEBHOOK_ALLOWED_HOSTS)
+
+def public_host(host):
+    """True if ``host`` resolves, and only to globally routable unicast addresses."""
+    try:
+        infos = socket.getaddrinfo(host, None)
+    except (socket.gaierror, UnicodeError):
+        return False
+    addresses = set()
+    for info in infos:
+        address = ipaddress.ip_address(info[4][0].split('%')[0])
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        addresses.add(address)
+    # is_global excludes private, loopback, link-local, shared and reserved ranges
+    return bool(addresses) and all(a.is_global and not a.is_multicast for a in addresses)
+
+def webhook_allowed(url):
+    """
+    Webhooks only go to allowlisted hosts that resolve to public addresses,
+    so requests can't make the server call internal services.  Checked at
+    submit time and again before every delivery attempt.
+    """
+    if not webhooks_enabled():
+        return False
+    parsed = urlparse(url or '')
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        return False
+    return parsed.hostname.lower() in JOB_WEBHOOK_ALLOWED_HOSTS and public_host(parsed.hostname)
+
+def sign(body, secret=None):
+    secret = secret or JOB_WEBHOOK_SECRET
+    return 'sha256=' + hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+
+def deliver_webhook(url, job, attempts=JOB_WEBHOOK_ATTEMPTS, timeout=JOB_WEBHOOK_TIMEOUT):
+    """
+    POST the job's public view to ``url``, signed with JOB_WEBHOOK_SECRET
+    (``X-ConuAI-Signature``), retrying with backoff.  Redirects are not
+    followed, since they could point anywhere.
+
+    Returns:
+        bool: True once the receiver answered 2xx
+    """
+    body = json.dumps(public_view(job)).encode('utf-8')
+    for attempt in range(attempts):
+        # The host may resolve differently by now
+        if not webhook_allowed(url):
+            logger.warning("Webhook for job %s refused: %s is not an allowed public host", job['id'], url)
+            return False
+        headers = {'Content-Type': 'application/json', 'X-ConuAI-Signature': sign(body)}
+        try:
+            response = requests.post(url, data=body, headers=headers, timeout=timeout, allow_redirects=False)
+            if response.status_code < 300:
+                return True
+            logger.warning("Webhook for job %s got HTTP %d", job['id'], response.status_code)
+        except requests.RequestException as e:
+            logger.warning("Webhook for job %s failed: %s", job['id'], e)
+        if attempt + 1 < attempts:
+            time.sleep(2 ** attempt + random.random())
+    return False
+
+class JobQueue:
+    """
+    Enqueue/poll front end plus the per-process worker threads.
+
+    ``handler(payload)`` does the work and returns a JSON-serializable
+    result.  JobFailed fails the job with its message; any other exception
+    fails it with a generic one.
+
+    The store is opened on first use, so a process with jobs turned off
+    never creates the SQLite file.
+    """
+
+    def __init__(self, handler, store=None, workers=JOB_WORKERS, poll_interval=JOB_POLL_INTERVAL,
+                 idle_check=JOB_IDLE_CHECK_SECONDS, retention=JOB_RETENTION_SECONDS,
+                 store_spec=JOB_QUEUE_BACKEND, webhook_workers=JOB_WEBHOOK_WORKERS):
+        self.handler = handler
+        self._store = store
+        self.store_spec = store_spec
+        self.workers = workers
+        self.webhook_workers = webhook_workers
+        self._webhooks = None
+        self.poll_interval = poll_interval
+        self.idle_check = idle_check
+        self.retention = retention
+        # Jobs submitted here that no worker has gone looking for yet; wakes idle workers
+        self._work = threading.Condition()
+        self._submitted = 0
+        # Wakes long-polls when a job finishes in this process
+        self._changed = threading.Condition()
+        self._pid = None
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.webhooks_failed = 0
+
+    @property
+    def store(self):
+        if self._store is None:
+            with self._lock:
+                if self._store is None:
+                    self._store = make_store(self.store_spec)
+        return self._store
+
+    def start(self):
+        """
+        Start this process's worker threads, once per process (threads don't
+        survive fork).  Called by submit, so it's never needed up front.
+        """
+        with self._lock:
+            if self._pid == os.getpid() or self.workers <= 0:
+                return
+            self._pid = os.getpid()
+            self._work = threading.Condition()
+            self._submitted = 0
+            self._changed = threading.Condition()
+            self._webhooks = ThreadPoolExecutor(max_workers=max(1, self.webhook_workers),
+                                                thread_name_prefix='job-webhook')
+        for i in range(self.workers):
+            threading.Thread(target=self._run, name=f'job-worker-{i}', daemon=True).start()
+
+    def submit(self, user_id, payload, webhook_url=None):
+        """
+        Returns:
+            dict: The queued job
+
+        Raises:
+            QueueFull: Too many jobs are already waiting
+        """
+        self.start()
+        job = self.store.enqueue(user_id, payload, webhook_url)
+        self.store.purge(time.time() - self.retention)
+        with self._work:
+            self._submitted += 1
+            self._work.notify()
+        return job
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def wait(self, job_id, timeout):
+        """The job, once finished or after ``timeout`` seconds, whichever is first."""
+        if not math.isfinite(timeout):
+            raise ValueError(f"timeout must be finite, got {timeout}")
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.store.get(job_id)
+            remaining = deadline - time.monotonic()
+            if job is None or job['status'] in FINISHED or remaining <= 0:
+                return job
+            with self._changed:
+                self._changed.wait(min(remaining, self.poll_interval))
+
+    def _run(self):
+        while True:
+            with self._work:
+                if not self._submitted:
+                    self._work.wait(self.idle_check)
+                self._submitted = max(0, self._submitted - 1)
+            # Drain whatever is runnable, then go back to sleep
+            while True:
+                try:
+                    job = self.store.claim()
+                except Exception:
+                    logger.exception("Could not claim a job")
+                    break
+                if job is None:
+                    break
+                self._process(job)
+
+    def _process(self, job):
+        try:
+            finished = self.store.finish(job['id'], result=self.handler(job['payload']))
+            self.completed += 1
+        except JobFailed as e:
+            logger.warning("Job %s failed: %s", job['id'], e)
+            finished = self.store.finish(job['id'], error=str(e))
+            self.failed += 1
+        except Exception:
+            logger.exception("Job %s failed", job['id'])
+            finished = self.store.finish(job['id'], error='Something went wrong')
+            self.failed += 1
+        with self._changed:
+            self._changed.notify_all()
+        if finished and job.get('webhook_url'):
+            self._webhooks.submit(self._deliver, job['webhook_url'], finished)
+
+    def _deliver(self, url, job):
+        try:
+            delivered = deliver_webhook(url, job)
+        except Exception:
+            logger.exception("Webhook for job %s failed", job['id'])
+            delivered = False
+        if not delivered:
+            self.webhooks_failed += 1
+
+    def stats(self):
+        """Queue counts appear once this process has opened the store."""
+        try:
+            counts = self._store.counts() if self._store is not None else {}
+        except Exception:
+            counts = {}
+        return {
+            'backend': type(self._store).__name__ if self._store is not None else None,
+            'workers': self.workers,
+            'queued': counts.get('queued', 0),
+            'running': counts.get('running', 0),
+            'completed': self.completed,
+            'failed': self.failed,
+            'webhooks_failed': self.webhooks_failed
+        }
@@ -0,0 +1,315 @@
+import os
+import json
+import hashlib
+import threading
+import logging
+from concurrent.futures import Future
+from fake_llm import FakeOpenAI
+
+logger = logging.getLogger(__name__)
+
+# Providers to try, in order, e.g. "openai,local,fake". The first is the primary; the rest are fallbacks.
+LLM_PROVIDERS = os.getenv('LLM_PROVIDERS', 'fake' if os.getenv('USE_FAKE_LLM') else 'openai')
+# How long a request waits for a free slot on a provider before falling back
+LLM_QUEUE_TIMEOUT = float(os.getenv('LLM_QUEUE_TIMEOUT', '2'))
+# Share one upstream call between identical prompts that are in flight at the same time
+LLM_COALESCE = os.getenv('LLM_COALESCE', '1') == '1'
+
+class LLMUnavailable(Exception):
+    """Every configured provider failed, timed out or was saturated."""
+
+class Provider:
+    """
+    A chat completion backend reached through an OpenAI-style client.
+
+    Args:
+        name (str): Label used in logs and stats
+        client: Object exposing ``chat.completions.create``
+        model (str): Model name sent with every request
+        timeout (float): Per-request timeout in seconds
+        max_concurrency (int): Requests allowed in flight at once
+    """
+
+    def __init__(self, name, client, model, timeout=30.0, max_concurrency=8):
+        self.name = name
+        self.client = client
+        self.model = model
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.calls = 0
+        self.failures = 0
+        self.saturated = 0
+
+    def acquire(self, wait):
+        if not self._slots.acquire(timeout=wait):
+            with self._lock:
+                self.saturated += 1
+            return False
+        with self._lock:
+            self.in_flight += 1
+            self.calls += 1
+        return True
+
+    def release(self, failed=False):
+        with self._lock:
+            self.in_flight -= 1
+            if failed:
+                self.failures += 1
+        self._slots.release()
+
+    def _create(self, messages, stream, params):
+        return self.client.chat.completions.create(
+            model=self.model, messages=messages, stream=stream, timeout=self.timeout, **params
+        )
+
+    def complete(self, messages, **params):
+        response = self._create(messages, False, params)
+        return response.choices[0].message.content.strip()
+
+    def stream(self, messages, **params):
+        for chunk in self._create(messages, True, params):
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def stats(self):
+        return {
+            'model': self.model,
+            'in_flight': self.in_flight,
+            'max_concurrency': self.max_concurrency,
+            'calls': self.calls,
+            'failures': self.failures,
+            'saturated': self.saturated
+        }
+
+class OpenAIProvider(Provider):
+    def __init__(self, api_key=None, model=None, timeout=None, max_concurrency=None, base_url=None, name='openai'):
+        from openai import OpenAI
+        client = OpenAI(api_key=api_key or os.getenv('OPENAI_API_KEY'), base_url=base_url, max_retries=0)
+        super().__init__(
+            name, client,
+            model=model or os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo'),
+            timeout=timeout or float(os.getenv('OPENAI_TIMEOUT', '30')),
+            max_concurrency=max_concurrency or int(os.getenv('OPENAI_MAX_CONCURRENCY', '16'))
+        )
+
+class LocalProvider(OpenAIProvider):
+    """
+    Any server speaking the OpenAI chat API: vLLM, llama.cpp's server (CPU),
+    Ollama (``http://localhost:11434/v1``), LM Studio, text-generation-webui.
+    """
+
+    def __init__(self, base_url=None, model=None, timeout=None, max_concurrency=None):
+        super().__init__(
+            api_key=os.getenv('LOCAL_LLM_API_KEY', 'not-needed'),
+            base_url=base_url or os.getenv('LOCAL_LLM_URL', 'http://localhost:8000/v1'),
+            model=model or os.getenv('LOCAL_LLM_MODEL', 'local-model'),
+            timeout=timeout or float(os.getenv('LOCAL_LLM_TIMEOUT', '60')),
+            # Local servers usually run one or two generations at a time
+            max_concurrency=max_concurrency or int(os.getenv('LOCAL_LLM_MAX_CONCURRENCY', '2')),
+            name='local'
+        )
+
+class FakeProvider(Provider):
+    """Deterministic offline answers (fake_llm.FakeOpenAI); also the fallback of last resort."""
+
+    def __init__(self, reply=None, token_delay=0.01):
+        super().__init__('fake', FakeOpenAI(reply=reply, token_delay=token_delay),
+                         model='fake', timeout=None, max_concurrency=1000)
+
+    def _create(self, messages, stream, params):
+        return self.client.chat.completions.create(model=self.model, messages=messages, stream=stream, **params)
+
+PROVIDER_TYPES = {
+    'openai': OpenAIProvider,
+    'local': LocalProvider,
+    'fake': FakeProvider
+}
+
+def prompt_key(messages, params):
+    payload = json.dumps([messages, params], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class _SharedStream:
+    """
+    Tokens of one upstream stream, readable by any number of subscribers.
+
+    A pump thread fills the buffer so the upstream call keeps going even if
+    the request that started it disconnects; each subscriber replays the
+    buffer from the start and then follows along.
+    """
+
+    def __init__(self):
+        self.tokens = []
+        self.finished = False
+        self.error = None
+        self._changed = threading.Condition()
+
+    def push(self, token):
+        with self._changed:
+            self.tokens.append(token)
+            self._changed.notify_all()
+
+    def finish(self, error=None):
+        with self._changed:
+            self.finished = True
+            self.error = error
+            self._changed.notify_all()
+
+    def subscribe(self):
+        position = 0
+        while True:
+            with self._changed:
+                while position >= len(self.tokens) and not self.finished:
+                    self._changed.wait()
+                pending = self.tokens[position:]
+                finished, error = self.finished, self.error
+            for token in pending:
+                yield token
+            position += len(pending)
+            if finished and position >= len(self.tokens):
+                if error is not None:
+                    raise error
+                return
+
+class LLMService:
+    """
+    Provider chain with fallback, per-provider concurrency limits and
+    single-flight coalescing.
+
+    A request goes to the first provider that has a free slot within
+    LLM_QUEUE_TIMEOUT; if that provider fails or times out, the next one is
+    tried.  Streams can only fall back until the first token has been sent.
+    Identical prompts that arrive while one is already running wait for the
+    same upstream call instead of starting another.
+    """
+
+    def __init__(self, providers, queue_timeout=LLM_QUEUE_TIMEOUT, coalesce=LLM_COALESCE):
+        if not providers:
+            raise ValueError("at least one LLM provider is required")
+        self.providers = providers
+        self.queue_timeout = queue_timeout
+        self.coalesce = coalesce
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.coalesced = 0
+        self.fallbacks = 0
+
+    @classmethod
+    def from_env(cls, names=LLM_PROVIDERS):
+        providers = []
+        for name in (n.strip() for n in names.split(',') if n.strip()):
+            if name not in PROVIDER_TYPES:
+                raise ValueError(f"Unknown LLM provider {name!r}; expected one of {sorted(PROVIDER_TYPES)}")
+            providers.append(PROVIDER_TYPES[name]())
+        logger.info("LLM providers: %s", ', '.join(f"{p.name} ({p.model})" for p in providers))
+        return cls(providers)
+
+    def provider(self, name):
+        return next((p for p in self.providers if p.name == name), None)
+
+    def _single_flight(self, key, start):
+        """Return (shared, leader): the in-flight entry for ``key``, creating it with ``start()`` if absent."""
+        with self._lock:
+            shared = self._in_flight.get(key)
+            if shared is not None:
+                self.coalesced += 1
+                return shared, False
+            shared = self._in_flight[key] = start()
+            return shared, True
+
+    def _done(self, key):
+        with self._lock:
+            self._in_flight.pop(key, None)
+
+    def _attempts(self):
+        """Yield providers that accepted the request, in order; the caller must release each one."""
+        for i, provider in enumerate(self.providers):
+            # The last provider gets the full wait; earlier ones give up quickly when saturated
+            wait = self.queue_timeout if i == len(self.providers) - 1 else min(self.queue_timeout, 0.05)
+            if not provider.acquire(wait):
+                logger.warning("LLM provider %s saturated, trying next", provider.name)
+                continue
+            if i > 0:
+                with self._lock:
+                    self.fallbacks += 1
+            yield provider
+
+    def _complete(self, messages, params):
+        last_error = None
+        for provider in self._attempts():
+            try:
+                answer = provider.complete(messages, **params)
+                provider.release()
+                return answer
+            except Exception as e:
+                provider.release(failed=True)
+                logger.warning("LLM provider %s failed: %s", provider.name, e)
+                last_error = e
+        raise LLMUnavailable(str(last_error) if last_error else "all LLM providers are saturated")
+
+    def complete(self, messages, **params):
+        """
+        Returns:
+            str: The answer text
+        """
+        if not self.coalesce:
+            return self._complete(messages, params)
+
+        key = prompt_key(messages, params)
+        future, leader = self._single_flight(key, Future)
+        if leader:
+            try:
+                future.set_result(self._complete(messages, params))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                self._done(key)
+        return future.result()
+
+    def _pump(self, key, shared, messages, params):
+        try:
+            for provider in self._attempts():
+                sent = len(shared.tokens)
+                try:
+                    for token in provider.stream(messages, **params):
+                        shared.push(token)
+                    provider.release()
+                    shared.finish()
+                    return
+                except Exception as e:
+                    provider.release(failed=True)
+                    logger.warning("LLM provider %s failed while streaming: %s", provider.name, e)
+                    if len(shared.tokens) > sent:
+                        # Part of the answer is already out; a different model can't continue it
+                        shared.finish(LLMUnavailable(str(e)))
+                        return
+            shared.finish(LLMUnavailable("all LLM providers failed or are saturated"))
+        finally:
+            self._done(key)
+
+    def stream(self, messages, **params):
+        """
+        Yield answer tokens.  Raises LLMUnavailable (from the generator) when
+        no provider can answer.
+        """
+        key = prompt_key(messages, params) if self.coalesce else object()
+
+        def start():
+            shared = _SharedStream()
+            threading.Thread(target=self._pump, args=(key, shared, messages, params),
+                             name='llm-stream', daemon=True).start()
+            return shared
+
+        shared, _ = self._single_flight(key, start)
+        return shared.subscribe()
+
+    def stats(self):
+        return {
+            'coalesced': self.coalesced,
+            'fallbacks': self.fallbacks,
+            'in_flight_prompts': len(self._in_flight),
+            'providers': {p.name: p.stats() for p in self.providers}
+        }
@@ -0,0 +1,254 @@
+"""
+Load generator for /api/query.
+
+By default the app runs in this process against local stubs: an
+OpenAI-compatible LLM server (fixed time to first token and per-token delay,
+used through the ``local`` provider) and the course service.  Only retrieval,
+the app's own overhead and its concurrency controls are really measured, so
+runs are comparable across changes.
+
+    python load_test.py --concurrency 16 --duration 30
+    python load_test.py --stream --llm-latency 1.5
+    python load_test.py --url http://localhost:5000 --token <jwt>   # a running server
+    python load_test.py --compare bench_results/loadtest-20240101-120000.json
+
+Rate limiting is switched off in-process unless --keep-limits is given.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import requests
+from bench_report import latency_summary, save_results, load_results, compare, print_comparison
+
+STUB_COURSE = {
+    'subject': 'COMP', 'catalog': '352', 'title': 'Data Structures and Algorithms',
+    'description': 'Abstract data types: stacks, queues, lists, trees, hash tables and graphs.',
+    'prerequisites': 'COMP 232, COMP 249', 'credits': 3, 'terms': ['Fall', 'Winter'],
+    'avgDifficulty': 3.8, 'avgExperience': 3.5
+}
+STUB_ANSWER = ("Here is what I found about your question. Concordia offers several resources, "
+               "and the details below should help you get started.").split(' ')
+
+class StubHandler(BaseHTTPRequestHandler):
+    """OpenAI-compatible chat completions plus the two course service endpoints the app calls."""
+    protocol_version = 'HTTP/1.1'
+    first_token_delay = 0.5
+    token_delay = 0.01
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.startswith('/api/v1/courses/'):
+            return self._json({'status': 'OK', 'payload': STUB_COURSE})
+        if self.path.startswith('/api/v1/search/course'):
+            return self._json({'status': 'OK', 'payload': [STUB_COURSE]})
+        self._json({'status': 'NOT_FOUND'}, 404)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        time.sleep(self.first_token_delay)
+        if not request.get('stream'):
+            time.sleep(self.token_delay * len(STUB_ANSWER))
+            return self._json({
+                'id': 'stub', 'object': 'chat.completion', 'created': int(time.time()), 'model': 'stub',
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': ' '.join(STUB_ANSWER)}}]
+            })
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        for i, word in enumerate(STUB_ANSWER):
+            chunk = {'id': 'stub', 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': 'stub',
+                     'choices': [{'index': 0, 'delta': {'content': word if i == 0 else ' ' + word},
+                                  'finish_reason': None}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+            time.sleep(self.token_delay)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+def start_stubs(first_token_delay, token_delay):
+    StubHandler.first_token_delay = first_token_delay
+    StubHandler.token_delay = token_delay
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='stubs', daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+def start_app(stub_url, keep_limits, answer_cache):
+    """Import the app wired to the stubs and a scratch database; returns (base url, token)."""
+    scratch = tempfile.mkdtemp(prefix='conuai-load-')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(scratch, 'load.db')}",
+        'LLM_PROVIDERS': 'local',
+        'LOCAL_LLM_URL': f"{stub_url}/v1",
+        'LOCAL_LLM_MAX_CONCURRENCY': os.getenv('LOCAL_LLM_MAX_CONCURRENCY', '64'),
+        'COURSE_API_URL': stub_url,
+        'COURSE_CATALOG_PATH': os.path.join(scratch, 'no-catalog.db'),
+        'SCRAPE_CACHE_PATH': os.path.join(scratch, 'scrape_cache.json'),
+        # Live page passages would scrape the real site
+        'SCRAPE_CONTEXT_PASSAGES': '0',
+    })
+    if not keep_limits:
+        os.environ['RATE_LIMIT_ENABLED'] = '0'
+    if not answer_cache:
+        os.environ['SEMANTIC_CACHE_ENABLED'] = '0'
+
+    from werkzeug.serving import make_server
+    import model_service
+    from app import app
+    from models import db, User
+    import auth
+
+    with app.app_context():
+        user = User(email='load@test.local', password='-', firstName='Load', lastName='Test', role='student')
+        db.session.add(user)
+        db.session.commit()
+        token = auth.issue_token(user, app.config['SECRET_KEY'])
+
+    model_service.warm_up()
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='app', daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", token
+
+def one_request(session, url, token, query, stream):
+    """Returns (status, total seconds, seconds to first token or None)."""
+    started = time.perf_counter()
+    first_token = None
+    try:
+        response = session.post(f"{url}/api/query", json={'query': query, 'stream': stream},
+                                headers={'Authorization': f"Bearer {token}"}, stream=stream, timeout=120)
+        if stream and response.status_code == 200:
+            for line in response.iter_lines(decode_unicode=True):
+                if first_token is None and line == 'event: token':
+                    first_token = time.perf_counter() - started
+                elif line == 'event: error':
+                    response.close()
+                    return 'stream_error', time.perf_counter() - started, first_token
+        else:
+            response.content
+        return response.status_code, time.perf_counter() - started, first_token
+    except requests.RequestException as e:
+        return type(e).__name__, time.perf_counter() - started, None
+
+def run_load(url, token, queries, concurrency, duration, total, stream, seed):
+    deadline = time.perf_counter() + duration if duration else None
+    remaining = [total] if total else None
+    lock = threading.Lock()
+    samples = []  # (status, seconds, first token seconds)
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        session = requests.Session()
+        while True:
+            if deadline and time.perf_counter() >= deadline:
+                return
+            if remaining is not None:
+                with lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+            sample = one_request(session, url, token, rng.choice(queries), stream)
+            with lock:
+                samples.append(sample)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - started
+
+def summarize(samples, elapsed):
+    statuses = Counter(str(status) for status, _, _ in samples)
+    ok = [seconds for status, seconds, _ in samples if status == 200]
+    first_tokens = [first for status, _, first in samples if status == 200 and first is not None]
+    summary = {
+        'requests': len(samples),
+        'statuses': dict(statuses),
+        'success_rate': len(ok) / len(samples) if samples else 0.0,
+        'throughput_qps': len(ok) / elapsed if elapsed else 0.0,
+        **latency_summary(ok)
+    }
+    if first_tokens:
+        summary['first_token'] = latency_summary(first_tokens)
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /api/query")
+    parser.add_argument('--url', help="Target a running server instead of starting the app in-process")
+    parser.add_argument('--token', help="JWT for --url")
+    parser.add_argument('--queries', default='bench_queries.jsonl')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=20, help="Seconds to run (ignored with --requests)")
+    parser.add_argument('--requests', type=int, help="Stop after this many requests")
+    parser.add_argument('--stream', action='store_true', help="Use SSE and record time to first token")
+    parser.add_argument('--llm-latency', type=float, default=0.5, help="Stub LLM time to first token (s)")
+    parser.add_argument('--token-delay', type=float, default=0.01, help="Stub LLM delay per token (s)")
+    parser.add_argument('--keep-limits', action='store_true', help="Leave rate limiting on in-process")
+    parser.add_argument('--answer-cache', action='store_true', help="Leave the semantic answer cache on")
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--output', help="Results file (default bench_results/loadtest-<time>.json)")
+    parser.add_argument('--compare', help="Earlier results file to check for regressions")
+    args = parser.parse_args()
+
+    with open(args.queries, 'r') as f:
+        queries = [json.loads(line)['query'] for line in f if line.strip()]
+    queries += ["Tell me about COMP 352", "What are the prerequisites for COMP 352?"]
+
+    if args.url:
+        if not args.token:
+            parser.error("--token is required with --url")
+        url, token = args.url.rstrip('/'), args.token
+    else:
+        url, token = start_app(start_stubs(args.llm_latency, args.token_delay), args.keep_limits, args.answer_cache)
+
+    print(f"Load: {args.concurrency} clients, "
+          f"{f'{args.requests} requests' if args.requests else f'{args.duration:.0f}s'} against {url}")
+    samples, elapsed = run_load(url, token, queries, args.concurrency,
+                                None if args.requests else args.duration, args.requests, args.stream, args.seed)
+    summary = summarize(samples, elapsed)
+
+    print(f"\nrequests {summary['requests']}  statuses {summary['statuses']}  "
+          f"success {summary['success_rate']:.1%}  throughput {summary['throughput_qps']:.1f} req/s")
+    if summary['p50_ms'] is not None:
+        print(f"latency ms  p50 {summary['p50_ms']:.0f}  p95 {summary['p95_ms']:.0f}  p99 {summary['p99_ms']:.0f}")
+    if 'first_token' in summary:
+        ft = summary['first_token']
+        print(f"first token ms  p50 {ft['p50_ms']:.0f}  p95 {ft['p95_ms']:.0f}  p99 {ft['p99_ms']:.0f}")
+
+    results = {
+        '_config': {'concurrency': args.concurrency, 'duration': args.duration, 'requests': args.requests,
+                    'stream': args.stream, 'llm_latency': args.llm_latency, 'token_delay': args.token_delay,
+                    'target': args.url or 'in-process'},
+        'query': summary
+    }
+    path = save_results('loadtest', results, args.output)
+    print(f"\nSaved {path}")
+
+    if args.compare:
+        if print_comparison(compare(results, load_results(args.compare)['results'])):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
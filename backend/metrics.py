@@ -0,0 +1,118 @@
+import time
+import threading
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from cache hits up to slow LLM completions
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    inner = ','.join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+    return '{' + inner + '}'
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}  # label tuple -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                labels = dict(key)
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_label_text({**labels, 'le': bound})} {bucket_count}")
+                lines.append(f"{self.name}_bucket{_label_text({**labels, 'le': '+Inf'})} {count}")
+                lines.append(f"{self.name}_sum{_label_text(labels)} {total}")
+                lines.append(f"{self.name}_count{_label_text(labels)} {count}")
+        return lines
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_text(dict(key))} {value}")
+        return lines
+
+STAGE_SECONDS = Histogram('conuai_stage_seconds', 'Time spent in each /api/query stage')
+REQUEST_SECONDS = Histogram('conuai_request_seconds', 'End-to-end request latency')
+REQUESTS = Counter('conuai_requests_total', 'Requests by endpoint and status')
+DB_QUERIES = Counter('conuai_db_queries_total', 'SQL statements executed, by endpoint')
+
+_metrics = [STAGE_SECONDS, REQUEST_SECONDS, REQUESTS, DB_QUERIES]
+_gauge_sources = []
+
+@contextmanager
+def span(stage):
+    """Time a block and record it in the stage histogram."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+
+def timed(stage, fn):
+    """Wrap a zero-argument callable in a span (for pipeline branches)."""
+    def run():
+        with span(stage):
+            return fn()
+    return run
+
+def register_gauges(prefix, source):
+    """
+    Export the numeric values of ``source()`` (a possibly nested stats dict)
+    as gauges named ``conuai_<prefix>_<key>`` on every scrape.
+    """
+    _gauge_sources.append((prefix, source))
+
+def _flatten(prefix, value):
+    if isinstance(value, bool):
+        yield prefix, int(value)
+    elif isinstance(value, (int, float)):
+        yield prefix, value
+    elif isinstance(value, dict):
+        for key, inner in value.items():
+            yield from _flatten(f"{prefix}_{key}", inner)
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for prefix, source in _gauge_sources:
+        try:
+            values = source()
+        except Exception:
+            continue
+        for name, value in _flatten(f"conuai_{prefix}", values or {}):
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,86 @@
+"""
+Schema migrations.
+
+``db.create_all()`` creates missing tables but never changes existing ones,
+so indexes and column changes go here as numbered steps.  Applied versions
+are recorded in the ``schema_migrations`` table; ``upgrade()`` runs the
+pending ones in order, each in its own transaction.
+
+Usage:
+    python migrations.py            # apply pending migrations
+    python migrations.py --status   # list applied / pending
+"""
+import sys
+import datetime
+import logging
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+# (version, description, statements). Statements must work on SQLite and PostgreSQL.
+MIGRATIONS = [
+    (1, 'case-insensitive email lookup',
+     ['CREATE INDEX IF NOT EXISTS ix_user_email_lower ON "user" (lower(email))']),
+    (2, 'user signups by date',
+     ['CREATE INDEX IF NOT EXISTS ix_user_created_at ON "user" (created_at)']),
+    (3, 'conversation history lookups',
+     ['CREATE INDEX IF NOT EXISTS ix_conversation_user_updated ON conversation (user_id, updated_at)',
+      'CREATE INDEX IF NOT EXISTS ix_message_conversation ON message (conversation_id, id)']),
+]
+
+def _ensure_table(connection):
+    connection.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, description VARCHAR(200), applied_at TIMESTAMP)"
+    ))
+
+def applied_versions(engine):
+    with engine.begin() as connection:
+        _ensure_table(connection)
+        return {row[0] for row in connection.execute(text("SELECT version FROM schema_migrations"))}
+
+def upgrade(engine):
+    """
+    Apply pending migrations.
+
+    Returns:
+        list: Versions applied by this call
+    """
+    done = applied_versions(engine)
+    applied = []
+    for version, description, statements in MIGRATIONS:
+        if version in done:
+            continue
+        try:
+            with engine.begin() as connection:
+                for statement in statements:
+                    connection.execute(text(statement))
+                connection.execute(
+                    text("INSERT INTO schema_migrations (version, description, applied_at) "
+                         "VALUES (:version, :description, :applied_at)"),
+                    {'version': version, 'description': description,
+                     'applied_at': datetime.datetime.utcnow()}
+                )
+        except IntegrityError:
+            # Another worker starting at the same time got there first
+            continue
+        logger.info("Applied migration %d: %s", version, description)
+        applied.append(version)
+    return applied
+
+def main():
+    from app import app
+    from models import db
+
+    with app.app_context():
+        if '--status' in sys.argv:
+            done = applied_versions(db.engine)
+            for version, description, _ in MIGRATIONS:
+                print(f"{version:4d}  {'applied' if version in done else 'pending':8s} {description}")
+            return
+        applied = upgrade(db.engine)
+        print(f"Applied {len(applied)} migration(s)" if applied else "Database is up to date")
+
+if __name__ == "__main__":
+    main()
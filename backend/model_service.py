@@ -0,0 +1,307 @@
+import os
+import time
+import logging
+import threading
+from langchain.embeddings.base import Embeddings
+from embedding_batcher import EmbeddingBatcher
+from retrieval import RetrievalEngine, ChromaBackend, FaissBackend, BACKENDS
+from query_cache import QueryCache, QUERY_CACHE_ENABLED
+from ingest import read_corpus_version, CORPUS_VERSION_NAME
+import bm25
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+CHROMA_DIR = os.getenv('CHROMA_DIR', './chroma_db')
+FAISS_DIR = os.getenv('FAISS_DIR', './vector_store')
+
+# Index served by /api/query: 'chroma' or 'faiss' (pick per deployment with bench_retrieval.py)
+RETRIEVAL_BACKEND = os.getenv('RETRIEVAL_BACKEND', 'chroma')
+
+# Fuse BM25 with vector search when a lexical index exists (HYBRID_RETRIEVAL=0 disables)
+HYBRID_RETRIEVAL = os.getenv('HYBRID_RETRIEVAL', '1') == '1'
+
+# Micro-batching of concurrent query embeddings (EMBED_BATCHING=0 disables)
+EMBED_BATCHING = os.getenv('EMBED_BATCHING', '1') == '1'
+EMBED_BATCH_MAX = int(os.getenv('EMBED_BATCH_MAX', '32'))
+EMBED_BATCH_WAIT_MS = float(os.getenv('EMBED_BATCH_WAIT_MS', '5'))
+# A request waiting longer than this for its query embedding fails instead of hanging
+EMBED_BATCH_TIMEOUT = float(os.getenv('EMBED_BATCH_TIMEOUT', '30'))
+
+# One copy of the model and index per process.  Under gunicorn with
+# preload_app (see gunicorn.conf.py) the model is loaded once in the master
+# and shared copy-on-write by every forked worker.
+_state = {
+    'model': None,
+    'embeddings': None,
+    'batcher': None,
+    'vectorstore': None,
+    'vectorstore_pid': None,
+    'vectorstore_error': None,
+    'retriever': None,
+    'retriever_pid': None,
+    'retriever_error': None,
+    'lexical_mtime': None,  # mtime of the Chroma bm25.npz the retriever has loaded
+    'query_cache': QueryCache() if QUERY_CACHE_ENABLED else None,
+    'corpus_versions': {},  # index folder -> (stamp file mtime, version)
+    'timings': {}
+}
+_lock = threading.RLock()
+
+def resident_memory_mb():
+    """Current resident set size of this process in MB, or None where it can't be read."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows without psutil
+        return None
+    # ru_maxrss is peak RSS, in KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def memory_label():
+    """Resident memory for log lines, e.g. ``'512 MB'``."""
+    rss = resident_memory_mb()
+    return f"{rss:.0f} MB" if rss is not None else 'unknown'
+
+class SharedEmbeddings(Embeddings):
+    """
+    LangChain embeddings adapter over the process-wide SentenceTransformer.
+
+    Query embeddings go through the micro-batcher when one is given, so
+    concurrent requests share encoder passes.
+    """
+
+    def __init__(self, model, batcher=None):
+        self.client = model
+        self.batcher = batcher
+
+    def embed_documents(self, texts):
+        return self.client.encode(list(texts)).tolist()
+
+    def embed_query(self, text):
+        if self.batcher is not None:
+            return self.batcher.embed(text)
+        return self.client.encode(text).tolist()
+
+def get_sentence_transformer():
+    if _state['model'] is None:
+        with _lock:
+            if _state['model'] is None:
+                from sentence_transformers import SentenceTransformer
+                started = time.perf_counter()
+                _state['model'] = SentenceTransformer(MODEL_NAME)
+                _state['timings']['model_load_seconds'] = time.perf_counter() - started
+                logger.info("Loaded %s in %.2fs (RSS %s)", MODEL_NAME,
+                            _state['timings']['model_load_seconds'], memory_label())
+    return _state['model']
+
+def get_batcher():
+    if _state['batcher'] is None and EMBED_BATCHING:
+        with _lock:
+            if _state['batcher'] is None:
+                model = get_sentence_transformer()
+                _state['batcher'] = EmbeddingBatcher(
+                    model.encode, max_batch=EMBED_BATCH_MAX, max_wait_ms=EMBED_BATCH_WAIT_MS,
+                    timeout=EMBED_BATCH_TIMEOUT
+                )
+    return _state['batcher']
+
+def get_embeddings():
+    if _state['embeddings'] is None:
+        with _lock:
+            if _state['embeddings'] is None:
+                _state['embeddings'] = SharedEmbeddings(get_sentence_transformer(), get_batcher())
+    return _state['embeddings']
+
+def get_vectorstore():
+    """
+    Open the Chroma store for this process, or return None if it is missing.
+
+    SQLite handles must not cross a fork, so the store is (re)opened lazily in
+    each worker process rather than in the preloading master.
+    """
+    if _state['vectorstore_pid'] != os.getpid():
+        with _lock:
+            if _state['vectorstore_pid'] != os.getpid():
+                from langchain.vectorstores import Chroma
+                started = time.perf_counter()
+                try:
+                    _state['vectorstore'] = Chroma(persist_directory=CHROMA_DIR,
+                                                   embedding_function=get_embeddings())
+                    _state['vectorstore_error'] = None
+                    logger.info("Successfully loaded existing vector store")
+                except Exception as e:
+                    logger.error("Error loading vector store: %s. Please run build_db.py "
+                                 "first to create the vector store", e)
+                    _state['vectorstore'] = None
+                    _state['vectorstore_error'] = str(e)
+                _state['timings']['vectorstore_open_seconds'] = time.perf_counter() - started
+                _state['vectorstore_pid'] = os.getpid()
+    return _state['vectorstore']
+
+def index_dir(backend=None):
+    return {'chroma': CHROMA_DIR, 'faiss': FAISS_DIR}[backend or RETRIEVAL_BACKEND]
+
+def index_file(backend=None):
+    """The file a rebuild rewrites, whose mtime versions the knowledge base."""
+    backend = backend or RETRIEVAL_BACKEND
+    return os.path.join(index_dir(backend), 'chroma.sqlite3' if backend == 'chroma' else 'index.faiss')
+
+def corpus_version(backend=None):
+    """
+    Version stamped by the last index build (ingest.write_corpus_version),
+    re-read when the stamp file changes.  Indexes built before stamps existed
+    fall back to the index file's mtime.
+    """
+    folder = index_dir(backend)
+    try:
+        mtime = os.path.getmtime(os.path.join(folder, CORPUS_VERSION_NAME))
+    except OSError:
+        try:
+            return f"mtime:{os.path.getmtime(index_file(backend))}"
+        except OSError:
+            return None
+    cached = _state['corpus_versions'].get(folder)
+    if cached is None or cached[0] != mtime:
+        cached = _state['corpus_versions'][folder] = (mtime, read_corpus_version(folder))
+    return cached[1]
+
+def embed_query(text):
+    """Query embedding, computed once per normalized query while the cache holds it."""
+    embeddings = get_embeddings()
+    if _state['query_cache'] is None:
+        return embeddings.embed_query(text)
+    return _state['query_cache'].embed(text, embeddings.embed_query)
+
+def open_engine(backend=None, use_cache=True):
+    """
+    Open a RetrievalEngine over the given backend's index in this process.
+    ``use_cache=False`` leaves out the result cache (for benchmarks).
+
+    Raises:
+        ValueError: Unknown backend
+        Exception: Whatever the backend raises when its index is missing or unreadable
+    """
+    backend = backend or RETRIEVAL_BACKEND
+    cache = _state['query_cache'] if use_cache else None
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown retrieval backend '{backend}', expected one of {BACKENDS}")
+    if backend == 'chroma':
+        vectorstore = get_vectorstore()
+        if vectorstore is None:
+            raise RuntimeError(_state['vectorstore_error'] or "Chroma store is not available")
+        lexical = None
+        if HYBRID_RETRIEVAL:
+            _state['lexical_mtime'] = _lexical_mtime()
+            lexical = bm25.load_index(CHROMA_DIR)
+        return RetrievalEngine(ChromaBackend(vectorstore), lexical, cache=cache,
+                               version=lambda: corpus_version('chroma'))
+
+    from embeddings import VectorStore
+    if not os.path.exists(index_file('faiss')):
+        raise RuntimeError(f"No FAISS index in {FAISS_DIR}")
+    store = VectorStore(model=get_sentence_transformer())
+    store.load(FAISS_DIR)
+    # The loaded index doesn't change under this process, so neither does its version
+    return RetrievalEngine(FaissBackend(store), store.bm25 if HYBRID_RETRIEVAL else None,
+                           cache=cache, version=lambda: f"faiss:{store.version}")
+
+def _lexical_mtime():
+    try:
+        return os.path.getmtime(os.path.join(CHROMA_DIR, bm25.FILE_NAME))
+    except OSError:
+        return None
+
+def _reload_lexical(engine):
+    """
+    Swap in the Chroma store's BM25 index after a rebuild.  Chroma itself is
+    read live, so without this the lexical leg would keep ranking the old
+    chunks until a restart.
+    """
+    mtime = _lexical_mtime()
+    if mtime == _state['lexical_mtime']:
+        return
+    with _lock:
+        if mtime != _state['lexical_mtime']:
+            _state['lexical_mtime'] = mtime
+            engine.bm25 = bm25.load_index(CHROMA_DIR)
+            logger.info("Reloaded the BM25 index (%s)", "found" if engine.bm25 is not None else "missing")
+
+def get_retriever():
+    """This process's RetrievalEngine over RETRIEVAL_BACKEND, or None if its index is missing."""
+    if _state['retriever_pid'] != os.getpid():
+        with _lock:
+            if _state['retriever_pid'] != os.getpid():
+                started = time.perf_counter()
+                try:
+                    _state['retriever'] = open_engine()
+                    _state['retriever_error'] = None
+                except Exception as e:
+                    logger.error("Error opening %s index: %s. Please run build_db.py first",
+                                 RETRIEVAL_BACKEND, e)
+                    _state['retriever'] = None
+                    _state['retriever_error'] = str(e)
+                _state['timings']['index_open_seconds'] = time.perf_counter() - started
+                _state['retriever_pid'] = os.getpid()
+    elif _state['retriever'] is not None and RETRIEVAL_BACKEND == 'chroma' and HYBRID_RETRIEVAL:
+        _reload_lexical(_state['retriever'])
+    return _state['retriever']
+
+def preload():
+    """Load the model in this process before workers fork (no inference, so no thread pools start)."""
+    get_sentence_transformer()
+
+def warm_up():
+    started = time.perf_counter()
+    get_embeddings()
+    get_retriever()
+    _state['timings']['warm_up_seconds'] = time.perf_counter() - started
+    logger.info("Models ready in %.2fs (pid %d, RSS %s)",
+                _state['timings']['warm_up_seconds'], os.getpid(), memory_label())
+
+def start_background_warm_up():
+    thread = threading.Thread(target=warm_up, name='model-warm-up', daemon=True)
+    thread.start()
+    return thread
+
+def is_ready():
+    return (_state['embeddings'] is not None
+            and _state['retriever_pid'] == os.getpid()
+            and _state['retriever'] is not None)
+
+def status():
+    rss = resident_memory_mb()
+    return {
+        'ready': is_ready(),
+        'pid': os.getpid(),
+        'model': MODEL_NAME,
+        'model_loaded': _state['model'] is not None,
+        'retrieval_backend': RETRIEVAL_BACKEND,
+        'index_loaded': _state['retriever_pid'] == os.getpid() and _state['retriever'] is not None,
+        'index_error': _state['retriever_error'],
+        'timings': dict(_state['timings']),
+        'embedding_batcher': batcher_stats(),
+        'rss_mb': round(rss, 1) if rss is not None else None
+    }
+
+def batcher_stats():
+    return _state['batcher'].stats() if _state['batcher'] is not None else None
+
+def query_cache_stats():
+    return _state['query_cache'].stats() if _state['query_cache'] is not None else None
+
+def retrieval_stats():
+    retriever = _state['retriever'] if _state['retriever_pid'] == os.getpid() else None
+    if retriever is None:
+        return None
+    return retriever.stats()
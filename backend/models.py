@@ -1,4 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import func
 from datetime import datetime
 
 db = SQLAlchemy()
@@ -11,4 +12,46 @@ class User(db.Model):
     lastName = db.Column(db.String(50), nullable=False)
     role = db.Column(db.String(50), nullable=False)
     isConcordiaAffiliate = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow) 
\ No newline at end of file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow) 
+
+    @classmethod
+    def find_by_email(cls, email):
+        """Case-insensitive lookup (served by the ix_user_email_lower index)."""
+        return cls.query.filter(func.lower(cls.email) == email.strip().lower()).first()
+
+class Conversation(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
+    title = db.Column(db.String(200))
+    # Rolling summary of every message up to and including summarized_through (a Message.id)
+    summary = db.Column(db.Text, default='')
+    summarized_through = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    messages = db.relationship('Message', backref='conversation', lazy='dynamic',
+                               cascade='all, delete-orphan', passive_deletes=True,
+                               order_by='Message.id')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+class Message(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    conversation_id = db.Column(db.Integer, db.ForeignKey('conversation.id', ondelete='CASCADE'), nullable=False)
+    role = db.Column(db.String(20), nullable=False)  # 'user' or 'assistant'
+    content = db.Column(db.Text, nullable=False)
+    tokens = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'role': self.role,
+            'content': self.content,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
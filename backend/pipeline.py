@@ -0,0 +1,83 @@
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+logger = logging.getLogger(__name__)
+
+# Shared pool for request fan-out. Branches are I/O bound (HTTP calls, Chroma
+# queries that release the GIL), so a small thread pool is enough.
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('PIPELINE_WORKERS', '12')),
+    thread_name_prefix='pipeline'
+)
+
+
+class Branch:
+    """
+    One independent step of a request pipeline.
+
+    Args:
+        name (str): Key used in the results dict
+        fn (callable): Zero-argument callable doing the work
+        timeout (float): Seconds to wait before giving up on this branch
+        fallback: Value returned when the branch times out or raises
+    """
+
+    def __init__(self, name, fn, timeout, fallback=None):
+        self.name = name
+        self.fn = fn
+        self.timeout = timeout
+        self.fallback = fallback
+
+
+class BranchResult:
+    def __init__(self, name, value, status, elapsed):
+        self.name = name
+        self.value = value
+        self.status = status  # 'ok', 'timeout' or 'error'
+        self.elapsed = elapsed
+
+    def __repr__(self):
+        return f"BranchResult({self.name!r}, status={self.status!r}, elapsed={self.elapsed:.3f}s)"
+
+
+def _timed(fn):
+    started = time.perf_counter()
+    value = fn()
+    return value, time.perf_counter() - started
+
+
+def run_parallel(branches):
+    """
+    Run independent branches concurrently and collect their results.
+
+    Every branch starts at the same time and gets its own deadline, so the
+    total wait is bounded by the slowest branch (or its timeout) instead of
+    the sum of all of them.  A branch that times out or raises yields its
+    fallback value; it never fails the whole request.
+
+    Returns:
+        dict: branch name -> BranchResult
+    """
+    started = time.perf_counter()
+    futures = [(branch, _executor.submit(_timed, branch.fn)) for branch in branches]
+
+    results = {}
+    for branch, future in futures:
+        deadline = started + branch.timeout
+        remaining = max(0.0, deadline - time.perf_counter())
+        try:
+            value, elapsed = future.result(timeout=remaining)
+            status = 'ok'
+        except FutureTimeoutError:
+            future.cancel()
+            logger.warning("Pipeline branch '%s' timed out after %.2fs", branch.name, branch.timeout)
+            value, status = branch.fallback, 'timeout'
+            elapsed = branch.timeout
+        except Exception as e:
+            logger.warning("Pipeline branch '%s' failed: %s", branch.name, e)
+            value, status = branch.fallback, 'error'
+            elapsed = time.perf_counter() - started
+        results[branch.name] = BranchResult(branch.name, value, status, elapsed)
+    return results
@@ -0,0 +1,53 @@
+import os
+import re
+import unicodedata
+from cache import TTLCache, MISSING
+
+# Two-level cache in front of retrieval (QUERY_CACHE_ENABLED=0 disables)
+QUERY_CACHE_ENABLED = os.getenv('QUERY_CACHE_ENABLED', '1') == '1'
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', '4096'))
+RETRIEVAL_RESULT_CACHE_SIZE = int(os.getenv('RETRIEVAL_RESULT_CACHE_SIZE', '4096'))
+
+_WHITESPACE = re.compile(r'\s+')
+
+def normalize_query(text):
+    """Case, Unicode form, whitespace and trailing punctuation don't change what is asked."""
+    text = unicodedata.normalize('NFKC', text).casefold()
+    return _WHITESPACE.sub(' ', text).strip().rstrip('?!. ')
+
+class QueryCache:
+    """
+    Level 1 maps a normalized query to its embedding; level 2 maps the
+    normalized query, k and source filter to the ranked chunk ids the
+    retrieval engine returned.
+
+    Level 2 keys also carry the corpus version stamped at index build time
+    and the engine's ranking settings, so a rebuilt index or a differently
+    tuned engine never serves old rankings; nothing has to be cleared.
+    Embeddings only depend on the model, so level 1 survives rebuilds.  Both
+    levels are LRU-bounded.
+    """
+
+    def __init__(self, embedding_size=QUERY_EMBEDDING_CACHE_SIZE, result_size=RETRIEVAL_RESULT_CACHE_SIZE):
+        self.embeddings = TTLCache(maxsize=embedding_size)
+        self.results = TTLCache(maxsize=result_size)
+
+    def embed(self, query, embed_fn):
+        """``embed_fn(query)``, computed once per normalized query."""
+        key = normalize_query(query)
+        vector = self.embeddings.get(key)
+        if vector is MISSING:
+            vector = embed_fn(query)
+            self.embeddings.set(key, vector)
+        return vector
+
+    @staticmethod
+    def result_key(version, query, k, sources=None, config=None):
+        """``config`` is every engine setting that changes the ranking (RetrievalEngine.config)."""
+        return (version, config, normalize_query(query), k, frozenset(sources) if sources else None)
+
+    def stats(self):
+        return {
+            'embeddings': self.embeddings.stats(),
+            'results': self.results.stats()
+        }
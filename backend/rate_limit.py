@@ -0,0 +1,247 @@
+import os
+import time
+import sqlite3
+import threading
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', '1') == '1'
+# Per-user budget: sustained requests per minute, plus a burst allowance
+RATE_LIMIT_USER_PER_MINUTE = float(os.getenv('RATE_LIMIT_USER_PER_MINUTE', '10'))
+RATE_LIMIT_USER_BURST = float(os.getenv('RATE_LIMIT_USER_BURST', '5'))
+# Whole-service budget, shared by every user
+RATE_LIMIT_GLOBAL_PER_MINUTE = float(os.getenv('RATE_LIMIT_GLOBAL_PER_MINUTE', '300'))
+RATE_LIMIT_GLOBAL_BURST = float(os.getenv('RATE_LIMIT_GLOBAL_BURST', '30'))
+# 'memory' (per process) or a SQLite file shared by all workers on the host
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory')
+
+# Admission control for the LLM stage, per process
+ADMISSION_MAX_CONCURRENT = int(os.getenv('ADMISSION_MAX_CONCURRENT', '8'))
+ADMISSION_MAX_QUEUE = int(os.getenv('ADMISSION_MAX_QUEUE', '16'))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', '5'))
+
+class Bucket:
+    """A token bucket: ``rate`` tokens per second, holding at most ``burst``."""
+
+    def __init__(self, key, rate, burst):
+        self.key = key
+        self.rate = rate
+        self.burst = burst
+
+def _refill(tokens, updated, bucket, now):
+    if tokens is None:
+        return bucket.burst
+    return min(bucket.burst, tokens + (now - updated) * bucket.rate)
+
+def _decide(levels, buckets, cost):
+    """(allowed, retry_after) given each bucket's current token level."""
+    waits = [(cost - level) / bucket.rate if bucket.rate > 0 else float('inf')
+             for level, bucket in zip(levels, buckets) if level < cost]
+    if waits:
+        return False, max(waits)
+    return True, 0.0
+
+class MemoryBackend:
+    """Bucket state in this process; least recently used keys are dropped past ``max_keys``."""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._state = OrderedDict()  # key -> (tokens, updated)
+        self._lock = threading.Lock()
+
+    def take(self, buckets, cost=1.0):
+        """
+        Take ``cost`` tokens from every bucket, or from none of them.
+
+        Returns:
+            tuple: (allowed, seconds until the request would be allowed)
+        """
+        now = time.monotonic()
+        with self._lock:
+            levels = [_refill(*self._state.get(b.key, (None, now)), b, now) for b in buckets]
+            allowed, retry_after = _decide(levels, buckets, cost)
+            for level, bucket in zip(levels, buckets):
+                self._state[bucket.key] = (level - cost if allowed else level, now)
+                self._state.move_to_end(bucket.key)
+            while len(self._state) > self.max_keys:
+                self._state.popitem(last=False)
+        return allowed, retry_after
+
+class SQLiteBackend:
+    """
+    Bucket state in a SQLite file, so every worker process on the host
+    draws from the same buckets.  Each decision is one short write
+    transaction.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS buckets "
+                               "(key TEXT PRIMARY KEY, tokens REAL, updated REAL)")
+
+    def _connection(self):
+        if getattr(self._local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=OFF")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def take(self, buckets, cost=1.0):
+        connection = self._connection()
+        # Wall clock: monotonic clocks aren't comparable across processes
+        now = time.time()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            levels = []
+            for bucket in buckets:
+                row = connection.execute("SELECT tokens, updated FROM buckets WHERE key = ?",
+                                         (bucket.key,)).fetchone()
+                levels.append(_refill(*(row or (None, now)), bucket, now))
+            allowed, retry_after = _decide(levels, buckets, cost)
+            connection.executemany(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                [(b.key, level - cost if allowed else level, now) for level, b in zip(levels, buckets)]
+            )
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return allowed, retry_after
+
+def make_backend(spec=RATE_LIMIT_BACKEND):
+    if spec == 'memory':
+        return MemoryBackend()
+    path = spec[len('sqlite:///'):] if spec.startswith('sqlite:///') else spec
+    return SQLiteBackend(path)
+
+class RateLimiter:
+    """
+    Per-user and global token buckets.
+
+    A request needs a token from both its user's bucket and the global one;
+    tokens are only taken when both have one, so a request turned away by
+    the global limit doesn't also cost the user.
+    """
+
+    def __init__(self, user_per_minute=RATE_LIMIT_USER_PER_MINUTE, user_burst=RATE_LIMIT_USER_BURST,
+                 global_per_minute=RATE_LIMIT_GLOBAL_PER_MINUTE, global_burst=RATE_LIMIT_GLOBAL_BURST,
+                 backend=None):
+        # A zero rate never refills; RATE_LIMIT_ENABLED=0 is how limits are turned off
+        if not (user_per_minute > 0 and global_per_minute > 0):
+            raise ValueError("Rate limits must be positive (RATE_LIMIT_ENABLED=0 turns them off)")
+        if not (user_burst >= 1 and global_burst >= 1):
+            raise ValueError("Rate limit bursts must be at least 1")
+        self.user_rate = user_per_minute / 60
+        self.user_burst = user_burst
+        self.global_bucket = Bucket('global', global_per_minute / 60, global_burst)
+        self.backend = backend or make_backend()
+        self.allowed = 0
+        self.limited = 0
+
+    def check(self, user_key):
+        """
+        Returns:
+            tuple: (allowed, retry_after seconds)
+        """
+        buckets = [Bucket(f"user:{user_key}", self.user_rate, self.user_burst), self.global_bucket]
+        try:
+            allowed, retry_after = self.backend.take(buckets)
+        except Exception as e:
+            # A broken shared backend must not take the service down with it
+            logger.warning("Rate limit backend failed, allowing request: %s", e)
+            return True, 0.0
+        if allowed:
+            self.allowed += 1
+        else:
+            self.limited += 1
+        return allowed, retry_after
+
+    def stats(self):
+        return {
+            'backend': type(self.backend).__name__,
+            'allowed': self.allowed,
+            'limited': self.limited
+        }
+
+class ConcurrencyGate:
+    """
+    Bounds how many requests are in the LLM stage at once.
+
+    Requests beyond ``max_concurrent`` wait in a queue of at most
+    ``max_queue`` for up to ``queue_timeout`` seconds; anything past that is
+    shed immediately, which keeps the wait of admitted requests (and so the
+    tail latency) bounded instead of growing with the backlog.
+    """
+
+    def __init__(self, max_concurrent=ADMISSION_MAX_CONCURRENT, max_queue=ADMISSION_MAX_QUEUE,
+                 queue_timeout=ADMISSION_QUEUE_TIMEOUT):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        # Moving average of how long a slot is held, for Retry-After
+        self.avg_hold = 5.0
+
+    def acquire(self):
+        """
+        Returns:
+            bool: True if admitted (call ``release`` when done), False if shed
+        """
+        if self._slots.acquire(blocking=False):
+            return self._admit()
+        with self._lock:
+            if self.waiting >= self.max_queue:
+                self.shed += 1
+                return False
+            self.waiting += 1
+        try:
+            got = self._slots.acquire(timeout=self.queue_timeout)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+        if not got:
+            with self._lock:
+                self.shed += 1
+            return False
+        return self._admit()
+
+    def _admit(self):
+        with self._lock:
+            self.active += 1
+            self.admitted += 1
+        return True
+
+    def release(self, held_for=None):
+        with self._lock:
+            self.active -= 1
+            if held_for is not None:
+                self.avg_hold = 0.9 * self.avg_hold + 0.1 * held_for
+        self._slots.release()
+
+    def retry_after(self):
+        """Rough seconds until a slot frees up for a new request."""
+        with self._lock:
+            backlog = self.waiting + 1
+        return max(1, round(self.avg_hold * backlog / self.max_concurrent))
+
+    def stats(self):
+        return {
+            'active': self.active,
+            'waiting': self.waiting,
+            'max_concurrent': self.max_concurrent,
+            'max_queue': self.max_queue,
+            'admitted': self.admitted,
+            'shed': self.shed,
+            'avg_hold_seconds': self.avg_hold
+        }
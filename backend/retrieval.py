@@ -0,0 +1,222 @@
+import os
+import time
+import threading
+import logging
+import numpy as np
+from langchain.schema import Document
+
+logger = logging.getLogger(__name__)
+
+RETRIEVAL_TOP_K = int(os.getenv('RETRIEVAL_TOP_K', '3'))
+# How many hits each leg contributes before fusion
+RETRIEVAL_CANDIDATES = int(os.getenv('RETRIEVAL_CANDIDATES', '20'))
+RRF_K = int(os.getenv('RRF_K', '60'))
+# With a source filter, legs that can't filter natively search this many times deeper
+RETRIEVAL_FILTER_OVERFETCH = int(os.getenv('RETRIEVAL_FILTER_OVERFETCH', '10'))
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """
+    Merge ranked id lists with reciprocal rank fusion.
+
+    Each list adds 1 / (k + rank) to the score of every id it contains, so a
+    document ranked well by either retriever rises, and one ranked well by
+    both rises most.  No score calibration between retrievers is needed.
+
+    Returns:
+        list: (id, score) pairs, best first
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+class StageTimings:
+    """Running totals of per-stage retrieval latency."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.totals = {}
+
+    def record(self, timings):
+        with self._lock:
+            self.count += 1
+            for stage, ms in timings.items():
+                self.totals[stage] = self.totals.get(stage, 0.0) + ms
+
+    def stats(self):
+        return {
+            'queries': self.count,
+            'avg_ms': {stage: total / self.count for stage, total in self.totals.items()} if self.count else {}
+        }
+
+class ChromaBackend:
+    """Dense search over a LangChain Chroma store; chunk ids are the Chroma ids."""
+    name = 'chroma'
+    id_type = str
+
+    def __init__(self, vectorstore):
+        self.vectorstore = vectorstore
+        self.collection = vectorstore._collection
+
+    def search(self, embedding, n, sources=None):
+        """
+        Returns:
+            tuple: (ranked chunk ids, dict of id -> Document)
+        """
+        kwargs = {}
+        if sources:
+            # Chroma filters on metadata before ranking
+            kwargs['where'] = {'source': {'$in': sorted(sources)}}
+        result = self.collection.query(query_embeddings=[embedding], n_results=n,
+                                       include=['documents', 'metadatas'], **kwargs)
+        ids = result['ids'][0]
+        return ids, self._documents(ids, result['documents'][0], result['metadatas'][0])
+
+    def fetch(self, ids):
+        result = self.collection.get(ids=list(ids), include=['documents', 'metadatas'])
+        return self._documents(result['ids'], result['documents'], result['metadatas'])
+
+    def _documents(self, ids, texts, metadatas):
+        return {doc_id: Document(page_content=text, metadata=metadata or {})
+                for doc_id, text, metadata in zip(ids, texts, metadatas)}
+
+    def __len__(self):
+        return self.collection.count()
+
+class FaissBackend:
+    """
+    Dense search over a loaded embeddings.VectorStore (FAISS index plus
+    memory-mapped chunk store); chunk ids are row numbers.
+
+    FAISS has no metadata, so a source filter is applied to the hits of a
+    deeper search, widened to the whole index if too few survive.
+    """
+    name = 'faiss'
+    id_type = int
+
+    def __init__(self, store, overfetch=RETRIEVAL_FILTER_OVERFETCH):
+        self.store = store
+        self.overfetch = overfetch
+
+    def search(self, embedding, n, sources=None):
+        index = self.store.index
+        vector = np.asarray([embedding], dtype='float32')
+        depth = min(n * self.overfetch if sources else n, index.ntotal)
+        while True:
+            _, rows = index.search(vector, depth)
+            # Approximate indexes return -1 when fewer hits were found
+            ids = [int(row) for row in rows[0] if row >= 0]
+            if sources:
+                ids = [row for row in ids if self.store.sources[row] in sources]
+            if not sources or len(ids) >= n or depth >= index.ntotal:
+                break
+            depth = index.ntotal
+        ids = ids[:n]
+        return ids, self.fetch(ids)
+
+    def fetch(self, ids):
+        return {row: Document(page_content=self.store.texts[row], metadata={'source': self.store.sources[row]})
+                for row in ids}
+
+    def __len__(self):
+        return self.store.index.ntotal
+
+BACKENDS = ('chroma', 'faiss')
+
+class RetrievalEngine:
+    """
+    Dense + lexical (BM25) retrieval fused with reciprocal rank fusion, over
+    either index backend.
+
+    The BM25 index is built by ingest next to the vector index, keyed by the
+    same chunk ids, and is optional: without it this is plain vector search.
+    ``sources`` restricts every leg to chunks from the given page URLs.
+
+    With a ``cache`` (query_cache.QueryCache), ranked ids are remembered per
+    corpus version (``version()``) and a repeated query only fetches the
+    chunks.
+    """
+
+    def __init__(self, backend, bm25=None, candidates=RETRIEVAL_CANDIDATES, rrf_k=RRF_K,
+                 overfetch=RETRIEVAL_FILTER_OVERFETCH, cache=None, version=None):
+        self.backend = backend
+        self.bm25 = bm25
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self.overfetch = overfetch
+        self.cache = cache
+        self.version = version or (lambda: None)
+        self.timings = StageTimings()
+
+    @property
+    def name(self):
+        return self.backend.name
+
+    @property
+    def config(self):
+        """Everything besides the query that decides the ranking; part of the result cache key."""
+        return (self.name, self.bm25 is not None, self.candidates, self.rrf_k, self.overfetch)
+
+    def search(self, query, embedding, k=RETRIEVAL_TOP_K, sources=None):
+        """
+        Returns:
+            tuple: (list of Documents, dict of stage -> milliseconds)
+        """
+        sources = set(sources) if sources else None
+        timings = {}
+
+        key = None
+        if self.cache is not None:
+            started = time.perf_counter()
+            key = self.cache.result_key(self.version(), query, k, sources, self.config)
+            ids = self.cache.results.get(key, None)
+            if ids is not None:
+                found = self.backend.fetch(ids)
+                timings['cached_ms'] = (time.perf_counter() - started) * 1000
+                self.timings.record(timings)
+                return [found[doc_id] for doc_id in ids if doc_id in found], timings
+
+        ids, found = self._rank(query, embedding, k, sources, timings)
+        if key is not None:
+            self.cache.results.set(key, ids)
+        self.timings.record(timings)
+        return [found[doc_id] for doc_id in ids], timings
+
+    def _rank(self, query, embedding, k, sources, timings):
+        """Ranked chunk ids plus the Documents fetched along the way."""
+        started = time.perf_counter()
+        dense_ids, found = self.backend.search(embedding, self.candidates, sources)
+        timings['dense_ms'] = (time.perf_counter() - started) * 1000
+
+        if self.bm25 is None:
+            return dense_ids[:k], found
+
+        started = time.perf_counter()
+        depth = self.candidates * self.overfetch if sources else self.candidates
+        lexical_ids = [self.backend.id_type(doc_id) for doc_id, _ in self.bm25.search(query, depth)]
+        if sources:
+            self._fetch_missing(lexical_ids, found)
+            lexical_ids = [doc_id for doc_id in lexical_ids
+                           if doc_id in found and found[doc_id].metadata.get('source') in sources]
+        lexical_ids = lexical_ids[:self.candidates]
+        timings['lexical_ms'] = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        fused = [doc_id for doc_id, _ in reciprocal_rank_fusion([dense_ids, lexical_ids], self.rrf_k)[:k]]
+        # Lexical-only hits still need their text
+        self._fetch_missing(fused, found)
+        timings['fuse_ms'] = (time.perf_counter() - started) * 1000
+        return [doc_id for doc_id in fused if doc_id in found], found
+
+    def _fetch_missing(self, ids, found):
+        missing = [doc_id for doc_id in ids if doc_id not in found]
+        if missing:
+            found.update(self.backend.fetch(missing))
+
+    def stats(self):
+        stats = self.timings.stats()
+        stats['backend'] = self.name
+        stats['hybrid'] = self.bm25 is not None
+        return stats
@@ -0,0 +1,274 @@
+"""
+Background scraper for the live Concordia pages used as extra context.
+
+Pages are fetched concurrently (conditional GETs, per-URL timeout), their
+HTML is turned into text, and the results go to a versioned JSON cache on
+disk.  Every worker process reads the same file, so the content survives
+restarts and is shared between gunicorn workers.
+
+Request handlers only ever read the cache: ``Scraper.passages`` returns the
+cached passages that best match a question (BM25 over sentence chunks).  A
+stale cache schedules a refresh in a background thread and keeps serving
+the old text meanwhile; one refresh runs at a time across all processes
+(file lock).
+
+Usage:
+    python scraper.py           # refresh stale pages now
+    python scraper.py --force   # refetch every page
+"""
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+from langchain.schema import Document
+from ingest import fetch_pages, extract_all, chunk_text
+from bm25 import BM25Index
+
+logger = logging.getLogger(__name__)
+
+SCRAPE_URLS = [
+    "https://www.concordia.ca/students.html",
+    "https://www.concordia.ca/academics.html",
+    "https://www.concordia.ca/students/success.html",
+    "https://www.concordia.ca/students/financial-support.html",
+    "https://www.concordia.ca/admissions.html",
+    "https://theconcordian.com/",
+    "https://csu.qc.ca/",
+    "https://en.wikipedia.org/wiki/Concordia_University"
+]
+
+# Bump when extraction changes so cached text from older code is refetched
+CACHE_VERSION = 2
+SCRAPE_CACHE_PATH = os.getenv('SCRAPE_CACHE_PATH', os.path.join(os.path.dirname(__file__), 'scrape_cache.json'))
+SCRAPE_TTL = float(os.getenv('SCRAPE_TTL', str(6 * 3600)))
+# Pages that failed are retried sooner than the normal TTL
+SCRAPE_ERROR_TTL = float(os.getenv('SCRAPE_ERROR_TTL', '300'))
+SCRAPE_TIMEOUT = float(os.getenv('SCRAPE_TIMEOUT', '10'))
+SCRAPE_FETCH_WORKERS = int(os.getenv('SCRAPE_FETCH_WORKERS', '8'))
+# Extraction processes for `python scraper.py`.  Servers always extract in the refresh
+# thread: forking a multithreaded server process can deadlock the child.
+SCRAPE_PROCESSES = int(os.getenv('SCRAPE_PROCESSES', str(min(4, os.cpu_count() or 1))))
+# Best-matching cached passages added to each /api/query prompt (0 leaves live pages out)
+SCRAPE_CONTEXT_PASSAGES = int(os.getenv('SCRAPE_CONTEXT_PASSAGES', '2'))
+# Seconds between scheduled refreshes; 0 refreshes only when a stale cache is read
+SCRAPE_REFRESH_INTERVAL = float(os.getenv('SCRAPE_REFRESH_INTERVAL', '0'))
+
+class ScrapeCache:
+    """
+    Page texts on disk: ``{"version": N, "pages": {url: entry}}``.
+
+    Each entry holds the text, the validators for the next conditional GET,
+    and an ``expires_at`` timestamp.  The file is replaced atomically and
+    re-read whenever its mtime changes, so writes by one process are seen by
+    all the others.
+    """
+
+    def __init__(self, path=SCRAPE_CACHE_PATH, version=CACHE_VERSION):
+        self.path = path
+        self.version = version
+        self.pages = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+        # (urls, [(url, passage)], BM25Index) over the current pages, built on first search
+        self._passages = None
+
+    def reload(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        with self._lock:
+            if mtime == self._mtime:
+                return
+            try:
+                with open(self.path, 'r') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning("Ignoring unreadable scrape cache %s: %s", self.path, e)
+                data = {}
+            self.pages = data.get('pages', {}) if data.get('version') == self.version else {}
+            self._mtime = mtime
+            self._passages = None
+
+    def save(self, pages):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': self.version, 'pages': pages}, f)
+        os.replace(tmp_path, self.path)
+        with self._lock:
+            self.pages = pages
+            self._mtime = os.path.getmtime(self.path)
+            self._passages = None
+
+    def stale_urls(self, urls, now=None):
+        now = now or time.time()
+        return [url for url in urls if self.pages.get(url, {}).get('expires_at', 0) <= now]
+
+    def text(self, urls):
+        return ' '.join(self.pages[url]['text'] for url in urls if self.pages.get(url, {}).get('text'))
+
+    def search(self, urls, query, k):
+        """
+        Returns:
+            list: (url, passage) pairs from ``urls``, best BM25 match first
+        """
+        with self._lock:
+            index = self._passages
+            if index is None or index[0] != urls:
+                passages = [(url, passage) for url in urls
+                            for passage in chunk_text(self.pages.get(url, {}).get('text') or '')]
+                index = (urls, passages, BM25Index.build(range(len(passages)), [p for _, p in passages]))
+                self._passages = index
+        _, passages, bm25 = index
+        return [passages[int(doc_id)] for doc_id, _ in bm25.search(query, k)] if passages else []
+
+@contextmanager
+def _exclusive(path):
+    """Holds an exclusive lock on ``path`` without waiting; yields False if another process has it."""
+    with open(path, 'w') as lock_file:
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            if fcntl is None:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+class Scraper:
+    def __init__(self, urls=SCRAPE_URLS, cache=None, ttl=SCRAPE_TTL, error_ttl=SCRAPE_ERROR_TTL,
+                 timeout=SCRAPE_TIMEOUT, fetch_workers=SCRAPE_FETCH_WORKERS, processes=1):
+        self.urls = list(urls)
+        self.cache = cache or ScrapeCache()
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.timeout = timeout
+        self.fetch_workers = fetch_workers
+        self.processes = processes
+        self._refreshing = threading.Lock()
+        self.refreshes = 0
+        self.last_refresh = None
+
+    def refresh(self, force=False):
+        """
+        Fetch stale pages and update the cache.  Returns the number of pages
+        refreshed, or None if another process is already refreshing.
+        """
+        with _exclusive(f"{self.cache.path}.lock") as locked:
+            if not locked:
+                return None
+            self.cache.reload()
+            urls = self.urls if force else self.cache.stale_urls(self.urls)
+            if not urls:
+                return 0
+
+            started = time.perf_counter()
+            # Conditional GETs: unchanged pages cost a 304 and keep their text
+            previous = {} if force else self.cache.pages
+            fetched = fetch_pages(urls, manifest=previous, max_workers=self.fetch_workers, timeout=self.timeout)
+            texts = extract_all({url: r.html for url, r in fetched.items() if r.status == 'changed'}, self.processes)
+
+            now = time.time()
+            pages = dict(self.cache.pages)
+            for url, result in fetched.items():
+                entry = dict(pages.get(url, {}))
+                if result.status == 'changed':
+                    entry.update(text=texts[url], etag=result.etag, last_modified=result.last_modified,
+                                 fetched_at=now, expires_at=now + self.ttl, error=None)
+                elif result.status == 'unchanged':
+                    entry.update(fetched_at=now, expires_at=now + self.ttl, error=None)
+                elif result.status == 'gone':
+                    entry = {'text': '', 'fetched_at': now, 'expires_at': now + self.ttl, 'error': 'gone'}
+                else:
+                    logger.warning("Error scraping %s: %s", url, result.error)
+                    entry.update(expires_at=now + self.error_ttl, error=result.error)
+                pages[url] = entry
+            self.cache.save(pages)
+
+        self.refreshes += 1
+        self.last_refresh = now
+        logger.info("Scraped %d pages in %.2fs", len(urls), time.perf_counter() - started)
+        return len(urls)
+
+    def refresh_in_background(self, force=False):
+        """Start a refresh thread unless one is already running in this process."""
+        if not self._refreshing.acquire(blocking=False):
+            return False
+
+        def run():
+            try:
+                self.refresh(force)
+            except Exception:
+                logger.exception("Background scrape failed")
+            finally:
+                self._refreshing.release()
+
+        threading.Thread(target=run, name='scraper', daemon=True).start()
+        return True
+
+    def passages(self, query, k=SCRAPE_CONTEXT_PASSAGES):
+        """
+        The ``k`` cached passages that best match ``query``, as Documents
+        (source = page URL); never blocks on the network.  Stale or missing
+        pages trigger a background refresh and are served from the previous
+        copy (or left out) until it lands.
+        """
+        if k <= 0:
+            return []
+        self.cache.reload()
+        if self.cache.stale_urls(self.urls):
+            self.refresh_in_background()
+        return [Document(page_content=passage, metadata={'source': url})
+                for url, passage in self.cache.search(self.urls, query, k)]
+
+    def start_periodic_refresh(self, interval=SCRAPE_REFRESH_INTERVAL):
+        if interval <= 0:
+            return None
+
+        def loop():
+            while True:
+                try:
+                    self.refresh()
+                except Exception:
+                    logger.exception("Scheduled scrape failed")
+                time.sleep(interval)
+
+        thread = threading.Thread(target=loop, name='scraper-schedule', daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        now = time.time()
+        return {
+            'pages': len(self.urls),
+            'cached': sum(1 for url in self.urls if self.cache.pages.get(url, {}).get('text')),
+            'stale': len(self.cache.stale_urls(self.urls, now)),
+            'errors': sum(1 for url in self.urls if self.cache.pages.get(url, {}).get('error')),
+            'refreshes': self.refreshes,
+            'seconds_since_refresh': now - self.last_refresh if self.last_refresh else None
+        }
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    count = Scraper(processes=SCRAPE_PROCESSES).refresh(force='--force' in sys.argv)
+    if count is None:
+        print("Another process is refreshing the scrape cache")
+    else:
+        print(f"Refreshed {count} page(s)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import re
+import time
+import threading
+import logging
+from collections import OrderedDict
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Stands in for the user's first name inside stored answers
+USER_NAME_PLACEHOLDER = '\x00user_name\x00'
+# Opening salutation whose name is templated ("Hi Will," / "**Hello Will!**")
+GREETING = r'^(\W*(?:hi|hello|hey|dear|greetings|good (?:morning|afternoon|evening))[\s,]+){name}\b'
+
+class CachedAnswer:
+    def __init__(self, answer, sources, similarity):
+        self.answer = answer
+        self.sources = sources
+        self.similarity = similarity
+
+class SemanticCache:
+    """
+    Answer cache keyed on query embeddings.
+
+    A lookup returns a stored answer when the cosine similarity between the
+    new query embedding and a cached one is at least ``threshold``.  The asking
+    user's first name in an opening greeting is stored as a placeholder and
+    re-rendered with the current user's name, so the "Address the user as ..."
+    personalization survives a cache hit.  Answers that use the name anywhere
+    else are not stored: "Will" or "Mark" can't be told apart from the words.
+
+    Entries expire after ``ttl`` seconds, the least recently used entry is
+    evicted once ``maxsize`` is reached, and everything is dropped when the
+    knowledge base version passed to ``check_version`` changes.
+
+    ``scope`` partitions the cache: an entry only matches lookups with the
+    same scope.  app.py uses the parsed course code, so "COMP 352" and
+    "COMP 353" questions never share an answer however close their
+    embeddings are.
+    """
+
+    def __init__(self, threshold=0.95, maxsize=1000, ttl=24 * 3600):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = None
+        self._vectors = None  # (maxsize, dim) unit vectors, allocated on first store
+        self._valid = np.zeros(maxsize, dtype=bool)
+        self._scopes = np.empty(maxsize, dtype=object)
+        self._expires = np.zeros(maxsize)
+        self._entries = OrderedDict()  # slot -> (template, sources)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.skipped = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype='float32').ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    @staticmethod
+    def _to_template(answer, user_name):
+        """``answer`` with the greeted name as a placeholder, or None if the name appears elsewhere."""
+        if not user_name:
+            return answer
+        name = re.escape(user_name)
+        template = re.sub(GREETING.format(name=name), rf'\g<1>{USER_NAME_PLACEHOLDER}', answer,
+                          count=1, flags=re.IGNORECASE)
+        if re.search(rf'\b{name}\b', template):
+            return None
+        return template
+
+    @staticmethod
+    def _render(template, user_name):
+        return template.replace(USER_NAME_PLACEHOLDER, user_name or 'there')
+
+    def _drop(self, slot):
+        self._entries.pop(slot, None)
+        self._valid[slot] = False
+
+    def check_version(self, version):
+        """Clear the cache if the knowledge base was rebuilt since the last call."""
+        if version == self.version:
+            return
+        with self._lock:
+            if self.version is not None and self._entries:
+                logger.info("Knowledge base changed, clearing %d cached answers", len(self._entries))
+                self.invalidations += 1
+            self._entries.clear()
+            self._valid[:] = False
+            self.version = version
+
+    def lookup(self, embedding, user_name=None, scope=None):
+        query = self._normalize(embedding)
+        with self._lock:
+            if not self._entries or self._vectors is None or len(query) != self._vectors.shape[1]:
+                self.misses += 1
+                return None
+
+            for slot in np.flatnonzero(self._valid & (self._expires < time.monotonic())):
+                self._drop(int(slot))
+
+            similarities = self._vectors @ query
+            similarities[~(self._valid & (self._scopes == scope))] = -np.inf
+            slot = int(np.argmax(similarities))
+            similarity = float(similarities[slot])
+            if similarity < self.threshold:
+                self.misses += 1
+                return None
+
+            template, sources = self._entries[slot]
+            self._entries.move_to_end(slot)
+            self.hits += 1
+        return CachedAnswer(self._render(template, user_name), sources, similarity)
+
+    def store(self, embedding, answer, user_name=None, sources=None, scope=None):
+        vector = self._normalize(embedding)
+        template = self._to_template(answer, user_name)
+        if template is None:
+            self.skipped += 1
+            return
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != len(vector):
+                self._vectors = np.zeros((self.maxsize, len(vector)), dtype='float32')
+                self._valid[:] = False
+                self._entries.clear()
+
+            if len(self._entries) >= self.maxsize:
+                slot, _ = self._entries.popitem(last=False)
+            else:
+                slot = int(np.flatnonzero(~self._valid)[0])
+
+            self._vectors[slot] = vector
+            self._valid[slot] = True
+            self._scopes[slot] = scope
+            self._expires[slot] = time.monotonic() + self.ttl
+            self._entries[slot] = (template, sources or [])
+            self.stores += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._valid[:] = False
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'threshold': self.threshold,
+            'hits': self.hits,
+            'misses': self.misses,
+            'stores': self.stores,
+            'skipped': self.skipped,
+            'invalidations': self.invalidations,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
@@ -0,0 +1,60 @@
+import argparse
+import json
+from course_api import CourseAPI
+from course_catalog import write_snapshot, DEFAULT_CATALOG_PATH
+
+# Bulk listing endpoint of the course service. It is paged with limit/offset and
+# returns the same {"status": "OK", "payload": [...]} envelope as the other endpoints.
+CATALOG_ENDPOINT = "/api/v1/courses"
+PAGE_SIZE = 500
+
+def download_catalog(endpoint=CATALOG_ENDPOINT, page_size=PAGE_SIZE):
+    client = CourseAPI.client
+    courses = []
+    offset = 0
+    while True:
+        response = client.session.get(
+            f"{client.base_url}{endpoint}",
+            params={'limit': page_size, 'offset': offset},
+            timeout=max(client.timeout, 30)
+        )
+        response.raise_for_status()
+        result = response.json()
+        page = result.get('payload') if result.get('status') == 'OK' else None
+        if not isinstance(page, list) or not page:
+            break
+        courses.extend(page)
+        print(f"Downloaded {len(courses)} courses...")
+        if len(page) < page_size:
+            break
+        offset += page_size
+    return courses
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync the local course catalog snapshot")
+    parser.add_argument('--output', default=DEFAULT_CATALOG_PATH, help="SQLite snapshot to write")
+    parser.add_argument('--from-file', help="Build the snapshot from a recorded JSON dump instead of the network")
+    parser.add_argument('--record', help="Also save the downloaded courses as a JSON dump")
+    parser.add_argument('--endpoint', default=CATALOG_ENDPOINT, help="Bulk course listing endpoint")
+    args = parser.parse_args()
+
+    if args.from_file:
+        with open(args.from_file, 'r') as f:
+            data = json.load(f)
+        courses = data.get('payload', []) if isinstance(data, dict) else data
+    else:
+        courses = download_catalog(args.endpoint)
+
+    if args.record:
+        with open(args.record, 'w') as f:
+            json.dump(courses, f)
+
+    if not courses:
+        print("No courses received, keeping the existing snapshot")
+        exit(1)
+
+    count = write_snapshot(courses, args.output)
+    print(f"Wrote {count} courses to {args.output}")
+
+if __name__ == "__main__":
+    main()
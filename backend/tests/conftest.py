@@ -0,0 +1,57 @@
+import os
+import sys
+import pytest
+
+# Tests import backend modules the way app.py does (run from backend/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# app.py reads its settings at import: in-memory database, offline LLM, models loaded
+# only on demand (the fixtures below replace retrieval), no job workers
+os.environ.update(
+    DATABASE_URL='sqlite://',
+    LAZY_LOAD_MODELS='1',
+    USE_FAKE_LLM='1',
+    JOBS_ENABLED='0',
+    JOB_QUEUE_BACKEND='memory',
+    RATE_LIMIT_ENABLED='0',
+    SEMANTIC_CACHE_ENABLED='0',
+    COURSE_CATALOG_PATH=os.path.join(FIXTURES, 'no_catalog.db'),
+    JWT_SECRET_KEY='test-secret-key-that-is-long-enough-for-hs256'
+)
+
+class StubRetriever:
+    def search(self, query, embedding, k=None, sources=None):
+        return [], {}
+
+@pytest.fixture
+def conuai(monkeypatch):
+    """app.py with retrieval, embeddings, course search and live pages stubbed out."""
+    pytest.importorskip('langchain')
+    import auth
+    import app
+    monkeypatch.setattr(app.model_service, 'get_retriever', lambda: StubRetriever())
+    monkeypatch.setattr(app.model_service, 'embed_query', lambda text: [0.1, 0.2, 0.3])
+    monkeypatch.setattr(app.CourseAPI, 'search', staticmethod(lambda query, limit=5: []))
+    monkeypatch.setattr(app.scraper, 'passages', lambda query: [])
+    app.app.testing = True
+    auth.forget('student@example.com')
+    return app
+
+@pytest.fixture
+def client(conuai):
+    from models import db, User
+    with conuai.app.app_context():
+        if User.query.filter_by(email='student@example.com').first() is None:
+            db.session.add(User(email='student@example.com', password='x', firstName='Sam',
+                                lastName='Student', role='student'))
+            db.session.commit()
+    return conuai.app.test_client()
+
+@pytest.fixture
+def headers(conuai):
+    import jwt
+    token = jwt.encode({'email': 'student@example.com', 'firstName': 'Sam', 'lastName': 'Student',
+                        'role': 'student'}, conuai.app.config['SECRET_KEY'])
+    return {'Authorization': f'Bearer {token}'}
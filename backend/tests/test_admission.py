@@ -0,0 +1,46 @@
+"""ConcurrencyGate: bounded concurrency with a bounded, timed queue in front of the LLM."""
+import time
+import threading
+from rate_limit import ConcurrencyGate
+
+def test_requests_past_the_queue_are_shed_immediately():
+    gate = ConcurrencyGate(max_concurrent=1, max_queue=0, queue_timeout=5)
+    assert gate.acquire()
+    started = time.monotonic()
+    assert not gate.acquire()
+    assert time.monotonic() - started < 1
+    assert gate.stats()['shed'] == 1
+
+def test_queued_request_is_shed_after_the_timeout():
+    gate = ConcurrencyGate(max_concurrent=1, max_queue=1, queue_timeout=0.05)
+    assert gate.acquire()
+    assert not gate.acquire()
+    assert gate.stats()['shed'] == 1 and gate.stats()['waiting'] == 0
+
+def test_queued_request_gets_the_released_slot():
+    gate = ConcurrencyGate(max_concurrent=1, max_queue=1, queue_timeout=5)
+    assert gate.acquire()
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(gate.acquire()))
+    waiter.start()
+    while gate.stats()['waiting'] == 0:
+        time.sleep(0.01)
+    # The queue is full: a third request is turned away
+    assert not gate.acquire()
+
+    gate.release(held_for=1.0)
+    waiter.join(2)
+    assert result == [True]
+    assert gate.stats()['active'] == 1 and gate.stats()['admitted'] == 2
+
+def test_busy_query_gets_429(client, headers, conuai, monkeypatch):
+    gate = ConcurrencyGate(max_concurrent=1, max_queue=0)
+    monkeypatch.setattr(conuai, 'admission', gate)
+    assert gate.acquire()
+    response = client.post('/api/query', json={'query': 'Hi'}, headers=headers)
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) >= 1
+
+    gate.release()
+    assert client.post('/api/query', json={'query': 'Hi'}, headers=headers).status_code == 200
+    assert gate.stats()['active'] == 0
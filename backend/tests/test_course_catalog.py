@@ -0,0 +1,66 @@
+import os
+import sys
+import json
+import pytest
+from conftest import FIXTURES
+import sync_courses
+from course_catalog import CourseCatalog, load_catalog, write_snapshot
+from course_api import CourseAPI
+
+SNAPSHOT = os.path.join(FIXTURES, 'course_catalog.json')
+
+@pytest.fixture
+def catalog_path(tmp_path, monkeypatch):
+    """A snapshot built from the recorded dump with ``sync_courses.py --from-file``."""
+    path = str(tmp_path / 'course_catalog.db')
+    monkeypatch.setattr(sys, 'argv', ['sync_courses.py', '--from-file', SNAPSHOT, '--output', path])
+    sync_courses.main()
+    return path
+
+@pytest.fixture
+def catalog(catalog_path):
+    return CourseCatalog(catalog_path).load()
+
+def test_snapshot_holds_every_course(catalog):
+    with open(SNAPSHOT) as f:
+        recorded = json.load(f)['payload']
+    assert catalog.stats()['courses'] == len(recorded)
+    assert catalog.synced_at is not None
+
+def test_lookup_by_code(catalog):
+    assert catalog.lookup('COMP352')['title'] == 'Data Structures and Algorithms'
+    assert catalog.lookup('ENGR')['title'] == 'Course without a number'
+    assert catalog.lookup('COMP999') is None
+
+def test_search_ranks_title_matches_first(catalog):
+    results = catalog.search('object oriented programming', limit=3)
+    assert [c['catalog'] for c in results[:2]] == ['248', '249']
+
+    # "data" is in COMP 352's title and only in COMP 248's description
+    assert catalog.search('data')[0]['catalog'] == '352'
+
+def test_search_ignores_stop_words_and_respects_limit(catalog):
+    assert catalog.search('what is the') == []
+    assert len(catalog.search('programming', limit=1)) == 1
+
+def test_reload_after_new_snapshot(catalog_path):
+    catalog = CourseCatalog(catalog_path, check_interval=0).load()
+    write_snapshot([{'subject': 'COMP', 'catalog': '353', 'title': 'Databases'}], catalog_path)
+    os.utime(catalog_path, (0, 0))
+    catalog.refresh_if_changed()
+    assert catalog.lookup('COMP352') is None
+    assert catalog.lookup('COMP353')['title'] == 'Databases'
+
+def test_load_catalog_without_snapshot(tmp_path):
+    assert load_catalog(str(tmp_path / 'missing.db')) is None
+
+def test_course_api_answers_from_catalog(catalog, monkeypatch):
+    monkeypatch.setattr(CourseAPI, 'catalog', catalog)
+
+    def no_network(*args, **kwargs):
+        raise AssertionError("the course service must not be called when a snapshot is loaded")
+    monkeypatch.setattr(CourseAPI.client, 'get_course', no_network)
+    monkeypatch.setattr(CourseAPI.client, 'search_courses', no_network)
+
+    assert [c['catalog'] for c in CourseAPI.search('prerequisites for comp 352?')] == ['352']
+    assert CourseAPI.search('artificial intelligence')[0]['catalog'] == '472'
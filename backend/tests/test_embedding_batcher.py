@@ -0,0 +1,55 @@
+import time
+import threading
+from concurrent.futures import TimeoutError
+import numpy as np
+import pytest
+from embedding_batcher import EmbeddingBatcher
+
+def encode(texts):
+    return np.array([[float(len(t)), 1.0] for t in texts], dtype='float32')
+
+def test_concurrent_texts_share_one_encoder_call():
+    calls = []
+
+    def counting(texts):
+        calls.append(len(texts))
+        return encode(texts)
+    batcher = EmbeddingBatcher(counting, max_batch=8, max_wait_ms=50)
+    assert batcher.embed_many(['a', 'bb', 'ccc']) == [[1.0, 1.0], [2.0, 1.0], [3.0, 1.0]]
+    assert calls == [3]
+
+def test_encoder_error_reaches_every_caller():
+    def broken(texts):
+        raise RuntimeError('model not loaded')
+    batcher = EmbeddingBatcher(broken, max_wait_ms=20, timeout=2)
+    with pytest.raises(RuntimeError, match='model not loaded'):
+        batcher.embed_many(['a', 'b'])
+
+def test_short_encoder_result_fails_instead_of_hanging():
+    batcher = EmbeddingBatcher(lambda texts: encode(texts)[:1], max_wait_ms=20, timeout=2)
+    started = time.monotonic()
+    with pytest.raises(ValueError, match='1 embeddings for 2 texts'):
+        batcher.embed_many(['a', 'b'])
+    assert time.monotonic() - started < 1
+
+def test_slow_encoder_times_out():
+    release = threading.Event()
+    batcher = EmbeddingBatcher(lambda texts: release.wait(5) and encode(texts), timeout=0.1)
+    with pytest.raises(TimeoutError):
+        batcher.embed('a')
+    release.set()
+
+@pytest.mark.filterwarnings('ignore::pytest.PytestUnhandledThreadExceptionWarning')
+def test_dead_worker_fails_its_batch_and_is_restarted():
+    stop = [True]
+
+    def dying(texts):
+        if stop[0]:
+            stop[0] = False
+            raise SystemExit()
+        return encode(texts)
+    batcher = EmbeddingBatcher(dying, timeout=2)
+    with pytest.raises(RuntimeError, match='stopped'):
+        batcher.embed('a')
+    batcher._thread.join(1)
+    assert batcher.embed('abc') == [3.0, 1.0]
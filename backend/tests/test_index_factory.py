@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+faiss = pytest.importorskip('faiss')
+
+from index_factory import make_index, factory_string
+
+@pytest.fixture
+def corpus():
+    # As many vectors as the repo's vector_store (108), in fewer dimensions to keep PQ training quick
+    return np.random.default_rng(0).random((108, 32), dtype='float32')
+
+@pytest.mark.parametrize('index_type, storage', [('ivfpq', 'float32'), ('hnsw', 'pq'), ('flat', 'pq'), ('ivf', 'float32')])
+def test_small_corpus_builds_every_index_type(corpus, index_type, storage):
+    index, _ = make_index(corpus, index_type, storage)
+    assert index.ntotal == len(corpus)
+    _, ids = index.search(corpus[:1], 1)
+    assert ids[0][0] >= 0
+
+def test_parameters_are_clamped_to_the_training_set(corpus):
+    assert factory_string('ivfpq', 384, len(corpus)) == 'IVF2,PQ48x6'
+    assert factory_string('ivf', 384, len(corpus), nlist=50) == 'IVF2,Flat'
+    assert factory_string('ivf', 384, 1_000_000) == 'IVF4000,Flat'
+
+def test_pq_on_a_tiny_corpus_says_how_many_vectors_it_needs(corpus):
+    with pytest.raises(ValueError, match='at least 16 vectors'):
+        make_index(corpus[:10], 'flat', 'pq')
+
+def test_ivf_searches_more_than_one_list_by_default():
+    vectors = np.random.default_rng(0).random((20000, 16), dtype='float32')
+    index, description = make_index(vectors, 'ivf')
+    assert description == 'IVF512,Flat'
+    assert faiss.extract_index_ivf(index).nprobe == 64
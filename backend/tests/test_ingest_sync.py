@@ -0,0 +1,164 @@
+"""ingest.sync_chroma against pages served by a local http.server."""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import ingest
+
+class PageHandler(BaseHTTPRequestHandler):
+    """Serves ``server.pages[path]`` = (status, html); ETags are the html itself, so 304 means unchanged."""
+
+    def do_GET(self):
+        status, html = self.server.pages.get(self.path, (404, ''))
+        etag = f'"{abs(hash(html))}"'
+        if status == 200 and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = html.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        if status == 200:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = {}
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self.docs.update((i, (text, meta)) for i, text, meta in zip(ids, documents, metadatas))
+
+    def delete(self, ids=None, where=None):
+        if where is not None:
+            ids = [i for i, (_, meta) in self.docs.items() if meta['source'] == where['source']]
+        for i in ids or []:
+            self.docs.pop(i, None)
+
+class FakeChroma:
+    def __init__(self):
+        self._collection = FakeCollection()
+
+class CountingEmbeddings:
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(t)), 1.0] for t in texts]
+
+def page(*sentences):
+    return '<html><body><main>' + ''.join(f'<p>{s}</p>' for s in sentences) + '</main></body></html>'
+
+@pytest.fixture
+def site():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), PageHandler)
+    server.pages = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    server.url = lambda path: f'http://127.0.0.1:{server.server_port}{path}'
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def sync(tmp_path):
+    store, embeddings = FakeChroma(), CountingEmbeddings()
+    manifest = str(tmp_path / ingest.MANIFEST_NAME)
+
+    def run(urls):
+        embeddings.embedded.clear()
+        stats = ingest.sync_chroma(store, urls, embeddings, manifest, processes=1, max_workers=2,
+                                   chunk_size=40, overlap=0)
+        return stats, sorted(text for text, _ in store._collection.docs.values())
+    run.embeddings = embeddings
+    return run
+
+DUE = "Tuition is due on September 30."
+LATE = "Late fees apply after that date."
+REFUND = "Refunds take two weeks."
+HOURS = "The library opens at 8am."
+
+def test_unchanged_page_keeps_its_chunks(site, sync):
+    site.pages['/fees'] = (200, page(DUE, LATE))
+    urls = [site.url('/fees')]
+    stats, docs = sync(urls)
+    assert stats['added'] == 2 and docs == sorted([DUE, LATE])
+
+    stats, docs = sync(urls)
+    assert stats['unchanged'] == 1 and stats['added'] == 0
+    assert sync.embeddings.embedded == []
+    assert docs == sorted([DUE, LATE])
+
+def test_changed_page_embeds_only_new_chunks(site, sync):
+    site.pages['/fees'] = (200, page(DUE, LATE))
+    urls = [site.url('/fees')]
+    sync(urls)
+
+    site.pages['/fees'] = (200, page(DUE, REFUND))
+    stats, docs = sync(urls)
+    assert sync.embeddings.embedded == [REFUND]
+    assert stats['kept'] == 1 and stats['removed'] == 1
+    assert docs == sorted([DUE, REFUND])
+
+@pytest.mark.parametrize('status', [404, 410])
+def test_gone_page_is_removed(site, sync, status):
+    site.pages['/fees'] = (200, page(DUE))
+    site.pages['/library'] = (200, page(HOURS))
+    urls = [site.url('/fees'), site.url('/library')]
+    sync(urls)
+
+    site.pages['/fees'] = (status, 'Not here')
+    stats, docs = sync(urls)
+    assert stats['removed'] == 1
+    assert docs == [HOURS]
+
+@pytest.mark.parametrize('status', [500, 503])
+def test_fetch_error_keeps_the_old_chunks(site, sync, status):
+    site.pages['/fees'] = (200, page(DUE, LATE))
+    urls = [site.url('/fees')]
+    sync(urls)
+
+    site.pages['/fees'] = (status, 'Try again later')
+    stats, docs = sync(urls)
+    assert stats['errors'] == 1 and stats['removed'] == 0
+    assert docs == sorted([DUE, LATE])
+
+    # Once the page is back, nothing was lost from the manifest either
+    site.pages['/fees'] = (200, page(DUE, LATE))
+    stats, docs = sync(urls)
+    assert stats['unchanged'] == 1 and docs == sorted([DUE, LATE])
+
+def test_unreachable_host_keeps_the_old_chunks(site, sync):
+    site.pages['/fees'] = (200, page(DUE))
+    urls = [site.url('/fees')]
+    sync(urls)
+
+    site.shutdown()
+    site.server_close()
+    stats, docs = sync(urls)
+    assert stats['errors'] == 1 and docs == [DUE]
+
+def test_url_dropped_from_the_list_is_removed(site, sync):
+    site.pages['/fees'] = (200, page(DUE))
+    site.pages['/library'] = (200, page(HOURS))
+    sync([site.url('/fees'), site.url('/library')])
+
+    stats, docs = sync([site.url('/library')])
+    assert stats['removed'] == 1
+    assert docs == [HOURS]
+
+def test_fetch_pages_reports_each_status(site):
+    site.pages['/ok'] = (200, page(DUE))
+    site.pages['/gone'] = (410, '')
+    site.pages['/broken'] = (500, '')
+    results = ingest.fetch_pages([site.url(p) for p in ('/ok', '/gone', '/broken', '/missing')], max_workers=2)
+    assert {url.rsplit('/', 1)[1]: r.status for url, r in results.items()} == {
+        'ok': 'changed', 'gone': 'gone', 'broken': 'error', 'missing': 'gone'}
+
+    etag = results[site.url('/ok')].etag
+    again = ingest.fetch_pages([site.url('/ok')], manifest={site.url('/ok'): {'etag': etag}})
+    assert again[site.url('/ok')].status == 'unchanged'
@@ -0,0 +1,117 @@
+import os
+import math
+import time
+import threading
+import pytest
+import jobs
+from jobs import JobQueue, JobFailed, MemoryJobStore, SQLiteJobStore, QueueFull
+
+def test_store_is_opened_on_first_use(tmp_path):
+    path = str(tmp_path / 'jobs.db')
+    queue = JobQueue(lambda payload: payload, workers=0, store_spec=path)
+    assert queue.stats()['queued'] == 0
+    assert not os.path.exists(path)
+
+    queue.get('missing')
+    assert os.path.exists(path)
+    assert queue.stats()['backend'] == 'SQLiteJobStore'
+
+def test_slow_webhook_does_not_hold_up_the_worker(monkeypatch):
+    release = threading.Event()
+    delivered = []
+
+    def deliver(url, job, **kwargs):
+        release.wait(5)
+        delivered.append(job['id'])
+        return True
+    monkeypatch.setattr(jobs, 'deliver_webhook', deliver)
+
+    queue = JobQueue(lambda payload: {'echo': payload}, store=MemoryJobStore(), workers=1, idle_check=0.05)
+    first = queue.submit('1', 'a', webhook_url='https://hooks.example.com/a')
+    second = queue.submit('1', 'b', webhook_url='https://hooks.example.com/b')
+
+    # Both jobs finish while the first webhook is still blocked
+    assert queue.wait(second['id'], 2)['status'] == 'done'
+    assert queue.get(first['id'])['status'] == 'done'
+    assert delivered == []
+
+    release.set()
+    deadline = time.monotonic() + 2
+    while len(delivered) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sorted(delivered) == sorted([first['id'], second['id']])
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    return MemoryJobStore() if request.param == 'memory' else SQLiteJobStore(str(tmp_path / 'jobs.db'))
+
+def test_jobs_are_claimed_oldest_first_and_once(store):
+    first = store.enqueue('1', {'n': 1})
+    second = store.enqueue('1', {'n': 2})
+    claimed = store.claim()
+    assert claimed['id'] == first['id'] and claimed['status'] == 'running' and claimed['attempts'] == 1
+    assert store.claim()['id'] == second['id']
+    assert store.claim() is None
+
+    store.finish(first['id'], result={'ok': True})
+    store.finish(second['id'], error='boom')
+    assert store.get(first['id'])['result'] == {'ok': True}
+    assert store.get(second['id'])['status'] == 'failed'
+    assert store.counts() == {'done': 1, 'failed': 1}
+
+def test_full_queue_refuses_new_jobs(store):
+    store.enqueue('1', {}, max_queued=1)
+    with pytest.raises(QueueFull):
+        store.enqueue('1', {}, max_queued=1)
+
+def test_abandoned_job_is_retried_then_failed(store):
+    job = store.enqueue('1', {})
+    assert store.claim(lease_seconds=-1, max_attempts=2)['attempts'] == 1
+    # The lease ran out: another worker takes it over
+    assert store.claim(lease_seconds=-1, max_attempts=2)['attempts'] == 2
+    assert store.claim(lease_seconds=-1, max_attempts=2) is None
+    assert store.get(job['id'])['status'] == 'failed'
+
+def test_finished_jobs_are_purged(store):
+    job = store.enqueue('1', {})
+    store.claim()
+    store.finish(job['id'], result={})
+    store.purge(time.time() + 1)
+    assert store.get(job['id']) is None
+
+def test_submit_runs_the_handler_and_wait_returns_the_result(store):
+    def handler(payload):
+        if payload == 'bad':
+            raise JobFailed('No answer for that')
+        if payload == 'crash':
+            raise RuntimeError('internal detail')
+        return {'echo': payload}
+
+    queue = JobQueue(handler, store=store, workers=2, idle_check=0.05)
+    ok, bad, crash = (queue.submit('1', p) for p in ('hi', 'bad', 'crash'))
+    assert queue.wait(ok['id'], 2)['result'] == {'echo': 'hi'}
+    assert queue.wait(bad['id'], 2)['error'] == 'No answer for that'
+    assert queue.wait(crash['id'], 2)['error'] == 'Something went wrong'
+    assert queue.stats()['completed'] == 1 and queue.stats()['failed'] == 2
+
+    with pytest.raises(ValueError):
+        queue.wait(ok['id'], math.inf)
+
+def test_async_query_is_answered_through_the_job(client, headers, conuai, monkeypatch):
+    monkeypatch.setattr(conuai, 'JOBS_ENABLED', True)
+    monkeypatch.setattr(conuai, 'job_queue', JobQueue(conuai.run_query_job, store=MemoryJobStore(), workers=1))
+    response = client.post('/api/query', json={'query': 'When is the tuition deadline?', 'async': True},
+                           headers=headers)
+    assert response.status_code == 202
+    queued = response.get_json()
+    assert queued['status_url'] == f"/api/jobs/{queued['job_id']}"
+    assert queued['conversation_id'] is None
+
+    job = client.get(f"{queued['status_url']}?wait=5", headers=headers).get_json()
+    assert job['status'] == 'done'
+    assert 'tuition deadline' in job['result']['response']
+    assert isinstance(job['result']['conversation_id'], int)
+
+    for wait in ('nan', 'inf', '-1', 'abc'):
+        assert client.get(f"{queued['status_url']}?wait={wait}", headers=headers).status_code == 400
+    assert client.get('/api/jobs/unknown', headers=headers).status_code == 404
@@ -0,0 +1,45 @@
+"""The Chroma engine picks up a rebuilt bm25.npz without a restart."""
+import os
+import pytest
+
+pytest.importorskip('langchain')
+
+import bm25
+import model_service
+
+class StubVectorStore:
+    _collection = None
+
+def write_index(folder, texts):
+    bm25.BM25Index.build([f"id{i}" for i in range(len(texts))], texts).save(os.path.join(folder, bm25.FILE_NAME))
+
+@pytest.fixture
+def chroma_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_service, 'CHROMA_DIR', str(tmp_path))
+    monkeypatch.setattr(model_service, 'RETRIEVAL_BACKEND', 'chroma')
+    monkeypatch.setattr(model_service, 'HYBRID_RETRIEVAL', True)
+    monkeypatch.setattr(model_service, 'get_vectorstore', lambda: StubVectorStore())
+    monkeypatch.setitem(model_service._state, 'retriever', None)
+    monkeypatch.setitem(model_service._state, 'retriever_pid', None)
+    monkeypatch.setitem(model_service._state, 'lexical_mtime', None)
+    return str(tmp_path)
+
+def test_rebuilt_bm25_index_is_reloaded(chroma_dir):
+    write_index(chroma_dir, ["COMP 248 object oriented programming"])
+    engine = model_service.get_retriever()
+    assert [doc_id for doc_id, _ in engine.bm25.search('comp248', 5)] == ['id0']
+
+    write_index(chroma_dir, ["SOEN 287 web programming", "COMP 352 data structures"])
+    path = os.path.join(chroma_dir, bm25.FILE_NAME)
+    os.utime(path, (os.path.getmtime(path) + 10,) * 2)
+
+    assert model_service.get_retriever() is engine
+    assert [doc_id for doc_id, _ in engine.bm25.search('comp352', 5)] == ['id1']
+    assert engine.bm25.search('comp248', 5) == []
+
+def test_removed_bm25_index_turns_the_lexical_leg_off(chroma_dir):
+    write_index(chroma_dir, ["COMP 248 object oriented programming"])
+    engine = model_service.get_retriever()
+    os.remove(os.path.join(chroma_dir, bm25.FILE_NAME))
+    model_service.get_retriever()
+    assert engine.bm25 is None
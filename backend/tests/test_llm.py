@@ -0,0 +1,114 @@
+"""LLMService fallback and single-flight coalescing, over scripted providers."""
+import time
+import threading
+from types import SimpleNamespace
+import pytest
+from llm import LLMService, LLMUnavailable, Provider, FakeProvider
+
+MESSAGES = [{'role': 'user', 'content': 'When is the tuition deadline?'}]
+
+class ScriptedClient:
+    """OpenAI-shaped client: answers ``reply`` word by word, optionally failing or waiting first."""
+
+    def __init__(self, reply='Tuition is due September 30.', fail_before=False, fail_after_tokens=None):
+        self.reply = reply
+        self.fail_before = fail_before
+        self.fail_after_tokens = fail_after_tokens
+        self.calls = 0
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, model=None, messages=None, stream=False, **kwargs):
+        self.calls += 1
+        self.entered.set()
+        self.release.wait(5)
+        if self.fail_before:
+            raise ConnectionError('upstream down')
+        if not stream:
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.reply))])
+        return self._stream()
+
+    def _stream(self):
+        for i, word in enumerate(self.reply.split()):
+            if self.fail_after_tokens is not None and i >= self.fail_after_tokens:
+                raise ConnectionError('stream cut')
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=word + ' '))])
+
+def provider(name, client, max_concurrency=8):
+    return Provider(name, client, model=name, timeout=None, max_concurrency=max_concurrency)
+
+def test_failed_provider_falls_back_to_the_next():
+    primary = provider('primary', ScriptedClient(fail_before=True))
+    service = LLMService([primary, FakeProvider(reply='offline answer', token_delay=0)], coalesce=False)
+    assert service.complete(MESSAGES) == 'offline answer'
+    assert service.stats()['fallbacks'] == 1
+    assert primary.stats()['failures'] == 1
+
+def test_saturated_provider_falls_back_to_the_next():
+    primary = provider('primary', ScriptedClient(), max_concurrency=1)
+    assert primary.acquire(0)
+    service = LLMService([primary, FakeProvider(reply='offline answer', token_delay=0)], coalesce=False)
+    assert service.complete(MESSAGES) == 'offline answer'
+    assert primary.stats()['saturated'] == 1
+
+def test_every_provider_failing_raises_unavailable():
+    service = LLMService([provider('a', ScriptedClient(fail_before=True)),
+                          provider('b', ScriptedClient(fail_before=True))], queue_timeout=0.1)
+    with pytest.raises(LLMUnavailable):
+        service.complete(MESSAGES)
+    with pytest.raises(LLMUnavailable):
+        list(service.stream(MESSAGES))
+
+def run_concurrently(service, client, call, count):
+    """Start one call, hold it upstream until ``count - 1`` identical calls have joined it, then finish."""
+    client.release.clear()
+    results = [None] * count
+
+    def run(i):
+        results[i] = call()
+    threads = [threading.Thread(target=run, args=(0,))]
+    threads[0].start()
+    assert client.entered.wait(2)
+    for i in range(1, count):
+        threads.append(threading.Thread(target=run, args=(i,)))
+        threads[-1].start()
+    while service.stats()['coalesced'] < count - 1:
+        time.sleep(0.01)
+    client.release.set()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+def test_identical_prompts_in_flight_share_one_call():
+    client = ScriptedClient()
+    service = LLMService([provider('primary', client)])
+    results = run_concurrently(service, client, lambda: service.complete(MESSAGES), 3)
+    assert results == ['Tuition is due September 30.'] * 3
+    assert client.calls == 1
+    assert service.stats()['in_flight_prompts'] == 0
+
+    # Once finished, the same prompt goes upstream again
+    service.complete(MESSAGES)
+    assert client.calls == 2
+
+def test_identical_streams_share_one_call():
+    client = ScriptedClient()
+    service = LLMService([provider('primary', client)])
+    results = run_concurrently(service, client, lambda: ''.join(service.stream(MESSAGES)), 3)
+    assert results == ['Tuition is due September 30. '] * 3
+    assert client.calls == 1
+
+def test_stream_falls_back_only_before_the_first_token():
+    service = LLMService([provider('primary', ScriptedClient(fail_before=True)),
+                         FakeProvider(reply='offline answer', token_delay=0)], coalesce=False)
+    assert ''.join(service.stream(MESSAGES)).strip() == 'offline answer'
+
+    service = LLMService([provider('primary', ScriptedClient(fail_after_tokens=2)),
+                         FakeProvider(reply='offline answer', token_delay=0)], coalesce=False)
+    tokens = []
+    with pytest.raises(LLMUnavailable):
+        for token in service.stream(MESSAGES):
+            tokens.append(token)
+    assert tokens == ['Tuition ', 'is ']
@@ -0,0 +1,43 @@
+"""/api/query through the Flask test client, with the offline LLM (USE_FAKE_LLM)."""
+import json
+import pytest
+
+@pytest.mark.parametrize('conversation_id', [{'id': 1}, [1], '1', 1.5, True])
+def test_conversation_id_must_be_an_integer(client, headers, conversation_id):
+    response = client.post('/api/query', json={'query': 'Hi', 'conversation_id': conversation_id}, headers=headers)
+    assert response.status_code == 400
+    assert 'conversation_id' in response.get_json()['error']
+
+def test_follow_up_to_an_unknown_conversation_is_404(client, headers):
+    response = client.post('/api/query', json={'query': 'Hi', 'conversation_id': 999999}, headers=headers)
+    assert response.status_code == 404
+
+def sse_events(response):
+    """(event, data) pairs from a text/event-stream body."""
+    events = []
+    for block in response.get_data(as_text=True).strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.splitlines())
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+def test_streamed_answer_sends_sources_then_tokens_then_done(client, headers):
+    response = client.post('/api/query', json={'query': 'When is the tuition deadline?', 'stream': True},
+                           headers=headers)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+
+    events = sse_events(response)
+    names = [name for name, _ in events]
+    assert names[0] == 'sources' and names[-1] == 'done'
+    assert set(names[1:-1]) == {'token'}
+
+    answer = ''.join(data['content'] for name, data in events if name == 'token')
+    assert answer.strip()
+
+    # The turn is saved before 'done', which carries the new conversation's id
+    conversation_id = events[-1][1]['conversation_id']
+    assert isinstance(conversation_id, int)
+    follow_up = client.post('/api/query', json={'query': 'And for summer?', 'conversation_id': conversation_id},
+                            headers=headers)
+    assert follow_up.status_code == 200
+    assert follow_up.get_json()['conversation_id'] == conversation_id
@@ -0,0 +1,20 @@
+"""
+SQL statements issued by one /api/query, counted by app.count_db_query (the
+X-DB-Queries header), against an in-memory SQLite database.
+"""
+
+def statements(response):
+    assert response.status_code == 200, response.get_json()
+    return int(response.headers['X-DB-Queries'])
+
+def test_query_statement_count(client, headers):
+    first = client.post('/api/query', json={'query': 'When is the tuition deadline?'}, headers=headers)
+    conversation_id = first.get_json()['conversation_id']
+    # User lookup (not cached yet), then the turn: the new conversation (saved with its
+    # first turn, no history to load) and two messages, and the reload for the response
+    assert statements(first) == 5
+
+    follow_up = client.post('/api/query', json={'query': 'And for summer?', 'conversation_id': conversation_id},
+                            headers=headers)
+    # Cached user: conversation, history, the turn and the reload
+    assert statements(follow_up) == 6
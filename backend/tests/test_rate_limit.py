@@ -0,0 +1,66 @@
+import math
+import pytest
+import rate_limit
+from rate_limit import RateLimiter, MemoryBackend, SQLiteBackend
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Frozen time.monotonic/time.time; advance with ``clock.now += seconds``."""
+    class Clock:
+        now = 1000.0
+    monkeypatch.setattr(rate_limit.time, 'monotonic', lambda: Clock.now)
+    monkeypatch.setattr(rate_limit.time, 'time', lambda: Clock.now)
+    return Clock
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    return MemoryBackend() if request.param == 'memory' else SQLiteBackend(str(tmp_path / 'buckets.db'))
+
+def test_burst_then_refill(clock, backend):
+    # 6 per minute = one token every 10s
+    limiter = RateLimiter(user_per_minute=6, user_burst=2, global_per_minute=600, global_burst=100, backend=backend)
+    assert limiter.check('u1') == (True, 0.0)
+    assert limiter.check('u1') == (True, 0.0)
+    allowed, retry_after = limiter.check('u1')
+    assert not allowed and retry_after == pytest.approx(10)
+
+    clock.now += 5
+    allowed, retry_after = limiter.check('u1')
+    assert not allowed and retry_after == pytest.approx(5)
+
+    clock.now += 5
+    assert limiter.check('u1')[0]
+    # Other users have their own bucket
+    assert limiter.check('u2')[0]
+    assert limiter.stats()['limited'] == 2
+
+def test_global_limit_does_not_cost_the_user(clock, backend):
+    limiter = RateLimiter(user_per_minute=60, user_burst=1, global_per_minute=60, global_burst=1, backend=backend)
+    assert limiter.check('u1')[0]
+    # u2 is turned away by the global bucket, so its own token is still there once the global one refills
+    assert not limiter.check('u2')[0]
+    clock.now += 1
+    assert limiter.check('u2')[0]
+
+@pytest.mark.parametrize('settings', [dict(user_per_minute=0), dict(global_per_minute=-1),
+                                      dict(user_burst=0.5), dict(global_burst=0)])
+def test_settings_that_would_never_admit_are_rejected(settings):
+    with pytest.raises(ValueError):
+        RateLimiter(backend=MemoryBackend(), **settings)
+
+def test_limited_query_gets_429_with_retry_after(client, headers, conuai, monkeypatch):
+    limiter = RateLimiter(user_per_minute=6, user_burst=1, global_per_minute=600, global_burst=100,
+                          backend=MemoryBackend())
+    monkeypatch.setattr(conuai, 'rate_limiter', limiter)
+    assert client.post('/api/query', json={'query': 'Hi'}, headers=headers).status_code == 200
+
+    response = client.post('/api/query', json={'query': 'Hi'}, headers=headers)
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '10'
+    assert response.get_json()['retry_after'] == 10
+
+def test_retry_after_is_capped(conuai):
+    with conuai.app.test_request_context():
+        for estimate in (math.inf, math.nan, 10 ** 9):
+            response = conuai.too_many_requests(estimate, 'Busy')
+            assert response.headers['Retry-After'] == str(conuai.MAX_RETRY_AFTER)
@@ -0,0 +1,42 @@
+import semantic_cache
+from semantic_cache import SemanticCache
+
+QUESTION = [1.0, 0.0, 0.0]
+
+def test_greeting_is_rendered_for_the_next_user():
+    cache = SemanticCache(threshold=0.9)
+    cache.store(QUESTION, "Hi Will, COMP 248 is the first programming course.", 'Will')
+    assert cache.lookup(QUESTION, 'Bob').answer == "Hi Bob, COMP 248 is the first programming course."
+
+def test_name_used_as_a_word_is_not_replaced():
+    cache = SemanticCache(threshold=0.9)
+    cache.store(QUESTION, "Hi Will, you Will need COMP 248.", 'Will')
+    assert cache.lookup(QUESTION, 'Bob') is None
+    assert cache.stats()['skipped'] == 1
+
+    cache.store(QUESTION, "In May you will register for COMP 248.", 'May')
+    assert cache.lookup(QUESTION, 'Bob') is None
+
+def test_answer_without_the_name_is_served_unchanged():
+    cache = SemanticCache(threshold=0.9)
+    cache.store(QUESTION, "COMP 248 is offered every term.", 'Mark')
+    assert cache.lookup(QUESTION, 'Bob').answer == "COMP 248 is offered every term."
+
+def test_expired_best_match_does_not_hide_a_close_valid_entry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(semantic_cache.time, 'monotonic', lambda: now[0])
+    cache = SemanticCache(threshold=0.9, ttl=10)
+    cache.store(QUESTION, "old answer")
+    now[0] += 5
+    cache.store([0.99, 0.1, 0.0], "newer answer")
+    now[0] += 6
+
+    cached = cache.lookup(QUESTION)
+    assert cached is not None and cached.answer == "newer answer"
+    assert cache.stats()['size'] == 1
+
+def test_scope_separates_course_codes():
+    cache = SemanticCache(threshold=0.9)
+    cache.store(QUESTION, "COMP 352 answer", scope='COMP352')
+    assert cache.lookup(QUESTION, scope='COMP353') is None
+    assert cache.lookup(QUESTION, scope='COMP352').answer == "COMP 352 answer"
@@ -10,6 +10,7 @@ function ConuAISection() {
     const [query, setQuery] = useState('');
     const [response, setResponse] = useState('');
     const [isLoading, setIsLoading] = useState(false);
+    const [conversationId, setConversationId] = useState(null);
 
     const handleSubmit = async (e) => {
         e.preventDefault();
@@ -33,7 +34,7 @@ function ConuAISection() {
                     'Content-Type': 'application/json',
                     'Authorization': `Bearer ${token}`
                 },
-                body: JSON.stringify({ query }),
+                body: JSON.stringify({ query, conversation_id: conversationId }),
             });
 
             console.log('API Response status:', res.status);
@@ -54,6 +55,9 @@ function ConuAISection() {
             
             console.log('Setting response:', data.response);
             setResponse(data.response);
+            if (data.conversation_id) {
+                setConversationId(data.conversation_id);
+            }
         } catch (error) {
             console.error('Detailed error:', {
                 message: error.message,
@@ -66,6 +70,13 @@ function ConuAISection() {
         }
     };
 
+    // Follow-ups reuse the conversation; a fresh one gets no history (and can use cached answers)
+    const startNewConversation = () => {
+        setConversationId(null);
+        setResponse('');
+        setQuery('');
+    };
+
     const welcomeMessage = user 
         ? `Hello ${user.firstName}, how can ConuAI help you today?`
         : "How can ConuAI help you today?";
@@ -116,6 +127,7 @@ function ConuAISection() {
                             <div 
                                 key={tag} 
                                 onClick={() => {
+                                    setConversationId(null);
                                     setQuery(`Tell me about ${tag.toLowerCase()} at Concordia`);
                                 }}
                                 className="inline-flex items-center rounded-md border px-2.5 py-0.5 text-xs font-semibold transition-colors focus:outline-none focus:ring-2 focus:ring-ring focus:ring-offset-2 border-transparent bg-[oklch(96.833%_0.01405_-72.601)] text-[oklch(44.889%_0.15545_-73.341)] hover:bg-secondary/80 cursor-pointer"
@@ -130,6 +142,17 @@ function ConuAISection() {
                             </div>
                         ))}
                     </div>
+
+                    {conversationId && (
+                        <button
+                            type="button"
+                            onClick={startNewConversation}
+                            disabled={isLoading}
+                            className="rounded-full border border-white/60 px-4 py-1 text-xs font-semibold text-white transition duration-200 hover:bg-white/10 disabled:opacity-50"
+                        >
+                            New conversation
+                        </button>
+                    )}
                 </div>
 
                 {response && (